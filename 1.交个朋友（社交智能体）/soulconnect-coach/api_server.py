@@ -0,0 +1,320 @@
+"""SoulConnect Coach 的JSON HTTP接口，不保存会话状态，可多进程、多机器横向扩展
+
+本地调试：
+    python api_server.py --port 8000
+生产部署（预先fork的多进程worker，配置见 gunicorn.conf.py）：
+    gunicorn -c gunicorn.conf.py api_server:app
+
+接口：
+    POST /api/analyze_profile   {"profile": {"nickname": ..., "tags": [...], "bio": ..., ...}}
+    POST /api/icebreaker        {"topics": [...], "style": "友好型", "nickname": "..."}
+    POST /api/advice            {"history": [{"role": "user", "content": "..."}, ...]}
+    POST /api/emotion           {"text": "..."}
+    GET  /healthz               健康检查
+    GET  /metrics               Prometheus 指标
+每个请求调用模型的总时限（含排队和重试）由 SOULCONNECT_API_TIMEOUT 设置，默认20秒，超时返回504。
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from dotenv import load_dotenv
+from flask import Flask, Response, jsonify, request
+
+from utils.emotion_analyzer import EmotionAnalyzer
+from utils.glm_client import GLMClient
+from utils.metrics import Metrics, get_shared_metrics
+
+load_dotenv()
+
+API_REQUEST_METRIC = "soulconnect_api_requests_total"
+MAX_REQUEST_BYTES = 256 * 1024
+# 已退出worker的指标并入这一个文件，快照文件数不随worker重启增长
+RETIRED_SNAPSHOT = "retired.json"
+
+
+def _read_json(path: str) -> Optional[Dict]:
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        # 文件都由 os.replace 原子替换，读不到只可能是刚被删除或被外部改动，跳过即可
+        return None
+
+
+def _write_json(path: str, data: Dict):
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(temp_path, path)
+
+
+class WorkerMetricsExporter:
+    """多进程部署时汇总各worker的指标
+
+    每个worker定期把本进程指标的快照写到共享目录（worker-<pid>-<时间戳>.json，
+    pid 会被重启后的新worker复用，文件名带上该进程首次写快照的时间，不会覆盖已退出worker的快照），
+    /metrics 由处理该请求的worker读取目录下所有快照累加后输出。
+    worker退出时写最后一次快照，主进程随后用 retire 把它并入 retired.json 并删除，
+    计数器不会因worker重启而回退，快照文件数也不会随 max_requests 重启无限增长。
+    """
+
+    def __init__(self, metrics: Metrics, directory: str, interval: float = 5.0):
+        self.metrics = metrics
+        self.directory = directory
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._started_pid = None
+        self._snapshot_pid = None
+        self._snapshot_name = None
+        os.makedirs(directory, exist_ok=True)
+
+    def ensure_started(self):
+        """在worker进程内启动定时写快照的线程；fork出的子进程各自启动一次"""
+        with self._lock:
+            if self._started_pid == os.getpid():
+                return
+            self._started_pid = os.getpid()
+        threading.Thread(target=self._run, name="metrics-exporter", daemon=True).start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            self.dump()
+
+    def _snapshot_path(self) -> str:
+        with self._lock:
+            if self._snapshot_pid != os.getpid():
+                self._snapshot_pid = os.getpid()
+                self._snapshot_name = f"worker-{os.getpid()}-{time.time_ns()}.json"
+            return os.path.join(self.directory, self._snapshot_name)
+
+    def dump(self):
+        _write_json(self._snapshot_path(), self.metrics.snapshot())
+
+    def collect(self) -> Metrics:
+        """先写出本进程的最新快照，再合并已退出worker的汇总和所有worker的快照"""
+        self.dump()
+        snapshots = [(os.path.basename(path), _read_json(path))
+                     for path in glob.glob(os.path.join(self.directory, "worker-*.json"))]
+        # 汇总在读完各快照之后再读：retire 先写汇总再删快照，这样每个worker恰好计入一次
+        retired = _read_json(os.path.join(self.directory, RETIRED_SNAPSHOT)) or {}
+        folded = set(retired.get("folded", []))
+
+        merged = Metrics()
+        if retired:
+            merged.merge(retired["metrics"])
+        for name, snapshot in snapshots:
+            if snapshot is not None and name not in folded:
+                merged.merge(snapshot)
+        return merged
+
+    @staticmethod
+    def retire(directory: str, pid: int):
+        """把已退出worker的快照并入 retired.json 后删除，由gunicorn主进程在回收worker时调用"""
+        paths = glob.glob(os.path.join(directory, f"worker-{pid}-*.json"))
+        if not paths:
+            return
+        retired_path = os.path.join(directory, RETIRED_SNAPSHOT)
+        retired = _read_json(retired_path) or {"metrics": Metrics().snapshot(), "folded": []}
+        merged = Metrics()
+        merged.merge(retired["metrics"])
+        names = []
+        for path in paths:
+            snapshot = _read_json(path)
+            if snapshot is not None:
+                merged.merge(snapshot)
+            names.append(os.path.basename(path))
+
+        # folded 记录已并入汇总、但可能还没删除的快照，collect 据此跳过；已删除的不必再记
+        folded = [name for name in retired["folded"] if os.path.exists(os.path.join(directory, name))]
+        _write_json(retired_path, {"metrics": merged.snapshot(), "folded": folded + names})
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+def error_status(result: Dict) -> int:
+    """把客户端返回的错误字典映射为HTTP状态码"""
+    if result.get("queue_timeout") or result.get("circuit_open"):
+        return 503
+    if result.get("timeout"):
+        return 504
+    return 502
+
+
+def validate_profile(profile) -> Optional[str]:
+    if not isinstance(profile, dict) or not profile:
+        return "profile 必须是非空对象"
+    tags = profile.get("tags", [])
+    if not isinstance(tags, list) or not all(isinstance(tag, str) for tag in tags):
+        return "profile.tags 必须是字符串数组"
+    return None
+
+
+def validate_history(history) -> Optional[str]:
+    if not isinstance(history, list) or not history:
+        return "history 必须是非空数组"
+    for message in history:
+        if not isinstance(message, dict) or not isinstance(message.get("content"), str) \
+                or not isinstance(message.get("role"), str):
+            return "history 的每一项必须包含字符串字段 role 和 content"
+    return None
+
+
+def validate_topics(topics) -> Optional[str]:
+    if not isinstance(topics, list) or not topics or not all(isinstance(topic, str) for topic in topics):
+        return "topics 必须是非空字符串数组"
+    return None
+
+
+def create_app(client_factory: Optional[Callable[[], GLMClient]] = None,
+               analyzer: Optional[EmotionAnalyzer] = None,
+               metrics: Optional[Metrics] = None,
+               metrics_dir: Optional[str] = None,
+               timeout: Optional[float] = None) -> Flask:
+    """创建Flask应用
+
+    GLM客户端在每个进程收到第一个请求时才创建：连接池和SQLite连接都不能跨fork共用，
+    gunicorn 以 preload 方式加载应用时，主进程只导入模块、加载情感词典，不建立任何连接。
+    metrics_dir 默认取环境变量 SOULCONNECT_METRICS_DIR，设置后 /metrics 汇总所有worker。
+    """
+    timeout = timeout or float(os.getenv("SOULCONNECT_API_TIMEOUT", "20"))
+    client_factory = client_factory or (lambda: GLMClient(request_deadline=timeout))
+    analyzer = analyzer or EmotionAnalyzer()
+    metrics = metrics or get_shared_metrics()
+    metrics_dir = metrics_dir or os.getenv("SOULCONNECT_METRICS_DIR")
+    exporter = WorkerMetricsExporter(metrics, metrics_dir) if metrics_dir else None
+
+    app = Flask(__name__)
+    # gunicorn 的 worker_exit 钩子通过它在worker退出前写最后一次快照
+    app.extensions["metrics_exporter"] = exporter
+    app.config["MAX_CONTENT_LENGTH"] = MAX_REQUEST_BYTES
+    app.json.ensure_ascii = False
+    app.json.sort_keys = False
+    started_at = time.time()
+    clients: List[GLMClient] = []
+    client_lock = threading.Lock()
+
+    def get_client() -> GLMClient:
+        with client_lock:
+            if not clients:
+                clients.append(client_factory())
+            return clients[0]
+
+    def error_response(message: str, status: int):
+        return jsonify({"error": message}), status
+
+    def result_response(result: Dict):
+        if "error" in result:
+            response = jsonify(result)
+            response.status_code = error_status(result)
+            if response.status_code == 503:
+                response.headers["Retry-After"] = "1"
+            return response
+        return jsonify(result)
+
+    def read_body() -> Dict:
+        data = request.get_json(silent=True)
+        return data if isinstance(data, dict) else {}
+
+    @app.before_request
+    def start_exporter():
+        if exporter is not None:
+            exporter.ensure_started()
+
+    @app.after_request
+    def count_request(response):
+        metrics.inc(API_REQUEST_METRIC, endpoint=request.endpoint or "unknown", status=response.status_code)
+        return response
+
+    @app.post("/api/analyze_profile")
+    def analyze_profile():
+        profile = read_body().get("profile")
+        message = validate_profile(profile)
+        if message:
+            return error_response(message, 400)
+        with metrics.span("analyze_profile", source="api"):
+            result = get_client().analyze_profile(profile)
+        return result_response(result)
+
+    @app.post("/api/icebreaker")
+    def icebreaker():
+        data = read_body()
+        topics = data.get("topics")
+        style = data.get("style", "友好型")
+        nickname = data.get("nickname", "")
+        message = validate_topics(topics)
+        if message is None and not (isinstance(style, str) and isinstance(nickname, str)):
+            message = "style 和 nickname 必须是字符串"
+        if message:
+            return error_response(message, 400)
+        with metrics.span("icebreaker", source="api"):
+            result = get_client().generate_icebreaker_result(topics, style, nickname)
+        return result_response(result)
+
+    @app.post("/api/advice")
+    def advice():
+        history = read_body().get("history")
+        message = validate_history(history)
+        if message:
+            return error_response(message, 400)
+        with metrics.span("advice", source="api"):
+            result = get_client().provide_conversation_advice(history)
+        return result_response(result)
+
+    @app.post("/api/emotion")
+    def emotion():
+        text = read_body().get("text")
+        if not isinstance(text, str):
+            return error_response("text 必须是字符串", 400)
+        with metrics.span("emotion", source="api"):
+            result = analyzer.analyze_text_emotion(text)
+        return jsonify(result)
+
+    @app.get("/healthz")
+    def healthz():
+        payload = {"status": "ok", "pid": os.getpid(), "uptime": round(time.time() - started_at, 1)}
+        # 只报告已创建的客户端，健康检查本身不建立连接
+        if clients:
+            client = clients[0]
+            upstream = client.circuit_breaker.stats()
+            payload.update(upstream=upstream, queue_depth=client.scheduler.stats()["queue_depth"],
+                           cache=client.cache.stats())
+            if upstream["state"] == "open":
+                payload["status"] = "degraded"
+        return jsonify(payload)
+
+    @app.get("/metrics")
+    def prometheus_metrics():
+        source = exporter.collect() if exporter is not None else metrics
+        return Response(source.to_prometheus(), mimetype="text/plain; version=0.0.4")
+
+    @app.errorhandler(413)
+    def too_large(_error):
+        return error_response(f"请求体超过 {MAX_REQUEST_BYTES // 1024} KB", 413)
+
+    return app
+
+
+app = create_app()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="SoulConnect Coach HTTP接口（单进程调试用，生产环境用 gunicorn）")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args(argv)
+    app.run(host=args.host, port=args.port, threaded=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
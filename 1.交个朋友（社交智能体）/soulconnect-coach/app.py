@@ -1,389 +1,578 @@
-import streamlit as st
-import pandas as pd
-import plotly.express as px
-from datetime import datetime
-import json
-import os
-from dotenv import load_dotenv
-
-# 导入自定义模块
-from utils.glm_client import GLMClient
-from utils.emotion_analyzer import EmotionAnalyzer
-
-# 加载环境变量
-load_dotenv()
-
-# 页面配置
-st.set_page_config(
-    page_title="SoulConnect Coach - 智能社交破冰教练",
-    page_icon="💬",
-    layout="wide",
-    initial_sidebar_state="expanded"
-)
-
-# 加载自定义CSS
-def load_css():
-    """修复：更安全的CSS加载"""
-    try:
-        st.markdown("""
-        <style>
-        .companion-header {
-            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-            color: white;
-            padding: 2rem;
-            border-radius: 15px;
-            text-align: center;
-            margin-bottom: 2rem;
-        }
-        /* 简化其他样式，移除可能冲突的样式 */
-        </style>
-        """, unsafe_allow_html=True)
-    except Exception as e:
-        st.warning("样式加载遇到问题，但不影响功能使用")
-
-load_css()
-
-class SoulConnectApp:
-    def __init__(self):
-        self.glm_client = GLMClient()
-        self.emotion_analyzer = EmotionAnalyzer()
-        self.initialize_session_state()
-    
-    def initialize_session_state(self):
-    """修复：更安全的会话状态初始化"""
-    default_states = {
-        'messages': [],
-        'user_info_set': False,
-        'current_emotion': "未知",
-        'conversation_count': 0,
-        'last_reset': datetime.now().isoformat()
-    }
-    
-    for key, value in default_states.items():
-        if key not in st.session_state:
-            st.session_state[key] = value
-    
-    def render_header(self):
-        """渲染页面头部"""
-        st.markdown("""
-        <div class="main-header">
-            <h1>💬 SoulConnect Coach</h1>
-            <p>你的智能社交破冰教练 - 让每次对话都有温度</p>
-        </div>
-        """, unsafe_allow_html=True)
-    
-    def sample_profiles(self):
-        """示例用户资料库"""
-        return [
-            {
-                "id": 1,
-                "nickname": "音乐爱好者小张",
-                "age": 24,
-                "tags": ["吉他", "民谣", "旅行", "摄影", "咖啡"],
-                "bio": "用音乐记录生活，用脚步丈量世界",
-                "recent_moments": "刚刚在丽江古城听到一首超棒的民谣！准备学起来🎵"
-            },
-            {
-                "id": 2, 
-                "nickname": "读书人小王",
-                "age": 26,
-                "tags": ["阅读", "写作", "哲学", "历史", "茶道"],
-                "bio": "在书海中寻找智慧，在文字间表达思考",
-                "recent_moments": "最近在读《人类简史》，对认知革命有了新的理解📚"
-            },
-            {
-                "id": 3,
-                "nickname": "运动达人小李",
-                "age": 23,
-                "tags": ["篮球", "健身", "跑步", "营养", "健康"],
-                "bio": "生命在于运动，健康源于坚持",
-                "recent_moments": "今天完成了半马训练，刷新了个人记录！🏃‍♂️"
-            },
-            {
-                "id": 4,
-                "nickname": "美食家小赵",
-                "age": 25,
-                "tags": ["烹饪", "烘焙", "探店", "咖啡", "美食摄影"],
-                "bio": "吃货的人生不需要解释，唯美食与爱不可辜负",
-                "recent_moments": "发现了一家超赞的意大利餐厅，提拉米苏绝了！🍰"
-            }
-        ]
-    
-    def analyze_user_profile(self, profile):
-        """分析用户资料"""
-        with st.spinner("正在分析用户资料并生成破冰建议..."):
-            result = self.glm_client.analyze_profile(profile)
-            
-            if "error" in result:
-                st.error(f"分析失败：{result['error']}")
-                return None
-            
-            st.session_state.analysis_result = result
-            st.session_state.current_target = profile
-            st.session_state.user_progress["conversations_started"] += 1
-            
-            return result
-    
-    def render_profile_analysis(self, analysis_result, profile):
-        """渲染资料分析结果"""
-        st.subheader(f"📊 用户分析：{profile['nickname']}")
-        
-        col1, col2 = st.columns([2, 1])
-        
-        with col1:
-            st.write("**用户画像分析：**")
-            st.info(analysis_result.get("analysis", "分析完成"))
-            
-            st.write("**推荐聊天风格：**")
-            for style in analysis_result.get("conversation_styles", []):
-                st.write(f"• {style}")
-        
-        with col2:
-            st.write("**基础信息：**")
-            st.write(f"👤 年龄：{profile.get('age', '未知')}")
-            st.write(f"🏷️ 标签：{', '.join(profile.get('tags', []))}")
-    
-    def render_topic_suggestions(self, analysis_result):
-        """渲染话题建议"""
-        st.subheader("💡 推荐话题")
-        
-        topics = analysis_result.get("topics", [])
-        for i, topic in enumerate(topics[:5], 1):
-            st.write(f"{i}. {topic}")
-        
-        # 话题选择
-        selected_topic = st.selectbox(
-            "选择你想要深入的话题：",
-            options=topics,
-            key="selected_topic"
-        )
-        
-        return selected_topic
-    
-    def render_icebreaker_generator(self, analysis_result, profile, selected_topic):
-        """渲染破冰生成器"""
-        st.subheader("🎯 破冰开场白生成")
-        
-        # 风格选择
-        style_options = analysis_result.get("conversation_styles", ["友好型", "好奇型", "幽默型"])
-        selected_style = st.radio(
-            "选择聊天风格：",
-            options=style_options,
-            horizontal=True
-        )
-        
-        if st.button("✨ 生成智能开场白", type="primary"):
-            topics_to_use = [selected_topic] + [t for t in analysis_result.get("topics", []) if t != selected_topic][:2]
-            
-            icebreaker = self.glm_client.generate_icebreaker(
-                topics_to_use, 
-                selected_style, 
-                profile['nickname']
-            )
-            
-            st.markdown("""
-            <div class="icebreaker-example">
-                <strong>💡 推荐开场白：</strong><br>
-            """, unsafe_allow_html=True)
-            st.write(icebreaker)
-            st.markdown("</div>", unsafe_allow_html=True)
-            
-            # 保存到对话历史
-            st.session_state.conversation_history.append({
-                "role": "coach",
-                "content": f"建议开场白：{icebreaker}",
-                "timestamp": datetime.now().strftime("%H:%M:%S"),
-                "type": "icebreaker"
-            })
-    
-    def render_conversation_simulator(self, profile):
-        """渲染对话模拟器"""
-        st.subheader("💬 对话模拟练习")
-        
-        st.write(f"与 **{profile['nickname']}** 的对话练习：")
-        
-        # 显示对话历史
-        for msg in st.session_state.conversation_history[-10:]:  # 显示最近10条
-            if msg["role"] == "coach":
-                st.chat_message("assistant").write(msg["content"])
-            else:
-                st.chat_message("user").write(msg["content"])
-        
-        # 用户输入
-        user_input = st.chat_input("在这里输入你的回复...")
-        
-        if user_input:
-            # 添加用户消息到历史
-            st.session_state.conversation_history.append({
-                "role": "user",
-                "content": user_input,
-                "timestamp": datetime.now().strftime("%H:%M:%S"),
-                "type": "user_message"
-            })
-            
-            # 分析对话并提供建议
-            with st.spinner("正在分析对话..."):
-                advice = self.glm_client.provide_conversation_advice(
-                    st.session_state.conversation_history
-                )
-                
-                if "error" not in advice:
-                    # 显示建议
-                    st.markdown("""
-                    <div class="advice-card">
-                        <strong>🤔 对话建议：</strong>
-                    </div>
-                    """, unsafe_allow_html=True)
-                    
-                    col1, col2 = st.columns(2)
-                    
-                    with col1:
-                        st.write("**情绪分析：**")
-                        st.write(advice.get("emotion_analysis", "分析中..."))
-                        
-                        st.write("**改进建议：**")
-                        for suggestion in advice.get("improvement_suggestions", []):
-                            st.write(f"• {suggestion}")
-                    
-                    with col2:
-                        st.write("**推荐话题：**")
-                        for topic in advice.get("suggested_topics", []):
-                            st.write(f"• {topic}")
-                        
-                        st.write("**回复建议：**")
-                        st.info(advice.get("response_suggestion", ""))
-    
-    def render_progress_dashboard(self):
-        """渲染进度看板"""
-        st.sidebar.subheader("📈 你的社交进步")
-        
-        progress = st.session_state.user_progress
-        
-        col1, col2, col3 = st.sidebar.columns(3)
-        
-        with col1:
-            st.metric("开启对话", progress["conversations_started"])
-        
-        with col2:
-            st.metric("成功破冰", progress["successful_icebreakers"])
-        
-        with col3:
-            st.metric("对话评分", "8.5/10")
-        
-        # 技能雷达图数据
-        skills_data = {
-            "技能类型": ["话题开启", "情绪感知", "对话延续", "深度连接", "幽默感"],
-            "当前水平": [8, 7, 6, 5, 7],
-            "目标水平": [9, 8, 8, 7, 8]
-        }
-        
-        df = pd.DataFrame(skills_data)
-        fig = px.line_polar(df, r='当前水平', theta='技能类型', 
-                           line_close=True, title="社交技能雷达图")
-        st.sidebar.plotly_chart(fig, use_container_width=True)
-    
-    def run(self):
-        """运行主应用"""
-        self.render_header()
-        self.render_progress_dashboard()
-        
-        # 侧边栏 - 选择目标用户
-        st.sidebar.subheader("👥 选择练习对象")
-        sample_profiles = self.sample_profiles()
-        
-        selected_profile_id = st.sidebar.selectbox(
-            "选择目标用户：",
-            options=[p["id"] for p in sample_profiles],
-            format_func=lambda x: next(p["nickname"] for p in sample_profiles if p["id"] == x)
-        )
-        
-        selected_profile = next(p for p in sample_profiles if p["id"] == selected_profile_id)
-        
-        # 显示用户资料卡
-        st.sidebar.markdown("""
-        <div class="profile-card">
-            <strong>用户资料卡</strong>
-        </div>
-        """, unsafe_allow_html=True)
-        
-        st.sidebar.write(f"**昵称：** {selected_profile['nickname']}")
-        st.sidebar.write(f"**年龄：** {selected_profile.get('age', '未知')}")
-        st.sidebar.write(f"**标签：** {', '.join(selected_profile.get('tags', []))}")
-        st.sidebar.write(f"**简介：** {selected_profile.get('bio', '')}")
-        st.sidebar.write(f"**最近动态：** {selected_profile.get('recent_moments', '')}")
-        
-        # 分析按钮
-        if st.sidebar.button("🔍 分析此用户", type="secondary"):
-            self.analyze_user_profile(selected_profile)
-        
-        # 主内容区
-        if st.session_state.analysis_result and st.session_state.current_target:
-            analysis_result = st.session_state.analysis_result
-            current_target = st.session_state.current_target
-            
-            # 创建标签页
-            tab1, tab2, tab3 = st.tabs(["📊 用户分析", "🎯 破冰建议", "💬 对话练习"])
-            
-            with tab1:
-                self.render_profile_analysis(analysis_result, current_target)
-            
-            with tab2:
-                selected_topic = self.render_topic_suggestions(analysis_result)
-                self.render_icebreaker_generator(analysis_result, current_target, selected_topic)
-            
-            with tab3:
-                self.render_conversation_simulator(current_target)
-        
-        else:
-            # 欢迎页面
-            st.info("👈 请在左侧边栏选择一个目标用户，然后点击『分析此用户』开始使用")
-            
-            col1, col2 = st.columns(2)
-            
-            with col1:
-                st.subheader("🎯 核心功能")
-                st.write("""
-                - **智能资料分析**：深度解析用户资料，发现聊天切入点
-                - **个性化破冰建议**：根据不同风格生成自然开场白
-                - **实时对话辅导**：在对话中提供实时建议和改进方向
-                - **社交技能培养**：记录进步，提升整体社交能力
-                """)
-            
-            with col2:
-                st.subheader("🚀 使用指南")
-                st.write("""
-                1. 在左侧选择目标用户
-                2. 点击「分析此用户」获取破冰建议
-                3. 选择合适的聊天风格生成开场白
-                4. 在对话模拟器中练习交流技巧
-                5. 查看分析报告，持续改进社交技能
-                """)
-
-class HeartCompanionApp:
-    def __init__(self):
-        try:
-            self.agent = EmotionalCompanionAgent()
-            self.profile_manager = UserProfileManager()
-            self.activity_recommender = ActivityRecommender()
-            self.initialize_session_state()
-        except Exception as e:
-            st.error(f"应用初始化失败: {str(e)}")
-            st.stop()
-    
-    def run(self):
-        """修复：添加错误处理的运行方法"""
-        try:
-            self.render_header()
-            # ... 其余代码保持不变
-        except Exception as e:
-            st.error("应用运行遇到问题，请刷新页面重试")
-            st.code(f"错误详情: {str(e)}")
-
-
-# 运行应用
-if __name__ == "__main__":
-    app = SoulConnectApp()
-
-    app.run()
-
-
+import streamlit as st
+from datetime import datetime
+import json
+import os
+import uuid
+from dotenv import load_dotenv
+
+# 导入自定义模块（GLM客户端和绘图库较重，首次用到时再导入）
+from utils.emotion_analyzer import EmotionAnalyzer
+from utils.conversation_state import ConversationState
+from utils.conversation_store import get_shared_conversation_store
+from utils.json_extractor import JSONStreamExtractor
+from utils.metrics import get_shared_metrics
+from utils.prefetcher import IcebreakerPrefetcher
+from utils.profile_store import ProfileStore
+from utils.skill_scoring import SKILLS, TARGET_LEVELS, SkillScorer
+
+# 加载环境变量
+load_dotenv()
+
+# 页面配置
+st.set_page_config(
+    page_title="SoulConnect Coach - 智能社交破冰教练",
+    page_icon="💬",
+    layout="wide",
+    initial_sidebar_state="expanded"
+)
+
+# 加载自定义CSS
+def load_css():
+    """修复：更安全的CSS加载"""
+    try:
+        st.markdown("""
+        <style>
+        .companion-header {
+            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
+            color: white;
+            padding: 2rem;
+            border-radius: 15px;
+            text-align: center;
+            margin-bottom: 2rem;
+        }
+        /* 简化其他样式，移除可能冲突的样式 */
+        </style>
+        """, unsafe_allow_html=True)
+    except Exception as e:
+        st.warning("样式加载遇到问题，但不影响功能使用")
+
+load_css()
+
+# 进程级共享资源：只在首次运行时构建，之后所有会话的每次重跑都直接复用
+@st.cache_resource
+def get_glm_client():
+    from utils.glm_client import GLMClient
+    return GLMClient()
+
+@st.cache_resource
+def get_emotion_analyzer():
+    return EmotionAnalyzer()
+
+@st.cache_resource
+def get_profile_store():
+    return ProfileStore()
+
+def get_user_id():
+    """用户标识保存在URL参数中，刷新页面或重启服务后仍能找回对话记录"""
+    user_id = st.experimental_get_query_params().get("uid", [None])[0]
+    if not user_id:
+        user_id = uuid.uuid4().hex
+        st.experimental_set_query_params(uid=user_id)
+    return user_id
+
+class SoulConnectApp:
+    def __init__(self):
+        self.emotion_analyzer = get_emotion_analyzer()
+        self.profile_store = get_profile_store()
+        # 对话记录和用户状态持久化到磁盘，会话里只保留最近几条
+        self.conversation_store = get_shared_conversation_store()
+        self.metrics = get_shared_metrics()
+        self.initialize_session_state()
+    
+    def initialize_session_state(self):
+        """修复：更安全的会话状态初始化"""
+        if 'user_id' not in st.session_state:
+            st.session_state.user_id = get_user_id()
+        user_id = st.session_state.user_id
+        store = self.conversation_store
+        
+        # 只在首次运行时求值，避免每次重跑都查询数据库
+        default_states = {
+            'messages': lambda: [],
+            'user_info_set': lambda: False,
+            'current_emotion': lambda: "未知",
+            'conversation_count': lambda: 0,
+            'last_reset': lambda: datetime.now().isoformat(),
+            # 增量维护的对话状态，从持久化记录恢复，会话内存不随对话增长
+            'conversation_history': lambda: ConversationState(
+                self.emotion_analyzer, max_recent=20, store=store, user_id=user_id
+            ),
+            'history_pages': lambda: 0,
+            'analysis_result': lambda: store.get_state(user_id, "analysis_result"),
+            'current_target': lambda: store.get_state(user_id, "current_target"),
+            'user_progress': lambda: store.get_state(user_id, "user_progress", {
+                "conversations_started": 0,
+                "successful_icebreakers": 0
+            }),
+            'skill_scorer': lambda: self.load_skill_scorer(user_id),
+            'skill_chart': lambda: (None, None)
+        }
+        
+        for key, factory in default_states.items():
+            if key not in st.session_state:
+                st.session_state[key] = factory()
+    
+    @property
+    def glm_client(self):
+        """首次调用模型时才构建客户端，冷启动的首屏不必导入 requests 等依赖"""
+        return get_glm_client()
+    
+    @property
+    def icebreaker_prefetcher(self):
+        """会话内的开场白预取器，首次用到时创建"""
+        if 'icebreaker_prefetcher' not in st.session_state:
+            st.session_state.icebreaker_prefetcher = IcebreakerPrefetcher(self.glm_client)
+        return st.session_state.icebreaker_prefetcher
+    
+    def load_skill_scorer(self, user_id):
+        """恢复技能评分的累计量；启用评分前已有的对话按批回放一次"""
+        aggregates = self.conversation_store.get_state(user_id, "skill_aggregates")
+        scorer = SkillScorer(self.emotion_analyzer, aggregates)
+        if aggregates is None and self.conversation_store.count(user_id):
+            scorer.observe_many(self.conversation_store.iter_messages(user_id))
+            self.conversation_store.set_state(user_id, "skill_aggregates", scorer.to_dict())
+        return scorer
+    
+    def record_message(self, message):
+        """记录一条对话消息，同时增量更新技能评分"""
+        scorer = st.session_state.skill_scorer
+        version = scorer.version
+        with self.metrics.span("emotion", role=message["role"]):
+            st.session_state.conversation_history.append(message)
+            scorer.observe(message)
+        if scorer.version != version:
+            self.conversation_store.set_state(st.session_state.user_id, "skill_aggregates", scorer.to_dict())
+    
+    def save_user_state(self, *keys):
+        """把会话状态写回持久化存储"""
+        for key in keys:
+            self.conversation_store.set_state(st.session_state.user_id, key, st.session_state[key])
+    
+    def render_header(self):
+        """渲染页面头部"""
+        st.markdown("""
+        <div class="main-header">
+            <h1>💬 SoulConnect Coach</h1>
+            <p>你的智能社交破冰教练 - 让每次对话都有温度</p>
+        </div>
+        """, unsafe_allow_html=True)
+    
+    def analyze_user_profile(self, profile):
+        """分析用户资料"""
+        with st.spinner("正在分析用户资料并生成破冰建议..."), self.metrics.span("analyze_profile") as span:
+            result = self.glm_client.analyze_profile(profile)
+            span["attributes"].update(reused=bool(result.get("reused")), error="error" in result)
+            
+            if "error" in result:
+                st.error(f"分析失败：{result['error']}")
+                return None
+            
+            st.session_state.analysis_result = result
+            st.session_state.current_target = profile
+            st.session_state.user_progress["conversations_started"] += 1
+            self.save_user_state("analysis_result", "current_target", "user_progress")
+            self.prefetch_icebreakers(result, profile)
+            
+            return result
+    
+    @staticmethod
+    def icebreaker_topics(analysis_result, selected_topic):
+        """生成开场白所用的话题：选中的话题加上另外两个推荐话题"""
+        return [selected_topic] + [t for t in analysis_result.get("topics", []) if t != selected_topic][:2]
+    
+    @staticmethod
+    def icebreaker_styles(analysis_result):
+        return analysis_result.get("conversation_styles", ["友好型", "好奇型", "幽默型"])
+    
+    def prefetch_icebreakers(self, analysis_result, profile, selected_topic=None):
+        """分析完成后在后台按默认话题为每种风格预先生成开场白，换目标时取消上一目标的预取"""
+        topics = analysis_result.get("topics", [])
+        if not topics:
+            return
+        topics_to_use = self.icebreaker_topics(analysis_result, selected_topic or topics[0])
+        self.icebreaker_prefetcher.prefetch(profile.get("id", profile["nickname"]), [
+            (topics_to_use, style, profile["nickname"]) for style in self.icebreaker_styles(analysis_result)
+        ])
+    
+    def on_topic_changed(self, analysis_result):
+        """换话题后原话题的预取用不上了，取消并按新话题重新预取"""
+        self.icebreaker_prefetcher.cancel()
+        self.prefetch_icebreakers(analysis_result, st.session_state.current_target,
+                                  st.session_state.selected_topic)
+    
+    def on_target_changed(self):
+        """换了目标用户，当前目标的预取不再需要，取消以免占用批量额度"""
+        self.icebreaker_prefetcher.cancel()
+    
+    def render_profile_analysis(self, analysis_result, profile):
+        """渲染资料分析结果"""
+        st.subheader(f"📊 用户分析：{profile['nickname']}")
+        
+        col1, col2 = st.columns([2, 1])
+        
+        with col1:
+            st.write("**用户画像分析：**")
+            st.info(analysis_result.get("analysis", "分析完成"))
+            
+            st.write("**推荐聊天风格：**")
+            for style in analysis_result.get("conversation_styles", []):
+                st.write(f"• {style}")
+        
+        with col2:
+            st.write("**基础信息：**")
+            st.write(f"👤 年龄：{profile.get('age', '未知')}")
+            st.write(f"🏷️ 标签：{', '.join(profile.get('tags', []))}")
+    
+    def render_topic_suggestions(self, analysis_result):
+        """渲染话题建议"""
+        st.subheader("💡 推荐话题")
+        
+        topics = analysis_result.get("topics", [])
+        for i, topic in enumerate(topics[:5], 1):
+            st.write(f"{i}. {topic}")
+        
+        # 话题选择
+        selected_topic = st.selectbox(
+            "选择你想要深入的话题：",
+            options=topics,
+            key="selected_topic",
+            on_change=self.on_topic_changed,
+            args=(analysis_result,)
+        )
+        
+        return selected_topic
+    
+    def render_icebreaker_generator(self, analysis_result, profile, selected_topic):
+        """渲染破冰生成器"""
+        st.subheader("🎯 破冰开场白生成")
+        
+        # 风格选择
+        style_options = self.icebreaker_styles(analysis_result)
+        selected_style = st.radio(
+            "选择聊天风格：",
+            options=style_options,
+            horizontal=True
+        )
+        
+        if st.button("✨ 生成智能开场白", type="primary"):
+            topics_to_use = self.icebreaker_topics(analysis_result, selected_topic)
+            
+            st.markdown("""
+            <div class="icebreaker-example">
+                <strong>💡 推荐开场白：</strong><br>
+            """, unsafe_allow_html=True)
+            
+            # 优先使用后台预取的结果，预取还在进行时接着它的输出显示；
+            # 否则实时流式生成，首个token到达即开始渲染
+            placeholder = st.empty()
+            with self.metrics.span("icebreaker", style=selected_style) as span:
+                stream = self.icebreaker_prefetcher.take(topics_to_use, selected_style, profile['nickname'])
+                span["attributes"]["prefetched"] = stream is not None
+                if stream is None:
+                    stream = self.glm_client.generate_icebreaker_stream(
+                        topics_to_use, 
+                        selected_style, 
+                        profile['nickname']
+                    )
+                icebreaker = ""
+                for delta in stream:
+                    icebreaker += delta
+                    placeholder.markdown(icebreaker + "▌")
+            placeholder.markdown(icebreaker)
+            st.markdown("</div>", unsafe_allow_html=True)
+            
+            # 保存到对话历史
+            self.record_message({
+                "role": "coach",
+                "content": f"建议开场白：{icebreaker}",
+                "timestamp": datetime.now().strftime("%H:%M:%S"),
+                "type": "icebreaker"
+            })
+    
+    def render_conversation_simulator(self, profile):
+        """渲染对话模拟器"""
+        st.subheader("💬 对话模拟练习")
+        
+        st.write(f"与 **{profile['nickname']}** 的对话练习：")
+        
+        conversation = st.session_state.conversation_history
+        flow = conversation.flow_status()
+        st.caption(f"对话状态：{flow['status']} · {flow['suggestion']}")
+        
+        # 显示对话历史：默认最近10条，更早的按页从磁盘读取
+        recent = conversation.recent_messages(10)
+        if recent and recent[0]["seq"] > 0:
+            if st.button("⬆️ 加载更早的消息", key="load_older_messages"):
+                st.session_state.history_pages += 1
+        
+        older = []
+        if recent and st.session_state.history_pages:
+            older = self.conversation_store.page(
+                st.session_state.user_id,
+                before_seq=recent[0]["seq"],
+                limit=10 * st.session_state.history_pages
+            )
+        
+        for msg in older + recent:
+            if msg["role"] == "coach":
+                st.chat_message("assistant").write(msg["content"])
+            else:
+                st.chat_message("user").write(msg["content"])
+        
+        # 用户输入（st.chat_input 不能放在标签页里，改用表单）
+        with st.form("simulator_input", clear_on_submit=True):
+            user_input = st.text_input("你的回复", placeholder="在这里输入你的回复...", label_visibility="collapsed")
+            st.form_submit_button("发送")
+        
+        if user_input:
+            # 添加用户消息到历史
+            self.record_message({
+                "role": "user",
+                "content": user_input,
+                "timestamp": datetime.now().strftime("%H:%M:%S"),
+                "type": "user_message"
+            })
+            
+            # 分析对话并提供建议（流式接收，边生成边显示）
+            advice = self.stream_conversation_advice(st.session_state.conversation_history)
+            
+            if "error" not in advice:
+                # 显示建议
+                st.markdown("""
+                <div class="advice-card">
+                    <strong>🤔 对话建议：</strong>
+                </div>
+                """, unsafe_allow_html=True)
+                
+                col1, col2 = st.columns(2)
+                
+                with col1:
+                    st.write("**情绪分析：**")
+                    st.write(advice.get("emotion_analysis", "分析中..."))
+                    
+                    st.write("**改进建议：**")
+                    for suggestion in advice.get("improvement_suggestions", []):
+                        st.write(f"• {suggestion}")
+                
+                with col2:
+                    st.write("**推荐话题：**")
+                    for topic in advice.get("suggested_topics", []):
+                        st.write(f"• {topic}")
+                    
+                    st.write("**回复建议：**")
+                    st.info(advice.get("response_suggestion", ""))
+
+    def stream_conversation_advice(self, conversation_history):
+        """流式获取对话建议，生成过程中实时显示原始输出"""
+        from utils.glm_client import GLMStreamError
+        
+        placeholder = st.empty()
+        content = ""
+        extractor = JSONStreamExtractor()
+        with self.metrics.span("advice"):
+            stream = self.glm_client.stream_conversation_advice(conversation_history)
+            try:
+                for delta in stream:
+                    content += delta
+                    placeholder.caption(f"正在分析对话... {content}")
+                    # JSON对象一闭合就停止接收，忽略模型附加的说明文字
+                    if extractor.feed(delta) is not None:
+                        break
+            except GLMStreamError as e:
+                placeholder.empty()
+                st.error(f"分析失败：{e}")
+                return {"error": str(e)}
+            finally:
+                stream.close()
+            
+            placeholder.empty()
+            return self.glm_client.parse_conversation_advice(content)
+    
+    def render_progress_dashboard(self, container):
+        """渲染进度看板，container 为侧边栏顶部预留的展开面板"""
+        progress = st.session_state.user_progress
+        scorer = st.session_state.skill_scorer
+        
+        col1, col2, col3 = container.columns(3)
+        
+        with col1:
+            st.metric("开启对话", progress["conversations_started"])
+        
+        with col2:
+            st.metric("成功破冰", scorer.aggregates["successful_icebreakers"])
+        
+        with col3:
+            st.metric("对话评分", f"{scorer.overall()}/10")
+        
+        # 评分累计量没有变化时复用上次的图表，不重新构建
+        version, fig = st.session_state.skill_chart
+        if fig is None or version != scorer.version:
+            # 直接用 graph_objects 画两条闭合折线，不经过 DataFrame 和 plotly.express
+            import plotly.graph_objects as go
+            
+            scores = scorer.scores()
+            theta = SKILLS + SKILLS[:1]
+            current = [scores[skill] for skill in SKILLS]
+            fig = go.Figure([
+                go.Scatterpolar(r=current + current[:1], theta=theta, name="当前水平"),
+                go.Scatterpolar(r=TARGET_LEVELS + TARGET_LEVELS[:1], theta=theta, name="目标水平",
+                                line={"dash": "dot"})
+            ])
+            fig.update_layout(title="社交技能雷达图", polar={"radialaxis": {"range": [0, 10]}})
+            st.session_state.skill_chart = (scorer.version, fig)
+        container.plotly_chart(fig, use_container_width=True)
+    
+    def run(self):
+        """运行主应用"""
+        self.render_header()
+        # 先占住侧边栏顶部的位置，等本轮对话处理完再填入最新的评分；
+        # 用展开面板而不是空容器占位，streamlit.testing 的 AppTest 不支持无类型的容器
+        dashboard = st.sidebar.expander("📈 你的社交进步", expanded=True)
+        
+        # 侧边栏 - 选择目标用户
+        st.sidebar.subheader("👥 选择练习对象")
+        profile_store = self.profile_store
+        
+        # 按兴趣标签推荐最合适的练习对象，资料库很大时不必在下拉框里翻找
+        my_tags = st.sidebar.multiselect(
+            "你的兴趣标签：",
+            options=profile_store.popular_tags(30),
+            key="my_tags"
+        )
+        recommendations = profile_store.most_compatible(my_tags, limit=5, method="weighted") if my_tags else []
+        if recommendations:
+            candidate_ids = [item["id"] for item in recommendations]
+            st.sidebar.caption("为你推荐：" + "、".join(
+                f"{item['nickname']}（共同兴趣：{'、'.join(item['shared_tags'])}）" for item in recommendations[:3]
+            ))
+        else:
+            candidate_ids = profile_store.ids(limit=200)
+        
+        selected_profile_id = st.sidebar.selectbox(
+            "选择目标用户：",
+            options=candidate_ids,
+            format_func=profile_store.nickname,
+            on_change=self.on_target_changed
+        )
+        
+        selected_profile = profile_store.get(selected_profile_id)
+        
+        # 显示用户资料卡
+        st.sidebar.markdown("""
+        <div class="profile-card">
+            <strong>用户资料卡</strong>
+        </div>
+        """, unsafe_allow_html=True)
+        
+        st.sidebar.write(f"**昵称：** {selected_profile['nickname']}")
+        st.sidebar.write(f"**年龄：** {selected_profile.get('age', '未知')}")
+        st.sidebar.write(f"**标签：** {', '.join(selected_profile.get('tags', []))}")
+        st.sidebar.write(f"**简介：** {selected_profile.get('bio', '')}")
+        st.sidebar.write(f"**最近动态：** {selected_profile.get('recent_moments', '')}")
+        
+        # 分析按钮
+        if st.sidebar.button("🔍 分析此用户", type="secondary"):
+            self.analyze_user_profile(selected_profile)
+        
+        # 主内容区
+        if st.session_state.analysis_result and st.session_state.current_target:
+            analysis_result = st.session_state.analysis_result
+            current_target = st.session_state.current_target
+            
+            # 创建标签页
+            tab1, tab2, tab3 = st.tabs(["📊 用户分析", "🎯 破冰建议", "💬 对话练习"])
+            
+            with tab1:
+                self.render_profile_analysis(analysis_result, current_target)
+            
+            with tab2:
+                selected_topic = self.render_topic_suggestions(analysis_result)
+                self.render_icebreaker_generator(analysis_result, current_target, selected_topic)
+            
+            with tab3:
+                self.render_conversation_simulator(current_target)
+        
+        else:
+            # 欢迎页面
+            st.info("👈 请在左侧边栏选择一个目标用户，然后点击『分析此用户』开始使用")
+            
+            col1, col2 = st.columns(2)
+            
+            with col1:
+                st.subheader("🎯 核心功能")
+                st.write("""
+                - **智能资料分析**：深度解析用户资料，发现聊天切入点
+                - **个性化破冰建议**：根据不同风格生成自然开场白
+                - **实时对话辅导**：在对话中提供实时建议和改进方向
+                - **社交技能培养**：记录进步，提升整体社交能力
+                """)
+            
+            with col2:
+                st.subheader("🚀 使用指南")
+                st.write("""
+                1. 在左侧选择目标用户
+                2. 点击「分析此用户」获取破冰建议
+                3. 选择合适的聊天风格生成开场白
+                4. 在对话模拟器中练习交流技巧
+                5. 查看分析报告，持续改进社交技能
+                """)
+        
+        self.render_progress_dashboard(dashboard)
+        if os.getenv("SOULCONNECT_DEBUG") or st.experimental_get_query_params().get("debug"):
+            self.render_debug_panel()
+    
+    def render_debug_panel(self):
+        """性能调试面板：各阶段耗时分位数和token用量（本次重跑的渲染耗时在下次重跑时计入）"""
+        with st.sidebar.expander("🛠️ 性能指标"):
+            summary = self.metrics.summary()
+            rows = [
+                {
+                    "阶段": stage,
+                    "次数": stats["count"],
+                    "p50 (ms)": round(stats["p50"] * 1000, 1),
+                    "p95 (ms)": round(stats["p95"] * 1000, 1),
+                    "p99 (ms)": round(stats["p99"] * 1000, 1)
+                }
+                for stage, stats in sorted(summary["stages"].items())
+            ]
+            if rows:
+                st.dataframe(rows, hide_index=True, use_container_width=True)
+            else:
+                st.caption("暂无数据")
+            for name, value in summary["counters"].items():
+                st.caption(f"{name}: {value:g}")
+            st.download_button("导出 Prometheus 文本", self.metrics.to_prometheus(),
+                               file_name="soulconnect_metrics.prom", mime="text/plain")
+            st.download_button("导出 JSONL", self.metrics.to_jsonl(),
+                               file_name="soulconnect_trace.jsonl", mime="application/jsonl")
+
+class HeartCompanionApp:
+    def __init__(self):
+        try:
+            self.agent = EmotionalCompanionAgent()
+            self.profile_manager = UserProfileManager()
+            self.activity_recommender = ActivityRecommender()
+            self.initialize_session_state()
+        except Exception as e:
+            st.error(f"应用初始化失败: {str(e)}")
+            st.stop()
+    
+    def run(self):
+        """修复：添加错误处理的运行方法"""
+        try:
+            self.render_header()
+            # ... 其余代码保持不变
+        except Exception as e:
+            st.error("应用运行遇到问题，请刷新页面重试")
+            st.code(f"错误详情: {str(e)}")
+
+
+# 运行应用
+if __name__ == "__main__":
+    # 整次重跑（构建界面和其中的模型调用）记为 render 阶段
+    with get_shared_metrics().span("render"):
+        app = SoulConnectApp()
+
+        app.run()
+
+
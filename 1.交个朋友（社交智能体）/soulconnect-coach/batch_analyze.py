@@ -0,0 +1,44 @@
+"""批量分析用户资料（无界面模式）
+
+示例：
+    python batch_analyze.py profiles.jsonl results.jsonl --workers 8 --rate 5
+中断后重新执行同一命令即可从检查点继续；加 --no-resume 从头开始。
+"""
+import argparse
+import sys
+
+from dotenv import load_dotenv
+
+from utils.batch_pipeline import BatchAnalyzer
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="SoulConnect Coach 批量资料分析")
+    parser.add_argument("input", help="输入JSONL，每行一个用户资料")
+    parser.add_argument("output", help="输出JSONL，每行一个分析结果")
+    parser.add_argument("--workers", type=int, default=4, help="并发线程数")
+    parser.add_argument("--rate", type=float, default=None, help="每秒最多请求数")
+    parser.add_argument("--checkpoint", default=None, help="检查点文件，默认为 <output>.ckpt")
+    parser.add_argument("--no-resume", action="store_true", help="忽略已有检查点，从头处理")
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+
+    analyzer = BatchAnalyzer(workers=args.workers, rate_per_sec=args.rate)
+
+    def report(state):
+        print(f"已处理 {state['processed']} 条，失败 {state['failed']} 条", file=sys.stderr)
+
+    stats = analyzer.run(
+        args.input,
+        args.output,
+        checkpoint_path=args.checkpoint,
+        resume=not args.no_resume,
+        on_progress=report
+    )
+    print(f"完成：共处理 {stats['processed']} 条，失败 {stats['failed']} 条，耗时 {stats['elapsed']} 秒")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
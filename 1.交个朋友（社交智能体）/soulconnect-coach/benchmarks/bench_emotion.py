@@ -0,0 +1,108 @@
+"""EmotionAnalyzer 性能对比：旧版逐词扫描 vs 当前实现 vs 批量接口
+
+运行：python benchmarks/bench_emotion.py --messages 5000 --lexicon-size 100000
+额外词条写入临时二进制词表，通过内存映射加载。
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.emotion_analyzer import DEFAULT_NEGATIVE_WORDS, DEFAULT_POSITIVE_WORDS, EmotionAnalyzer
+from utils.sentiment_lexicon import build_lexicon_file
+
+
+def legacy_analyze(text, positive_words, negative_words):
+    """改造前的实现：每个词一次子串扫描，每次调用重新编译表情正则"""
+    text_lower = text.lower()
+    positive_count = sum(1 for word in positive_words if word in text_lower)
+    negative_count = sum(1 for word in negative_words if word in text_lower)
+    emoji_positive = len(re.findall(r'[😀-😍👍❤️💕🌟🎉]', text))
+    emoji_negative = len(re.findall(r'[😠-😩👎💔😢]', text))
+    total_positive = positive_count + emoji_positive
+    total_negative = negative_count + emoji_negative
+    if total_positive > total_negative:
+        return "positive", round(min(1.0, total_positive / 10), 2), total_positive, total_negative
+    if total_negative > total_positive:
+        return "negative", round(min(1.0, total_negative / 10), 2), total_positive, total_negative
+    return "neutral", 0.5, total_positive, total_negative
+
+
+def synthetic_lexicon(size, seed):
+    rng = random.Random(seed)
+    chars = [chr(code) for code in range(0x4E00, 0x4E00 + 3000)]
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(chars) for _ in range(rng.randint(2, 4))))
+    return words
+
+
+def synthetic_messages(count, words, seed):
+    rng = random.Random(seed)
+    fillers = ["今天", "我们", "一起", "去了", "那家店", "感觉", "真的", "还是", "有点", "😀", "😢", "！", "？"]
+    vocabulary = list(words)
+    return [
+        "".join(rng.choice(vocabulary) if rng.random() < 0.3 else rng.choice(fillers) for _ in range(rng.randint(5, 30)))
+        for _ in range(count)
+    ]
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=5000)
+    parser.add_argument("--lexicon-size", type=int, default=0, help="额外加入的随机词数量，0表示只用内置词表")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    positive = set(DEFAULT_POSITIVE_WORDS)
+    negative = set(DEFAULT_NEGATIVE_WORDS)
+    lexicon_paths = []
+    if args.lexicon_size:
+        extra = sorted(synthetic_lexicon(args.lexicon_size, args.seed))
+        positive.update(extra[::2])
+        negative.update(extra[1::2])
+        lexicon_path = os.path.join(tempfile.mkdtemp(), "bench.sclx")
+        build_lexicon_file({word: (1.0 if i % 2 == 0 else -1.0) for i, word in enumerate(extra)}, lexicon_path)
+        lexicon_paths.append(lexicon_path)
+
+    texts = synthetic_messages(args.messages, positive | negative, args.seed)
+
+    analyzer, build_time = timed(lambda: EmotionAnalyzer(lexicon_paths=lexicon_paths))
+    _, first_call_time = timed(lambda: analyzer.analyze_text_emotion(texts[0]))
+    # 旧版逐词扫描随词表线性变慢，只取部分消息估算
+    legacy_sample = texts[:max(1, min(len(texts), 200000 // max(len(positive) + len(negative), 1)))]
+    _, legacy_time = timed(lambda: [legacy_analyze(t, positive, negative) for t in legacy_sample])
+    single, single_time = timed(lambda: [analyzer.analyze_text_emotion(t) for t in texts])
+    # 批量接口首次调用才导入NumPy，先预热，避免把导入时间计入每条耗时
+    analyzer.analyze_batch(texts[:1])
+    batch, batch_time = timed(lambda: analyzer.analyze_batch(texts))
+
+    # 批量接口与逐条分析结果必须一致
+    for i, result in enumerate(single):
+        assert batch["positive_indicators"][i] == result["positive_indicators"]
+        assert batch["negative_indicators"][i] == result["negative_indicators"]
+        assert batch["scores"][i] == result["score"]
+        assert batch["emotions"][i] == {"positive": 1, "negative": -1, "neutral": 0}[result["emotion"]]
+
+    per_legacy = legacy_time / len(legacy_sample) * 1000
+    per_single = single_time / len(texts) * 1000
+    print(f"词表大小: {len(positive) + len(negative)}，消息数: {len(texts)}")
+    print(f"初始化（不加载词表文件）: {build_time * 1000:8.2f} ms")
+    print(f"首次分析（含映射词表）:   {first_call_time * 1000:8.2f} ms")
+    print(f"旧版逐词扫描:   {per_legacy:8.3f} ms/条")
+    print(f"当前逐条分析:   {per_single:8.3f} ms/条  ({per_legacy / per_single:.1f}x)")
+    print(f"analyze_batch:  {batch_time / len(texts) * 1000:8.3f} ms/条  ({single_time / batch_time:.1f}x 逐条)")
+
+if __name__ == "__main__":
+    main()
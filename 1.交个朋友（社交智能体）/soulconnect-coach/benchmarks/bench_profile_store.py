@@ -0,0 +1,66 @@
+"""ProfileStore 规模测试：构建耗时、内存占用和"最合适练习对象"查询延迟
+
+运行：python benchmarks/bench_profile_store.py --profiles 1000000
+标签按Zipf分布生成，模拟少数热门标签和大量冷门标签。
+"""
+import argparse
+import itertools
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.profile_store import ProfileStore
+
+
+def synthetic_profiles(count, tag_vocabulary, seed):
+    rng = random.Random(seed)
+    tags = [f"标签{i}" for i in range(tag_vocabulary)]
+    cum_weights = list(itertools.accumulate(1.0 / (rank + 1) for rank in range(tag_vocabulary)))
+    for profile_id in range(1, count + 1):
+        yield {
+            "id": profile_id,
+            "nickname": f"用户{profile_id}",
+            "age": rng.randint(18, 40),
+            "tags": rng.choices(tags, cum_weights=cum_weights, k=rng.randint(3, 6)),
+            "bio": "喜欢" + "、".join(rng.sample(tags[:200], 2)),
+            "recent_moments": f"第{profile_id}条动态"
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--profiles", type=int, default=1000000)
+    parser.add_argument("--tags", type=int, default=5000)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    store = ProfileStore(synthetic_profiles(args.profiles, args.tags, seed=7))
+    print(f"构建 {len(store)} 条资料：{time.perf_counter() - start:.1f} s")
+    usage = store.memory_usage()
+    print("内存占用：" + "，".join(f"{name} {size / 2 ** 20:.1f} MB" for name, size in usage.items()))
+
+    rng = random.Random(11)
+    queries = [store.row(rng.randrange(len(store)))["tags"] for _ in range(args.queries)]
+    for method in ("jaccard", "weighted"):
+        timings = []
+        for tags in queries:
+            begin = time.perf_counter()
+            store.most_compatible(tags, limit=5, method=method)
+            timings.append(time.perf_counter() - begin)
+        timings.sort()
+        print(f"{method:<9} 中位数 {statistics.median(timings) * 1000:6.2f} ms   "
+              f"p95 {timings[int(len(timings) * 0.95)] * 1000:6.2f} ms")
+
+    begin = time.perf_counter()
+    for _ in range(args.queries):
+        store.get(rng.randint(1, args.profiles))
+    print(f"按id取资料：{(time.perf_counter() - begin) / args.queries * 1e6:.1f} µs/次")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Streamlit 重跑耗时：每次重跑重建资源 vs 进程级共享资源
+
+运行：python benchmarks/bench_rerun.py --runs 20
+用 streamlit.testing 在进程内执行 app.py。"每次重建"模式在每次运行前清空
+st.cache_resource，相当于改造前在每次重跑时构造 GLMClient / EmotionAnalyzer / 资料库。
+计时只包含脚本本身的执行：等待方式和字节码缓存都改成与真实服务一致，见下方说明。
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import streamlit as st
+from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+from streamlit.testing.v1 import AppTest, local_script_runner
+
+from utils.emotion_analyzer import EmotionAnalyzer
+from utils.glm_client import GLMClient
+from utils.profile_store import ProfileStore
+
+
+def wait_for_script(runner, timeout=3):
+    """AppTest 每 100ms 才检查一次脚本是否结束，计时会被取整到 100ms；
+    脚本线程跑完一次就发出 SHUTDOWN 并退出，直接等线程结束"""
+    runner._script_thread.join(timeout)
+    if runner._script_thread.is_alive():
+        runner.request_stop()
+        runner.join()
+        raise RuntimeError(f"AppTest script run timed out after {timeout}s")
+
+
+local_script_runner.require_widgets_deltas = wait_for_script
+# 每个 AppTest 默认新建 ScriptCache，每次都要重新解析、编译 app.py；
+# 真实服务中字节码在重跑间复用，这里同样共用一个
+_script_cache = ScriptCache()
+local_script_runner.ScriptCache = lambda: _script_cache
+
+
+def time_reruns(runs, rebuild):
+    timings = []
+    for _ in range(runs):
+        if rebuild:
+            st.cache_resource.clear()
+        app = AppTest.from_file(os.path.join(ROOT, "app.py"), default_timeout=60)
+        start = time.perf_counter()
+        app.run()
+        timings.append(time.perf_counter() - start)
+        if app.exception:
+            raise RuntimeError(app.exception[0].value)
+    return timings
+
+
+def time_construction(runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        GLMClient()
+        EmotionAnalyzer()
+        ProfileStore()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def report(name, timings):
+    print(f"{name:<16} 中位数 {statistics.median(timings) * 1000:8.2f} ms   "
+          f"最大 {max(timings) * 1000:8.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    os.environ.setdefault("ZHIPU_API_KEY", "benchmark")
+    # 预热：导入模块、编译脚本
+    time_reruns(2, rebuild=False)
+
+    report("资源构造", time_construction(args.runs))
+    report("每次重建", time_reruns(args.runs, rebuild=True))
+    report("共享资源", time_reruns(args.runs, rebuild=False))
+
+
+if __name__ == "__main__":
+    main()
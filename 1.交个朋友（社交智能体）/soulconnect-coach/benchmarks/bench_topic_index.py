@@ -0,0 +1,89 @@
+"""话题向量索引：LSH近似检索相对精确检索的召回率和查询延迟
+
+运行：python benchmarks/bench_topic_index.py --entries 100000
+查询为已入库资料的轻微改写（换一条动态、去掉一个标签），模拟"相似资料"的真实场景。
+"""
+import argparse
+import itertools
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.topic_index import HashedNgramEmbedder, LSHIndex, profile_text
+
+ACTIVITIES = ["听了一场演唱会", "去山里徒步", "做了一道新菜", "读完一本小说", "拍了一组街景",
+              "参加了读书会", "跑完十公里", "学会了一首新歌", "逛了一个展览", "养了一只猫"]
+PLACES = ["大理", "成都", "杭州", "厦门", "西安", "青岛", "长沙", "昆明", "苏州", "重庆"]
+
+
+def synthetic_profile(rng, tags, cum_weights):
+    return {
+        "tags": list(dict.fromkeys(rng.choices(tags, cum_weights=cum_weights, k=rng.randint(3, 6)))),
+        "bio": "喜欢" + "、".join(rng.sample(tags[:300], 2)) + "，" + rng.choice(ACTIVITIES),
+        "recent_moments": f"周末在{rng.choice(PLACES)}{rng.choice(ACTIVITIES)}，{rng.randint(1, 999)}"
+    }
+
+
+def perturb(rng, profile):
+    changed = dict(profile)
+    if len(changed["tags"]) > 3 and rng.random() < 0.5:
+        changed["tags"] = changed["tags"][:-1]
+    changed["recent_moments"] = f"周末在{rng.choice(PLACES)}{rng.choice(ACTIVITIES)}，{rng.randint(1, 999)}"
+    return changed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--entries", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--tables", type=int, default=24)
+    parser.add_argument("--bits", type=int, default=12)
+    parser.add_argument("--probes", type=int, default=6)
+    parser.add_argument("-k", type=int, default=10)
+    args = parser.parse_args()
+
+    rng = random.Random(3)
+    chars = [chr(code) for code in range(0x4E00, 0x4E00 + 2000)]
+    tags = list(dict.fromkeys("".join(rng.sample(chars, 2)) for _ in range(3000)))
+    cum_weights = list(itertools.accumulate(1.0 / (rank + 1) for rank in range(len(tags))))
+    profiles = [synthetic_profile(rng, tags, cum_weights) for _ in range(args.entries)]
+
+    embedder = HashedNgramEmbedder()
+    start = time.perf_counter()
+    vectors = embedder.embed_batch([profile_text(profile) for profile in profiles])
+    embed_seconds = time.perf_counter() - start
+    index = LSHIndex(embedder.dimensions, tables=args.tables, bits=args.bits, probes=args.probes, exact_below=0)
+    start = time.perf_counter()
+    index.add_batch(vectors)
+    print(f"{args.entries} 条：向量化 {embed_seconds / args.entries * 1e6:.0f} µs/条，"
+          f"建索引 {time.perf_counter() - start:.1f} s")
+
+    queries = [embedder.embed(profile_text(perturb(rng, rng.choice(profiles)))) for _ in range(args.queries)]
+    ann_times, exact_times, recall_top1, recall_k, similarities = [], [], 0, 0.0, []
+    for vector in queries:
+        begin = time.perf_counter()
+        approximate = index.search(vector, k=args.k)
+        ann_times.append(time.perf_counter() - begin)
+        begin = time.perf_counter()
+        exact = index.exact_search(vector, k=args.k)
+        exact_times.append(time.perf_counter() - begin)
+
+        exact_ids = {item_id for item_id, _ in exact}
+        recall_k += len(exact_ids & {item_id for item_id, _ in approximate}) / len(exact_ids)
+        recall_top1 += bool(approximate) and approximate[0][0] == exact[0][0]
+        similarities.append(exact[0][1])
+
+    print(f"最近邻平均相似度 {statistics.mean(similarities):.3f}")
+    print(f"召回率：top1 {recall_top1 / len(queries):.3f}，top{args.k} {recall_k / len(queries):.3f}")
+    for name, timings in (("LSH", ann_times), ("精确检索", exact_times)):
+        timings.sort()
+        print(f"{name:<6} 中位数 {statistics.median(timings) * 1000:6.2f} ms   "
+              f"p95 {timings[int(len(timings) * 0.95)] * 1000:6.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+"""本地模拟的GLM服务，接口与 /api/paas/v4/chat/completions 一致，用于离线压测
+
+运行：python benchmarks/mock_glm_server.py --port 8765 --latency 0.3 --error-rate 0.02
+然后设置 ZHIPU_BASE_URL=http://127.0.0.1:8765/api/paas/v4/chat/completions 启动应用即可离线使用。
+
+按提示词内容返回资料分析JSON、对话建议JSON或开场白文本；usage 按提示词和回复长度估算。
+延迟、逐段输出的间隔、错误率（500/429，429带 Retry-After）都可配置，随机数带种子，结果可复现。
+测试流式解析时还可以按固定字节数切分写出（会截断UTF-8字符），或在输出若干事件后直接断开连接。
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.prompt_builder import estimate_tokens
+
+CHAT_PATH = "/api/paas/v4/chat/completions"
+
+PROFILE_REPLY = {
+    "analysis": "对方热爱生活，乐于分享日常，适合从共同兴趣切入。",
+    "topics": ["最近的旅行", "喜欢的音乐", "周末活动", "拿手菜", "正在读的书"],
+    "conversation_styles": ["友好型", "好奇型"]
+}
+ADVICE_REPLY = {
+    "emotion_analysis": "对话气氛轻松，对方愿意继续交流。",
+    "suggested_topics": ["追问细节", "分享自己的经历"],
+    "improvement_suggestions": ["多用开放式问题", "适当回应对方的感受"],
+    "response_suggestion": "听起来很有意思！你当时是怎么想到去那里的？"
+}
+ICEBREAKERS = [
+    "看到你最近去徒步了，风景一定很美吧？我也一直想找条好路线。",
+    "你的照片拍得好有氛围感！平时都喜欢拍些什么呀？",
+    "刚看到你也喜欢这个乐队，最喜欢他们哪首歌？"
+]
+
+
+class MockGLMServer:
+    """在后台线程运行的模拟GLM服务
+
+    latency: 响应头前的固定延迟（秒），另加 [0, jitter) 的随机抖动
+    chunk_delay: 流式输出每段之间的间隔（秒）
+    error_rate: 返回错误的比例，其中 rate_limit_share 的部分为429，其余为500
+    stream_split_bytes: 大于0时流式响应按该字节数逐块写出，不按事件边界
+    stream_disconnect_after: 不为None时流式响应输出这么多个事件后直接断开，不发送 [DONE]
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.05, jitter: float = 0.02,
+                 chunk_delay: float = 0.005, error_rate: float = 0.0, rate_limit_share: float = 0.5,
+                 retry_after: float = 0.05, seed: int = 0, stream_split_bytes: int = 0,
+                 stream_disconnect_after: Optional[int] = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.chunk_delay = chunk_delay
+        self.error_rate = error_rate
+        self.rate_limit_share = rate_limit_share
+        self.retry_after = retry_after
+        self.stream_split_bytes = stream_split_bytes
+        self.stream_disconnect_after = stream_disconnect_after
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._stats = {"requests": 0, "streams": 0, "errors": 0, "rate_limited": 0,
+                       "prompt_tokens": 0, "completion_tokens": 0}
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}{CHAT_PATH}"
+
+    def start(self) -> "MockGLMServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return dict(self._stats)
+
+    def _plan(self, prompt_tokens: int):
+        """为一次请求抽取延迟和是否出错"""
+        with self._lock:
+            self._stats["requests"] += 1
+            self._stats["prompt_tokens"] += prompt_tokens
+            delay = self.latency + self._rng.random() * self.jitter
+            status = 200
+            if self._rng.random() < self.error_rate:
+                status = 429 if self._rng.random() < self.rate_limit_share else 500
+                self._stats["errors"] += 1
+                self._stats["rate_limited"] += status == 429
+            return delay, status
+
+    @staticmethod
+    def reply_for(prompt: str) -> str:
+        if "聊天切入点" in prompt:
+            return json.dumps(PROFILE_REPLY, ensure_ascii=False)
+        if "改进建议" in prompt:
+            return json.dumps(ADVICE_REPLY, ensure_ascii=False)
+        if "破冰开场白" in prompt:
+            return ICEBREAKERS[len(prompt) % len(ICEBREAKERS)]
+        return "好的。"
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # 响应头和响应体分两次写出，不关闭Nagle时会撞上客户端的延迟确认（约40ms）
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status: int, body: bytes, content_type: str = "application/json", headers=None):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                if self.path.split("?")[0] != CHAT_PATH:
+                    self._send(404, b'{"error": "not found"}')
+                    return
+                try:
+                    data = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                    messages = data["messages"]
+                except (ValueError, KeyError):
+                    self._send(400, b'{"error": "bad request"}')
+                    return
+
+                prompt = "\n".join(message.get("content", "") for message in messages)
+                prompt_tokens = estimate_tokens(prompt)
+                delay, status = server._plan(prompt_tokens)
+                time.sleep(delay)
+                if status != 200:
+                    headers = {"Retry-After": str(server.retry_after)} if status == 429 else None
+                    self._send(status, json.dumps({"error": {"code": str(status)}}).encode(), headers=headers)
+                    return
+
+                content = server.reply_for(prompt)
+                usage = {"prompt_tokens": prompt_tokens, "completion_tokens": estimate_tokens(content)}
+                usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+                with server._lock:
+                    server._stats["completion_tokens"] += usage["completion_tokens"]
+                    server._stats["streams"] += bool(data.get("stream"))
+
+                if data.get("stream"):
+                    self._stream(content, usage, data.get("model", "glm-4"))
+                else:
+                    self._send(200, json.dumps({
+                        "id": "mock", "model": data.get("model", "glm-4"),
+                        "choices": [{"index": 0, "finish_reason": "stop",
+                                     "message": {"role": "assistant", "content": content}}],
+                        "usage": usage
+                    }, ensure_ascii=False).encode("utf-8"))
+
+            def _stream(self, content: str, usage: Dict, model: str):
+                # 不设长度，发完后关闭连接，与分块输出的SSE行为一致
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                self.close_connection = True
+                pieces = [content[i:i + 4] for i in range(0, len(content), 4)]
+                events = []
+                for i, piece in enumerate(pieces):
+                    event = {"model": model, "choices": [{"index": 0, "delta": {"content": piece}}]}
+                    if i == len(pieces) - 1:
+                        event["usage"] = usage
+                    events.append(f"data: {json.dumps(event, ensure_ascii=False)}\n\n".encode("utf-8"))
+                if server.stream_disconnect_after is None:
+                    events.append(b"data: [DONE]\n\n")
+                else:
+                    events = events[:server.stream_disconnect_after]
+                if server.stream_split_bytes > 0:
+                    payload = b"".join(events)
+                    size = server.stream_split_bytes
+                    events = [payload[i:i + size] for i in range(0, len(payload), size)]
+                for i, block in enumerate(events):
+                    if i:
+                        time.sleep(server.chunk_delay)
+                    self.wfile.write(block)
+                    self.wfile.flush()
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--jitter", type=float, default=0.02)
+    parser.add_argument("--chunk-delay", type=float, default=0.005)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    server = MockGLMServer(args.host, args.port, latency=args.latency, jitter=args.jitter,
+                           chunk_delay=args.chunk_delay, error_rate=args.error_rate, seed=args.seed)
+    print(f"模拟GLM服务：{server.url}（Ctrl+C 退出）")
+    server.start()
+    try:
+        while True:
+            time.sleep(60)
+    except KeyboardInterrupt:
+        print(json.dumps(server.stats(), ensure_ascii=False))
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+"""离线基准测试：启动模拟GLM服务，并发驱动各主要调用路径，报告吞吐、尾延迟和内存
+
+运行：python benchmarks/run_benchmarks.py --requests 200 --concurrency 16 --output after.json
+与基线对比：python benchmarks/run_benchmarks.py --compare before.json
+只对比两份已有结果：python benchmarks/run_benchmarks.py --compare before.json after.json
+
+每个场景使用全新的客户端组件（连接池、调度器、熔断器、指标），不启用响应缓存，
+输入各不相同，保证每次调用都真正经过网络。对比时吞吐下降或p95上升超过 --threshold 记为退化，
+有退化时以退出码1结束，可用于CI。
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mock_glm_server import MockGLMServer
+
+from utils.emotion_analyzer import EmotionAnalyzer
+from utils.glm_client import GLMClient, GLMStreamError
+from utils.http_transport import PooledTransport
+from utils.metrics import TOKEN_METRIC, Histogram, Metrics
+from utils.resilience import CircuitBreaker, RetryPolicy
+from utils.response_cache import ResponseCache
+from utils.scheduler import RequestScheduler
+from utils.single_flight import SingleFlight
+from utils.topic_index import TopicIndex
+
+SCENARIOS = ["analyze_profile", "generate_icebreaker", "icebreaker_stream", "conversation_advice", "emotion"]
+TAGS = ["摄影", "旅行", "音乐", "美食", "读书", "徒步", "电影", "健身", "猫", "咖啡", "露营", "画画"]
+STYLES = ["友好型", "好奇型", "幽默型"]
+LINES = ["今天天气真好，出去走走吧", "最近工作有点累，不过还挺开心的", "哈哈这个也太好笑了😂",
+         "你周末一般都做什么呀？", "我觉得这部电影一般，有点失望", "听起来好棒！下次带上我",
+         "唉，又加班了", "真的吗？我也超喜欢这家店"]
+
+
+def current_rss_mb():
+    """当前常驻内存（MB），仅Linux可用，其他平台返回 None"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError):
+        return None
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 以KB为单位，macOS 以字节为单位
+    return peak / 2 ** 20 if sys.platform == "darwin" else peak / 2 ** 10
+
+
+def make_client(url, metrics, concurrency):
+    client = GLMClient(
+        api_key="benchmark",
+        base_url=url,
+        transport=PooledTransport(pool_maxsize=concurrency, metrics=metrics),
+        # 所有温度都视为非确定性调用且不保留结果池，即完全不缓存
+        cache=ResponseCache(deterministic_max_temperature=-1),
+        retry_policy=RetryPolicy(base_delay=0.05, max_delay=0.5),
+        circuit_breaker=CircuitBreaker(),
+        scheduler=RequestScheduler(requests_per_sec=10000, tokens_per_min=10 ** 9),
+        single_flight=SingleFlight(),
+        metrics=metrics
+    )
+    client.topic_index = TopicIndex()
+    return client
+
+
+def build_workload(name, rng, count):
+    """每个场景的输入，内容各不相同，避免被合并或复用"""
+    if name == "analyze_profile":
+        return [{
+            "nickname": f"用户{i}",
+            "age": rng.randint(18, 40),
+            "tags": rng.sample(TAGS, 3),
+            "bio": f"第{i}号用户，喜欢" + "、".join(rng.sample(TAGS, 2)),
+            "recent_moments": f"{rng.randint(1, 28)}号去了第{rng.randint(1, 10 ** 6)}家店"
+        } for i in range(count)]
+    if name in ("generate_icebreaker", "icebreaker_stream"):
+        return [(rng.sample(TAGS, 3), rng.choice(STYLES), f"用户{i}") for i in range(count)]
+    if name == "conversation_advice":
+        return [[
+            {"role": "user" if turn % 2 == 0 else "coach", "content": f"{rng.choice(LINES)}（{i}-{turn}）"}
+            for turn in range(rng.randint(4, 12))
+        ] for i in range(count)]
+    return [f"{rng.choice(LINES)}{rng.choice(LINES)}{i}" for i in range(count)]
+
+
+def stream_succeeds(stream) -> bool:
+    try:
+        for _ in stream:
+            pass
+    except GLMStreamError:
+        return False
+    return True
+
+
+def scenario_call(name, client, analyzer):
+    """返回对单个输入执行一次调用的函数，结果为 True 表示成功"""
+    if name == "analyze_profile":
+        return lambda profile: not ({"error", "degraded"} & client.analyze_profile(profile).keys())
+    if name == "generate_icebreaker":
+        return lambda args: not client.generate_icebreaker(*args).startswith("生成失败")
+    if name == "icebreaker_stream":
+        return lambda args: stream_succeeds(client.stream_icebreaker(*args))
+    if name == "conversation_advice":
+        return lambda history: not ({"error", "degraded"} & client.provide_conversation_advice(history).keys())
+    return lambda text: "emotion" in analyzer.analyze_text_emotion(text)
+
+
+def summarize_latencies(latencies):
+    histogram = Histogram(window=len(latencies))
+    for value in latencies:
+        histogram.observe(value)
+    quantiles = histogram.quantiles()
+    return {
+        "mean": round(histogram.sum / len(latencies) * 1000, 3),
+        "p50": round(quantiles[0.5] * 1000, 3),
+        "p95": round(quantiles[0.95] * 1000, 3),
+        "p99": round(quantiles[0.99] * 1000, 3),
+        "max": round(max(latencies) * 1000, 3)
+    }
+
+
+def run_scenario(name, url, count, concurrency, seed):
+    metrics = Metrics()
+    client = make_client(url, metrics, concurrency)
+    analyzer = EmotionAnalyzer()
+    call = scenario_call(name, client, analyzer)
+    workload = build_workload(name, random.Random(seed), count)
+    latencies = [0.0] * count
+
+    def timed(index):
+        begin = time.perf_counter()
+        ok = call(workload[index])
+        latencies[index] = time.perf_counter() - begin
+        return ok
+
+    rss_before = current_rss_mb()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(timed, range(count)))
+    wall = time.perf_counter() - start
+    rss_after = current_rss_mb()
+
+    summary = metrics.summary()
+    tokens = {kind: metrics.counter(TOKEN_METRIC, kind=kind, model="glm-4") for kind in ("prompt", "completion")}
+    return {
+        "requests": count,
+        "concurrency": concurrency,
+        "errors": results.count(False),
+        "wall_seconds": round(wall, 3),
+        "throughput_per_sec": round(count / wall, 2),
+        "latency_ms": summarize_latencies(latencies),
+        "rss_mb": None if rss_after is None else round(rss_after, 1),
+        "rss_growth_mb": None if rss_after is None else round(rss_after - rss_before, 1),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "tokens": tokens,
+        "stages_ms": {
+            stage: {"p50": round(stats["p50"] * 1000, 3), "p95": round(stats["p95"] * 1000, 3)}
+            for stage, stats in sorted(summary["stages"].items())
+        },
+        "scheduler": client.scheduler.stats()["lanes"]["interactive"]
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def compare(baseline, current, threshold):
+    """打印各场景的变化，返回是否存在退化"""
+    regressed = False
+    print(f"{'场景':<22}{'吞吐':>16}{'p95':>24}{'p99':>24}")
+    for name, result in current["scenarios"].items():
+        base = baseline["scenarios"].get(name)
+        if base is None:
+            continue
+
+        def change(new, old):
+            return (new - old) / old if old else 0.0
+
+        throughput = change(result["throughput_per_sec"], base["throughput_per_sec"])
+        p95 = change(result["latency_ms"]["p95"], base["latency_ms"]["p95"])
+        p99 = change(result["latency_ms"]["p99"], base["latency_ms"]["p99"])
+        flag = throughput < -threshold or p95 > threshold
+        regressed |= flag
+        print(f"{name:<22}{result['throughput_per_sec']:>9.1f}/s {throughput:+6.1%}"
+              f"{result['latency_ms']['p95']:>14.1f}ms {p95:+6.1%}"
+              f"{result['latency_ms']['p99']:>14.1f}ms {p99:+6.1%}" + ("  ← 退化" if flag else ""))
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="逗号分隔，可选：" + ",".join(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=200, help="每个网络场景的调用次数")
+    parser.add_argument("--emotion-messages", type=int, default=20000, help="情绪分析场景的消息数")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--latency", type=float, default=0.05, help="模拟服务的响应延迟（秒）")
+    parser.add_argument("--jitter", type=float, default=0.02)
+    parser.add_argument("--chunk-delay", type=float, default=0.005)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--compare", nargs="+", metavar="JSON", help="基线结果；再给一份结果时只对比不运行")
+    parser.add_argument("--threshold", type=float, default=0.1, help="判定退化的相对变化")
+    args = parser.parse_args()
+
+    if args.compare and len(args.compare) > 2:
+        parser.error("--compare 最多两份结果")
+    if args.compare and len(args.compare) == 2:
+        with open(args.compare[0], encoding="utf-8") as f:
+            baseline = json.load(f)
+        with open(args.compare[1], encoding="utf-8") as f:
+            current = json.load(f)
+        sys.exit(1 if compare(baseline, current, args.threshold) else 0)
+
+    names = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = set(names) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"未知场景：{', '.join(sorted(unknown))}")
+
+    server = MockGLMServer(latency=args.latency, jitter=args.jitter, chunk_delay=args.chunk_delay,
+                           error_rate=args.error_rate, seed=args.seed)
+    results = {}
+    with server:
+        for name in names:
+            count = args.emotion_messages if name == "emotion" else args.requests
+            result = run_scenario(name, server.url, count, args.concurrency, args.seed)
+            results[name] = result
+            latency = result["latency_ms"]
+            print(f"{name:<22}{result['throughput_per_sec']:>9.1f}/s   p50 {latency['p50']:8.2f} ms   "
+                  f"p95 {latency['p95']:8.2f} ms   p99 {latency['p99']:8.2f} ms   "
+                  f"错误 {result['errors']}   RSS {result['rss_mb']} MB")
+        server_stats = server.stats()
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "args": {key: value for key, value in vars(args).items() if key not in ("compare", "output")}
+        },
+        "server": server_stats,
+        "scenarios": results
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"结果已保存到 {args.output}")
+
+    if args.compare:
+        with open(args.compare[0], encoding="utf-8") as f:
+            baseline = json.load(f)
+        sys.exit(1 if compare(baseline, report, args.threshold) else 0)
+
+
+if __name__ == "__main__":
+    main()
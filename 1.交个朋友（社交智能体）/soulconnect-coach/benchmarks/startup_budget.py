@@ -0,0 +1,140 @@
+"""冷启动预算：测量 app.py 的导入和模块级代码耗时，超出预算时以非零退出码结束
+
+运行：python benchmarks/startup_budget.py --budget-ms 3000 --runs 5
+每次都在新进程中用 -X importtime 执行 app.py 的模块级代码（不进入 __main__ 分支，
+即只有导入、load_dotenv、set_page_config 和样式加载），按模块汇总导入耗时；
+另测只 import streamlit 的基线，两者之差是应用自身带来的启动开销。
+--forbid 列出冷启动时不应导入的模块，防止重依赖被无意中提前导入。
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP = os.path.join(ROOT, "app.py")
+
+APP_PROBE = (
+    "import runpy, sys, time\n"
+    f"sys.path.insert(0, {ROOT!r})\n"
+    "begin = time.perf_counter()\n"
+    f"runpy.run_path({APP!r}, run_name='startup_probe')\n"
+    "print(time.perf_counter() - begin)\n"
+)
+BASELINE_PROBE = (
+    "import time\n"
+    "begin = time.perf_counter()\n"
+    "import streamlit\n"
+    "print(time.perf_counter() - begin)\n"
+)
+
+# (模块名, 缩进层级, 自身耗时us, 累计耗时us)
+ImportRecord = Tuple[str, int, int, int]
+
+
+def parse_importtime(stderr: str) -> List[ImportRecord]:
+    records = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue  # 表头
+        name = parts[2].rstrip()
+        depth = (len(name) - len(name.lstrip(" ")) - 1) // 2
+        records.append((name.strip(), depth, int(parts[0]), int(parts[1])))
+    return records
+
+
+def run_probe(code: str) -> Tuple[float, float, List[ImportRecord]]:
+    """返回 (进程总耗时, 探针内耗时, 导入记录)，单位秒"""
+    begin = time.perf_counter()
+    completed = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=ROOT,
+                               capture_output=True, text=True)
+    wall = time.perf_counter() - begin
+    if completed.returncode != 0:
+        raise RuntimeError(f"启动探针失败：\n{completed.stderr[-2000:]}")
+    return wall, float(completed.stdout.strip().splitlines()[-1]), parse_importtime(completed.stderr)
+
+
+def by_package(records: List[ImportRecord]) -> Dict[str, float]:
+    """按顶层包汇总自身耗时（毫秒）"""
+    totals: Dict[str, float] = {}
+    for name, _, self_us, _ in records:
+        package = name.split(".")[0]
+        totals[package] = totals.get(package, 0.0) + self_us / 1000
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=3000, help="app.py 模块级代码耗时（中位数）的上限")
+    parser.add_argument("--app-budget-ms", type=float, default=None,
+                        help="扣除 import streamlit 基线后，应用自身开销的上限")
+    parser.add_argument("--forbid", default="plotly.express,utils.glm_client,aiohttp",
+                        help="逗号分隔，冷启动时不应导入的模块；传空字符串关闭检查")
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--output", help="把结果写入JSON文件")
+    args = parser.parse_args()
+
+    # 第一次运行会编译字节码，不计入结果
+    run_probe(APP_PROBE)
+    app_runs = [run_probe(APP_PROBE) for _ in range(args.runs)]
+    baseline_runs = [run_probe(BASELINE_PROBE) for _ in range(args.runs)]
+
+    app_ms = statistics.median(probe for _, probe, _ in app_runs) * 1000
+    process_ms = statistics.median(wall for wall, _, _ in app_runs) * 1000
+    baseline_ms = statistics.median(probe for _, probe, _ in baseline_runs) * 1000
+    records = app_runs[-1][2]
+    baseline_modules = {name for name, _, _, _ in baseline_runs[-1][2]}
+    own = [record for record in records if record[0] not in baseline_modules]
+
+    print(f"app.py 模块级代码：{app_ms:8.1f} ms（中位数，进程总耗时 {process_ms:.1f} ms）")
+    print(f"import streamlit： {baseline_ms:8.1f} ms")
+    print(f"应用自身开销：     {app_ms - baseline_ms:8.1f} ms，额外导入 {len(own)} 个模块")
+
+    print(f"\n应用额外导入的模块（按累计耗时，前{args.top}）：")
+    top_level = sorted((r for r in own if r[1] == 0 or r[0].startswith("utils")), key=lambda r: -r[3])
+    for name, _, self_us, cumulative_us in top_level[:args.top]:
+        print(f"  {name:<40}{cumulative_us / 1000:9.1f} ms   自身 {self_us / 1000:7.1f} ms")
+
+    print(f"\n按顶层包汇总（全部导入，前{args.top}）：")
+    packages = sorted(by_package(records).items(), key=lambda item: -item[1])
+    for package, total in packages[:args.top]:
+        print(f"  {package:<40}{total:9.1f} ms")
+
+    imported = {name for name, _, _, _ in records}
+    forbidden = [name for name in (item.strip() for item in args.forbid.split(",")) if name and name in imported]
+    failures = []
+    if app_ms > args.budget_ms:
+        failures.append(f"冷启动 {app_ms:.1f} ms 超出预算 {args.budget_ms:.0f} ms")
+    if args.app_budget_ms is not None and app_ms - baseline_ms > args.app_budget_ms:
+        failures.append(f"应用自身开销 {app_ms - baseline_ms:.1f} ms 超出预算 {args.app_budget_ms:.0f} ms")
+    if forbidden:
+        failures.append(f"冷启动时导入了不应导入的模块：{', '.join(forbidden)}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({
+                "app_ms": round(app_ms, 1),
+                "process_ms": round(process_ms, 1),
+                "streamlit_ms": round(baseline_ms, 1),
+                "app_overhead_ms": round(app_ms - baseline_ms, 1),
+                "own_modules": {name: round(cumulative / 1000, 2) for name, _, _, cumulative in top_level},
+                "packages_ms": {package: round(total, 2) for package, total in packages},
+                "failures": failures
+            }, f, ensure_ascii=False, indent=2)
+
+    if failures:
+        print("\n未通过：" + "；".join(failures))
+        sys.exit(1)
+    print("\n通过")
+
+
+if __name__ == "__main__":
+    main()
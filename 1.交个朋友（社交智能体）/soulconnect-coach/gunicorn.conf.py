@@ -0,0 +1,55 @@
+"""gunicorn 配置：gunicorn -c gunicorn.conf.py api_server:app
+
+主进程预先加载应用（导入模块、加载情感词典），再fork出多个worker，词典等只读数据由各进程共享内存页。
+响应缓存、限流额度和指标快照放在 SOULCONNECT_STATE_DIR（默认系统临时目录下的 soulconnect）中，
+同一台机器上的所有worker共用；多台机器部署时每台各自一份，限流额度需按机器数分摊。
+"""
+import glob
+import multiprocessing
+import os
+import tempfile
+
+STATE_DIR = os.getenv("SOULCONNECT_STATE_DIR", os.path.join(tempfile.gettempdir(), "soulconnect"))
+os.makedirs(STATE_DIR, exist_ok=True)
+# 必须在加载应用前设置，各个 get_shared_* 和 create_app 按这些环境变量创建跨进程共享的状态
+os.environ.setdefault("SOULCONNECT_CACHE_PATH", os.path.join(STATE_DIR, "response_cache.db"))
+os.environ.setdefault("SOULCONNECT_RATE_LIMIT_PATH", os.path.join(STATE_DIR, "rate_limit.db"))
+os.environ.setdefault("SOULCONNECT_METRICS_DIR", os.path.join(STATE_DIR, "metrics"))
+
+bind = os.getenv("SOULCONNECT_API_BIND", "0.0.0.0:8000")
+workers = int(os.getenv("SOULCONNECT_API_WORKERS", multiprocessing.cpu_count()))
+# 请求大部分时间在等模型返回，每个worker用线程并发处理
+worker_class = "gthread"
+threads = int(os.getenv("SOULCONNECT_API_THREADS", "8"))
+preload_app = True
+# 单个请求调用模型的时限由 SOULCONNECT_API_TIMEOUT 控制，这里只兜底处理卡死的worker
+timeout = int(float(os.getenv("SOULCONNECT_API_TIMEOUT", "20"))) + 10
+graceful_timeout = 30
+keepalive = 5
+# 定期重启worker，释放长时间运行积累的内存
+max_requests = 2000
+max_requests_jitter = 200
+accesslog = "-"
+
+
+def on_starting(server):
+    """清理上次运行留下的指标快照和汇总，计数从本次启动开始"""
+    metrics_dir = os.environ["SOULCONNECT_METRICS_DIR"]
+    for path in glob.glob(os.path.join(metrics_dir, "worker-*.json")) + [os.path.join(metrics_dir, "retired.json")]:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def worker_exit(server, worker):
+    """worker进程退出前写出最后一次指标快照"""
+    app = getattr(worker, "wsgi", None)
+    exporter = app.extensions.get("metrics_exporter") if app is not None else None
+    if exporter is not None:
+        exporter.dump()
+
+
+def child_exit(server, worker):
+    """主进程回收worker后，把它的快照并入汇总文件并删除"""
+    from api_server import WorkerMetricsExporter
+
+    WorkerMetricsExporter.retire(os.environ["SOULCONNECT_METRICS_DIR"], worker.pid)
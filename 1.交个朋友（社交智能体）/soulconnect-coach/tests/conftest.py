@@ -0,0 +1,51 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+from mock_glm_server import MockGLMServer  # noqa: E402
+
+from utils.glm_client import GLMClient  # noqa: E402
+from utils.http_transport import PooledTransport  # noqa: E402
+from utils.metrics import Metrics  # noqa: E402
+from utils.resilience import CircuitBreaker, RetryPolicy  # noqa: E402
+from utils.response_cache import ResponseCache  # noqa: E402
+from utils.scheduler import RequestScheduler  # noqa: E402
+from utils.single_flight import SingleFlight  # noqa: E402
+from utils.topic_index import TopicIndex  # noqa: E402
+
+
+@pytest.fixture
+def mock_server():
+    """本地模拟GLM服务，默认无延迟、不出错；用例可直接修改 error_rate 等属性注入故障"""
+    server = MockGLMServer(latency=0.0, jitter=0.0, chunk_delay=0.0)
+    with server:
+        yield server
+
+
+@pytest.fixture
+def make_client(mock_server):
+    """用全新组件构造连到模拟服务的客户端，不与其他用例共用缓存、熔断器和调度器"""
+    def factory(**overrides) -> GLMClient:
+        metrics = overrides.pop("metrics", None) or Metrics()
+        options = dict(
+            api_key="test",
+            base_url=mock_server.url,
+            transport=PooledTransport(metrics=metrics),
+            cache=ResponseCache(deterministic_max_temperature=-1),
+            retry_policy=RetryPolicy(base_delay=0.01, max_delay=0.05),
+            circuit_breaker=CircuitBreaker(),
+            scheduler=RequestScheduler(requests_per_sec=10000, tokens_per_min=10 ** 9),
+            single_flight=SingleFlight(),
+            metrics=metrics
+        )
+        options.update(overrides)
+        client = GLMClient(**options)
+        client.topic_index = TopicIndex()
+        return client
+
+    return factory
@@ -0,0 +1,107 @@
+import json
+import os
+import threading
+
+import pytest
+
+from api_server import WorkerMetricsExporter, create_app
+from utils.metrics import Metrics
+from utils.resilience import CircuitBreaker, RetryPolicy
+from utils.single_flight import SingleFlight, SingleFlightTimeout
+
+ICEBREAKER_BODY = {"topics": ["旅行"], "style": "友好型", "nickname": "小林"}
+
+
+def api(client):
+    return create_app(client_factory=lambda: client, metrics=Metrics()).test_client()
+
+
+def test_icebreaker_ok(make_client):
+    response = api(make_client()).post("/api/icebreaker", json=ICEBREAKER_BODY)
+    assert response.status_code == 200
+    assert response.get_json()["icebreaker"]
+
+
+def test_icebreaker_errors_use_error_status(make_client, mock_server):
+    mock_server.error_rate = 1.0
+    mock_server.rate_limit_share = 0.0
+    breaker = CircuitBreaker(failure_threshold=1)
+    http = api(make_client(retry_policy=RetryPolicy(max_attempts=1), circuit_breaker=breaker))
+
+    assert http.post("/api/icebreaker", json=ICEBREAKER_BODY).status_code == 502
+    response = http.post("/api/icebreaker", json=ICEBREAKER_BODY)
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+    assert response.get_json()["circuit_open"]
+
+
+def test_icebreaker_timeout_is_504(make_client, mock_server):
+    mock_server.latency = 0.5
+    response = api(make_client(request_deadline=0.2)).post("/api/icebreaker", json=ICEBREAKER_BODY)
+    assert response.status_code == 504
+
+
+def test_single_flight_wait_times_out():
+    flight = SingleFlight()
+    release = threading.Event()
+    leader = threading.Thread(target=flight.do, args=("key", lambda: release.wait(5)))
+    leader.start()
+    while not flight.stats()["in_flight"]:
+        pass
+
+    with pytest.raises(SingleFlightTimeout):
+        flight.do("key", lambda: None, timeout=0.05)
+    release.set()
+    leader.join()
+    assert flight.do("key", lambda: "新结果", timeout=0.05) == ("新结果", False)
+
+
+def test_worker_snapshots_do_not_overwrite_each_other(tmp_path):
+    # 两个导出器模拟同一pid先后被两个worker使用
+    for count in (3, 4):
+        metrics = Metrics()
+        metrics.inc("soulconnect_test_total", count)
+        WorkerMetricsExporter(metrics, str(tmp_path)).dump()
+
+    merged = WorkerMetricsExporter(Metrics(), str(tmp_path)).collect()
+    assert merged.counter("soulconnect_test_total") == 7
+    assert len(list(tmp_path.glob("worker-*.json"))) == 3
+
+
+def test_retired_worker_snapshots_are_folded(tmp_path):
+    def worker_snapshot(pid, count):
+        metrics = Metrics()
+        metrics.inc("soulconnect_test_total", count)
+        exporter = WorkerMetricsExporter(metrics, str(tmp_path))
+        exporter.dump()
+        path = exporter._snapshot_path()
+        os.replace(path, path.replace(f"worker-{os.getpid()}-", f"worker-{pid}-"))
+
+    worker_snapshot(101, 3)
+    worker_snapshot(101, 4)
+    worker_snapshot(102, 5)
+    live = Metrics()
+    live.inc("soulconnect_test_total", 1)
+    exporter = WorkerMetricsExporter(live, str(tmp_path))
+    assert exporter.collect().counter("soulconnect_test_total") == 13
+
+    WorkerMetricsExporter.retire(str(tmp_path), 101)
+    WorkerMetricsExporter.retire(str(tmp_path), 102)
+
+    assert sorted(path.name for path in tmp_path.glob("*.json")) == [
+        "retired.json", os.path.basename(exporter._snapshot_path())]
+    assert exporter.collect().counter("soulconnect_test_total") == 13
+
+
+def test_collect_skips_snapshots_already_folded(tmp_path):
+    metrics = Metrics()
+    metrics.inc("soulconnect_test_total", 2)
+    WorkerMetricsExporter(metrics, str(tmp_path)).dump()
+    name = next(tmp_path.glob("worker-*.json")).name
+    retired_metrics = Metrics()
+    retired_metrics.inc("soulconnect_test_total", 2)
+    # 主进程已写好汇总、还没来得及删除快照时，该worker只计一次
+    (tmp_path / "retired.json").write_text(json.dumps({"metrics": retired_metrics.snapshot(), "folded": [name]}))
+
+    merged = WorkerMetricsExporter(Metrics(), str(tmp_path)).collect()
+    assert merged.counter("soulconnect_test_total") == 2
@@ -0,0 +1,140 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from utils.async_glm_client import AsyncGLMClient
+from utils.metrics import Metrics
+from utils.resilience import CircuitBreaker, RetryPolicy
+from utils.response_cache import ResponseCache
+from utils.scheduler import RequestScheduler, SchedulerTimeout
+from utils.topic_index import TopicIndex
+
+PROFILES = [{"nickname": f"用户{i}", "tags": ["摄影", f"标签{i}"], "bio": f"第{i}号用户"} for i in range(6)]
+
+
+def make_async_client(server, **overrides):
+    options = dict(
+        api_key="test",
+        base_url=server.url,
+        cache=ResponseCache(deterministic_max_temperature=-1),
+        topic_index=TopicIndex(),
+        retry_policy=RetryPolicy(base_delay=0.01, max_delay=0.05),
+        circuit_breaker=CircuitBreaker(),
+        scheduler=RequestScheduler(requests_per_sec=10000, tokens_per_min=10 ** 9),
+        metrics=Metrics()
+    )
+    options.update(overrides)
+    return AsyncGLMClient(**options)
+
+
+def run_with_client(client, coroutine_fn):
+    async def main():
+        async with client:
+            return await coroutine_fn(client)
+    return asyncio.run(main())
+
+
+def test_async_requests_go_through_the_shared_scheduler(mock_server):
+    scheduler = RequestScheduler(requests_per_sec=10000, tokens_per_min=10 ** 9)
+    client = make_async_client(mock_server, scheduler=scheduler)
+    results = run_with_client(client, lambda c: c.analyze_profiles(PROFILES, concurrency=3))
+
+    assert all("error" not in result for result in results)
+    assert scheduler.stats()["lanes"]["interactive"]["acquired"] == mock_server.stats()["requests"]
+    assert scheduler.stats()["usage_adjustments"] == mock_server.stats()["requests"]
+
+
+def test_async_rate_limit_is_enforced(mock_server):
+    scheduler = RequestScheduler(requests_per_sec=1, tokens_per_min=10 ** 9)
+    client = make_async_client(mock_server, scheduler=scheduler, request_deadline=0.5)
+    messages = [[{"role": "user", "content": f"第{i}条"}] for i in range(3)]
+    results = run_with_client(client, lambda c: asyncio.gather(*(c.chat(m) for m in messages)))
+
+    # 每秒只放行一个请求，0.5秒的时限内其余请求排队超时
+    assert sum("error" not in result for result in results) == 1
+    assert sum(bool(result.get("queue_timeout")) for result in results) == 2
+
+
+def test_async_client_retries_and_opens_breaker(mock_server):
+    mock_server.error_rate = 1.0
+    mock_server.rate_limit_share = 0.0
+    breaker = CircuitBreaker(failure_threshold=3, recovery_timeout=60)
+    client = make_async_client(mock_server, circuit_breaker=breaker)
+    result = run_with_client(client, lambda c: c.chat([{"role": "user", "content": "你好"}]))
+
+    assert result["status"] == 500
+    assert mock_server.stats()["requests"] == 3
+    assert breaker.state == CircuitBreaker.OPEN
+    assert client.metrics.counter("soulconnect_glm_retries_total") == 2
+
+
+def test_fan_out_takes_about_one_call(mock_server):
+    mock_server.latency = 0.3
+    client = make_async_client(mock_server)
+
+    begin = time.monotonic()
+    results = run_with_client(client, lambda c: c.analyze_profiles(PROFILES, concurrency=len(PROFILES)))
+    elapsed = time.monotonic() - begin
+
+    assert all("error" not in result for result in results)
+    assert mock_server.stats()["requests"] == len(PROFILES)
+    # 逐个请求需要 6×0.3 秒，并发时接近最慢的一次调用
+    assert 0.3 <= elapsed < 0.6
+
+
+def test_queued_acquires_do_not_hold_executor_threads():
+    scheduler = RequestScheduler(requests_per_sec=10, tokens_per_min=10 ** 9, request_burst=1)
+
+    async def main():
+        loop = asyncio.get_running_loop()
+        loop.set_default_executor(ThreadPoolExecutor(max_workers=1))
+        waiters = [asyncio.create_task(scheduler.acquire_async(timeout=2)) for _ in range(4)]
+        await asyncio.sleep(0.02)
+        assert scheduler.stats()["queue_depth"] == 3
+
+        # 排队中的协程不占线程，线程池仍能立即执行别的阻塞调用
+        begin = time.monotonic()
+        await loop.run_in_executor(None, time.sleep, 0)
+        assert time.monotonic() - begin < 0.05
+
+        # 取消排队中的请求后，它让出位置
+        waiters[1].cancel()
+        waits = await asyncio.gather(waiters[0], waiters[2], waiters[3])
+        assert waiters[1].cancelled()
+        return waits
+
+    waits = asyncio.run(main())
+    assert waits[0] < 0.05
+    assert 0.15 < waits[2] < 0.35
+    assert scheduler.stats()["queue_depth"] == 0
+    assert scheduler.stats()["lanes"]["interactive"]["acquired"] == 3
+
+
+def test_async_acquire_times_out():
+    scheduler = RequestScheduler(requests_per_sec=1, tokens_per_min=10 ** 9)
+
+    async def main():
+        await scheduler.acquire_async()
+        await scheduler.acquire_async(timeout=0.05)
+
+    with pytest.raises(SchedulerTimeout):
+        asyncio.run(main())
+    assert scheduler.stats()["lanes"]["interactive"]["timeouts"] == 1
+    assert scheduler.stats()["queue_depth"] == 0
+
+
+def test_open_circuit_returns_degraded_results(mock_server):
+    breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=60)
+    breaker.record_failure()
+    client = make_async_client(mock_server, circuit_breaker=breaker)
+
+    async def call(c):
+        return await c.analyze_profile(PROFILES[0]), await c.provide_conversation_advice([])
+
+    profile, advice = run_with_client(client, call)
+
+    assert profile["degraded"] and advice["degraded"]
+    assert "error" not in profile and "error" not in advice
+    assert mock_server.stats()["requests"] == 0
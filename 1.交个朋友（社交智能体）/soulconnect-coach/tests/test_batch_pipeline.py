@@ -0,0 +1,80 @@
+import json
+
+import pytest
+
+from utils.batch_pipeline import BatchAnalyzer
+
+
+class FakeClient:
+    """按资料返回固定结果；fail_on 指定的资料id抛出异常，模拟进程中途崩溃"""
+
+    def __init__(self, fail_on=None):
+        self.fail_on = fail_on
+        self.seen = []
+
+    def analyze_profile(self, profile):
+        if profile["id"] == self.fail_on:
+            raise RuntimeError("crash")
+        self.seen.append(profile["id"])
+        return {"personality_traits": [profile["nickname"]]}
+
+
+def write_profiles(path, count):
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(count):
+            f.write(json.dumps({"id": i, "nickname": f"用户{i}"}, ensure_ascii=False) + "\n")
+
+
+def read_ids(path):
+    with open(path, "rb") as f:
+        data = f.read()
+    assert b"\x00" not in data
+    return [json.loads(line)["id"] for line in data.decode("utf-8").splitlines()]
+
+
+def analyzer(client):
+    # 单线程、窗口为1，结果写入顺序确定
+    return BatchAnalyzer(client=client, workers=1, window=1, checkpoint_every=3)
+
+
+def test_interrupted_run_resumes_from_checkpoint(tmp_path):
+    input_path, output_path = str(tmp_path / "in.jsonl"), str(tmp_path / "out.jsonl")
+    write_profiles(input_path, 10)
+
+    with pytest.raises(RuntimeError):
+        analyzer(FakeClient(fail_on=7)).run(input_path, output_path)
+    # 第3、6条后各存一次检查点，第7条（id 6）已写入但未记入检查点
+    assert read_ids(output_path) == list(range(7))
+
+    client = FakeClient()
+    stats = analyzer(client).run(input_path, output_path)
+
+    assert client.seen == list(range(6, 10))
+    assert read_ids(output_path) == list(range(10))
+    assert stats["processed"] == 10 and stats["failed"] == 0
+
+
+def test_missing_output_restarts_from_scratch(tmp_path):
+    input_path, output_path = str(tmp_path / "in.jsonl"), str(tmp_path / "out.jsonl")
+    write_profiles(input_path, 5)
+    analyzer(FakeClient()).run(input_path, output_path)
+
+    (tmp_path / "out.jsonl").unlink()
+    client = FakeClient()
+    stats = analyzer(client).run(input_path, output_path)
+
+    assert client.seen == list(range(5))
+    assert read_ids(output_path) == list(range(5))
+    assert stats["processed"] == 5
+
+
+def test_no_resume_ignores_checkpoint(tmp_path):
+    input_path, output_path = str(tmp_path / "in.jsonl"), str(tmp_path / "out.jsonl")
+    write_profiles(input_path, 4)
+    analyzer(FakeClient()).run(input_path, output_path)
+
+    client = FakeClient()
+    analyzer(client).run(input_path, output_path, resume=False)
+
+    assert client.seen == list(range(4))
+    assert read_ids(output_path) == list(range(4))
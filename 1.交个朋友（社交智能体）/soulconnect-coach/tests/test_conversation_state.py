@@ -0,0 +1,114 @@
+import random
+
+import pytest
+
+from utils.conversation_state import ConversationState
+from utils.conversation_store import ConversationStore
+from utils.emotion_analyzer import EmotionAnalyzer
+
+
+class CountingAnalyzer(EmotionAnalyzer):
+    """记录每次分析的文本，用来确认追加消息时不会重新扫描历史"""
+
+    def __init__(self):
+        super().__init__(lexicon_paths=[])
+        self.analyzed = []
+
+    def analyze_text_emotion(self, text):
+        self.analyzed.append(text)
+        return super().analyze_text_emotion(text)
+
+
+@pytest.fixture(scope="module")
+def analyzer():
+    return EmotionAnalyzer(lexicon_paths=[])
+
+
+def test_append_analyzes_only_the_new_message():
+    analyzer = CountingAnalyzer()
+    state = ConversationState(analyzer, max_recent=5)
+    for i in range(200):
+        state.append({"role": "user", "content": f"第{i}条"})
+        assert analyzer.analyzed[-1] == f"第{i}条"
+    assert len(analyzer.analyzed) == 200
+
+
+def test_recent_messages_are_bounded(analyzer):
+    state = ConversationState(analyzer, max_recent=10)
+    for i in range(1000):
+        state.append({"role": "user" if i % 2 else "coach", "content": str(i)})
+
+    assert len(state) == 1000
+    assert len(state.recent) == 10
+    assert [message["content"] for message in state] == [str(i) for i in range(990, 1000)]
+    assert [message["seq"] for message in state.recent_messages(3)] == [997, 998, 999]
+
+
+def test_counters(analyzer):
+    state = ConversationState(analyzer)
+    state.append({"role": "user", "content": "你好吗？"})
+    state.append({"role": "coach", "content": "很好"})
+    state.append({"role": "user", "content": "去哪玩?"})
+
+    summary = state.summary()
+    assert summary["message_count"] == 3
+    assert summary["question_count"] == 2
+    assert summary["average_length"] == {"user": 4.0, "coach": 2.0}
+
+
+def test_sentiment_moving_average(analyzer):
+    state = ConversationState(analyzer, sentiment_alpha=0.5)
+    for _ in range(3):
+        state.append({"role": "user", "content": "今天很开心"})
+    # 0 → 0.5 → 0.75 → 0.875
+    assert state.sentiment_average == pytest.approx(0.875)
+
+    state.append({"role": "user", "content": "有点难过"})
+    assert state.sentiment_average == pytest.approx(0.875 + 0.5 * (-1 - 0.875))
+
+
+def test_topic_drift(analyzer):
+    state = ConversationState(analyzer)
+    for _ in range(3):
+        state.append({"role": "user", "content": "周末去爬山看日出"})
+    assert state.topic_drift == 0.0
+
+    state.append({"role": "user", "content": "最近在学做蛋糕和面包"})
+    assert state.topic_drift > 0.9
+
+
+def test_flow_status_matches_full_scan(analyzer):
+    rng = random.Random(1)
+    lines = ["你喜欢什么电影?", "我最近在看书", "周末有空吗?", "好的"]
+    history = []
+    state = ConversationState(analyzer)
+    for _ in range(60):
+        message = {"role": rng.choice(["user", "coach"]), "content": rng.choice(lines)}
+        history.append(message)
+        state.append(message)
+        assert state.flow_status() == analyzer.analyze_conversation_flow(history)
+        # 传入对话状态时直接用增量结果
+        assert analyzer.analyze_conversation_flow(state) == state.flow_status()
+
+
+def test_full_width_question_marks_count(analyzer):
+    state = ConversationState(analyzer)
+    state.append({"role": "user", "content": "你好"})
+    state.append({"role": "user", "content": "最近忙吗？"})
+    assert state.flow_status()["status"] == "正常交流"
+
+
+def test_restore_keeps_only_recent_messages(tmp_path, analyzer):
+    store = ConversationStore(str(tmp_path / "data.db"))
+    state = ConversationState(analyzer, store=store, user_id="u1")
+    for i in range(30):
+        state.append({"role": "user", "content": f"消息{i}？"})
+    store.flush()
+
+    restored = ConversationState(analyzer, max_recent=10, store=store, user_id="u1")
+    assert len(restored) == 30
+    assert [message["content"] for message in restored] == [f"消息{i}？" for i in range(20, 30)]
+    # 累计值只覆盖恢复的消息
+    assert restored.question_count == 10
+    assert restored.flow_status() == state.flow_status()
+    store.close()
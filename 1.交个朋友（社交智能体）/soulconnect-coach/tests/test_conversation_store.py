@@ -0,0 +1,29 @@
+from utils.conversation_state import ConversationState
+from utils.conversation_store import ConversationStore
+from utils.emotion_analyzer import EmotionAnalyzer
+
+
+def test_sessions_sharing_a_user_do_not_overwrite(tmp_path):
+    store = ConversationStore(str(tmp_path / "data.db"), batch_size=3)
+    analyzer = EmotionAnalyzer(lexicon_paths=[])
+    first = ConversationState(analyzer, store=store, user_id="u1")
+    second = ConversationState(analyzer, store=store, user_id="u1")
+
+    sent = []
+    for i in range(4):
+        sent.append(first.append({"role": "user", "content": f"标签页一 {i}"}))
+        sent.append(second.append({"role": "user", "content": f"标签页二 {i}"}))
+
+    assert [message["seq"] for message in sent] == list(range(8))
+    store.flush()
+    assert [message["content"] for message in store.iter_messages("u1")] == [message["content"] for message in sent]
+
+    # 消息自带的 seq 被忽略
+    assert store.append("u1", {"role": "user", "content": "旧序号", "seq": 0}) == 8
+    store.close()
+
+    reopened = ConversationStore(str(tmp_path / "data.db"))
+    assert reopened.count("u1") == 9
+    restored = ConversationState(analyzer, store=reopened, user_id="u1")
+    assert restored.append({"role": "user", "content": "重启后"})["seq"] == 9
+    reopened.close()
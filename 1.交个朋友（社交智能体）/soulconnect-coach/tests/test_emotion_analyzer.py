@@ -0,0 +1,101 @@
+import random
+
+import pytest
+
+from utils.emotion_analyzer import DEFAULT_NEGATIVE_WORDS, DEFAULT_POSITIVE_WORDS, EmotionAnalyzer
+from utils.sentiment_lexicon import MmapLexicon, build_lexicon_file, segment
+
+
+@pytest.fixture(scope="module")
+def analyzer():
+    return EmotionAnalyzer(lexicon_paths=[])
+
+
+@pytest.mark.parametrize("text, emotion", [
+    ("好的，不过我不喜欢", "negative"),
+    ("这家店不错", "positive"),
+    ("不少人都很开心", "positive"),
+    ("别人都说好", "positive"),
+    ("我不开心", "negative"),
+])
+def test_negators_inside_words_are_ignored(analyzer, text, emotion):
+    assert analyzer.analyze_text_emotion(text)["emotion"] == emotion
+
+
+@pytest.mark.parametrize("text, emotion", [
+    ("没有不开心", "positive"),
+    ("不是不喜欢", "positive"),
+    ("没有。不开心", "negative"),
+])
+def test_double_negation_cancels(analyzer, text, emotion):
+    assert analyzer.analyze_text_emotion(text)["emotion"] == emotion
+
+
+def test_adversative_discounts_earlier_clause(analyzer):
+    result = analyzer.analyze_text_emotion("好的，不过我不喜欢")
+    assert result["positive_indicators"] == 0.5
+    assert result["negative_indicators"] == 0.8
+
+
+def random_texts(count, seed=7):
+    rng = random.Random(seed)
+    vocabulary = sorted(DEFAULT_POSITIVE_WORDS | DEFAULT_NEGATIVE_WORDS) + [
+        "不", "没有", "很", "不太", "不过", "不少", "，", "😀", "😢", "我们", "İ"]
+    return ["".join(rng.choice(vocabulary) for _ in range(rng.randint(0, 12))) for _ in range(count)]
+
+
+def test_regex_tokenizer_matches_segment(analyzer):
+    assert analyzer._word_pattern is not None
+    for text in random_texts(500):
+        text_lower = text.lower()
+        assert analyzer._tokenize(text_lower) == segment(text_lower, analyzer._lexicons)
+
+
+def test_batch_matches_single(analyzer):
+    texts = random_texts(500)
+
+    batch = analyzer.analyze_batch(texts)
+    emotions = {"positive": 1, "negative": -1, "neutral": 0}
+    for i, text in enumerate(texts):
+        result = analyzer.analyze_text_emotion(text)
+        assert batch["positive_indicators"][i] == result["positive_indicators"]
+        assert batch["negative_indicators"][i] == result["negative_indicators"]
+        assert batch["scores"][i] == result["score"]
+        assert batch["emotions"][i] == emotions[result["emotion"]]
+
+
+@pytest.fixture(scope="module")
+def lexicon_path(tmp_path_factory):
+    rng = random.Random(3)
+    chars = [chr(code) for code in range(0x4E00, 0x4E00 + 200)]
+    entries = {"".join(rng.choice(chars) for _ in range(rng.randint(1, 5))): rng.choice([1.0, -1.0, 0.5])
+               for _ in range(3000)}
+    path = str(tmp_path_factory.mktemp("lexicon") / "words.sclx")
+    build_lexicon_file(entries, path)
+    return path
+
+
+def test_mmap_hash_lookup_matches_prefix_search(lexicon_path):
+    lexicon = MmapLexicon(lexicon_path)
+    rng = random.Random(5)
+    text = "".join(chr(0x4E00 + rng.randrange(220)) if rng.random() < 0.9 else "，" for _ in range(2000))
+
+    hashed = lexicon.longest_at(text)
+    assert hashed
+    assert hashed == {start: lexicon._longest_from(text, start) for start in range(len(text))
+                      if lexicon._longest_from(text, start) is not None}
+
+
+def test_batch_matches_single_with_mmap_lexicon(lexicon_path):
+    analyzer = EmotionAnalyzer(lexicon_paths=[lexicon_path])
+    assert analyzer._word_pattern is None
+    rng = random.Random(11)
+    words = [chr(0x4E00 + i) for i in range(200)]
+    texts = [text + "".join(rng.choice(words) for _ in range(rng.randint(0, 20))) for text in random_texts(300)]
+
+    batch = analyzer.analyze_batch(texts)
+    for i, text in enumerate(texts):
+        result = analyzer.analyze_text_emotion(text)
+        assert batch["positive_indicators"][i] == result["positive_indicators"]
+        assert batch["negative_indicators"][i] == result["negative_indicators"]
+        assert batch["scores"][i] == result["score"]
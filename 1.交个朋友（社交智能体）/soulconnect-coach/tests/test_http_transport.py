@@ -0,0 +1,67 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.http_transport import PooledTransport
+from utils.metrics import Metrics
+
+BODY = {"model": "glm-4", "messages": [{"role": "user", "content": "你好"}]}
+
+
+def make_transport(**kwargs):
+    return PooledTransport(metrics=Metrics(), **kwargs)
+
+
+def test_sequential_requests_reuse_one_connection(mock_server):
+    transport = make_transport()
+    for _ in range(5):
+        assert transport.post(mock_server.url, json=BODY).status_code == 200
+
+    stats = transport.stats()
+    assert stats["requests"] == 5
+    assert stats["handshakes"] == 1
+    assert stats["pool_hits"] == 4
+
+
+def test_connection_pool_is_the_one_the_adapter_uses(mock_server):
+    transport = make_transport()
+    transport.post(mock_server.url, json=BODY)
+    # 统计读取的必须是实际发送请求的连接池，否则握手次数恒为0
+    assert transport._connection_pool(mock_server.url).num_connections == 1
+
+
+def test_handshakes_are_counted_per_host(mock_server):
+    transport = make_transport()
+    other_host_url = mock_server.url.replace("127.0.0.1", "localhost")
+    for url in (mock_server.url, other_host_url, mock_server.url, other_host_url):
+        transport.post(url, json=BODY)
+
+    stats = transport.stats()
+    assert stats["handshakes"] == 2
+    assert {host: item["handshakes"] for host, item in stats["hosts"].items()} == {
+        mock_server.url.split("/")[2]: 1, other_host_url.split("/")[2]: 1
+    }
+
+
+def test_concurrent_requests_open_at_most_pool_maxsize_reused_connections(mock_server):
+    mock_server.latency = 0.05
+    transport = make_transport(pool_maxsize=4)
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        for _ in range(3):
+            assert all(response.status_code == 200 for response in pool.map(
+                lambda _: transport.post(mock_server.url, json=BODY), range(4)))
+
+    stats = transport.stats()
+    assert stats["requests"] == 12
+    assert stats["handshakes"] <= 4
+    assert stats["pool_hits"] >= 8
+
+
+def test_first_request_is_recorded_as_connect_ttfb(mock_server):
+    metrics = Metrics()
+    transport = PooledTransport(metrics=metrics)
+    for _ in range(3):
+        transport.post(mock_server.url, json=BODY)
+
+    stages = metrics.summary()["stages"]
+    assert stages["connect_ttfb"]["count"] == 1
+    assert stages["ttfb"]["count"] == 2
+    assert stages["body"]["count"] == 3
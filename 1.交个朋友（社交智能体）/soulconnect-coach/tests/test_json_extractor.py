@@ -0,0 +1,104 @@
+import json
+
+import pytest
+
+from mock_glm_server import ADVICE_REPLY
+
+from utils.glm_client import CONVERSATION_ADVICE_SCHEMA
+from utils.json_extractor import JSONStreamExtractor, extract_json, validate_and_fill
+
+ADVICE = {"emotion_analysis": "气氛不错 {放松}", "suggested_topics": ["旅行", "摄影"],
+          "response_suggestion": "你说的\"那家店\"在哪？"}
+FENCED = "好的，以下是分析：\n```json\n" + json.dumps(ADVICE, ensure_ascii=False) + "\n```\n希望对你有帮助 {完}"
+
+
+def feed_in_chunks(text, size):
+    """按固定长度切块喂给提取器，返回结果和解析出结果时已喂入的字符数"""
+    extractor = JSONStreamExtractor()
+    for start in range(0, len(text), size):
+        result = extractor.feed(text[start:start + size])
+        if result is not None:
+            return result, start + size
+    return extractor.finish(), len(text)
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 64, 10 ** 6])
+def test_split_chunks_parse_as_soon_as_the_object_closes(size):
+    closing = FENCED.index("}\n```") + 1
+    result, consumed = feed_in_chunks(FENCED, size)
+
+    assert result == ADVICE
+    # 在包含右括号的那一块到达时就返回，不等后面的说明文字
+    assert closing <= consumed < closing + size
+
+
+def test_every_split_point():
+    text = json.dumps(ADVICE, ensure_ascii=False)
+    for split in range(len(text) + 1):
+        extractor = JSONStreamExtractor()
+        assert extractor.feed(text[:split]) is None or split == len(text)
+        assert extractor.feed(text[split:]) == ADVICE
+
+
+@pytest.mark.parametrize("text, expected", [
+    ('{不是JSON} 然后 {"a": 1}', {"a": 1}),
+    ('[1, 2] {"a": 1}', {"a": 1}),
+    ('{"a": {"b": 1}, "c": [1, 2,],}', {"a": {"b": 1}, "c": [1, 2]}),
+    ('{"a": "\\\\"} 之后', {"a": "\\"}),
+    ('{"a": "x}"}', {"a": "x}"}),
+])
+def test_malformed_or_tricky_input(text, expected):
+    assert extract_json(text) == expected
+    assert feed_in_chunks(text, 1)[0] == expected
+
+
+@pytest.mark.parametrize("text, expected", [
+    ('```json\n{"a": [1, 2', {"a": [1, 2]}),
+    ('{"a": "被截断的文', {"a": "被截断的文"}),
+    ('{"a": 1, "b": {"c": 2},', {"a": 1, "b": {"c": 2}}),
+])
+def test_truncated_object_is_closed_on_finish(text, expected):
+    extractor = JSONStreamExtractor()
+    assert extractor.feed(text) is None
+    assert extractor.finish() == expected
+
+
+@pytest.mark.parametrize("text", ["", "没有JSON", "[1, 2, 3]", '{"a": }'])
+def test_no_object(text):
+    assert extract_json(text) is None
+
+
+def test_result_is_kept_after_completion():
+    extractor = JSONStreamExtractor()
+    assert extractor.feed('{"a": 1}') == {"a": 1}
+    assert extractor.feed('{"b": 2}') == {"a": 1}
+    assert extractor.finish() == {"a": 1}
+
+
+def test_validate_and_fill_only_fills_missing_fields():
+    result, filled = validate_and_fill(dict(ADVICE, suggested_topics="旅行、摄影，美食"), CONVERSATION_ADVICE_SCHEMA)
+
+    assert filled == ["improvement_suggestions"]
+    assert result["suggested_topics"] == ["旅行", "摄影", "美食"]
+    assert result["emotion_analysis"] == ADVICE["emotion_analysis"]
+    # 默认列表是副本，修改结果不影响 schema
+    result["improvement_suggestions"].append("新建议")
+    assert CONVERSATION_ADVICE_SCHEMA["improvement_suggestions"][1] == ["保持友好态度"]
+
+    result, filled = validate_and_fill({"emotion_analysis": ["轻松", "愉快"], "suggested_topics": 3},
+                                       CONVERSATION_ADVICE_SCHEMA)
+    assert result["emotion_analysis"] == "轻松，愉快"
+    assert filled == ["suggested_topics", "improvement_suggestions", "response_suggestion"]
+
+
+def test_stream_with_split_bytes_extracts_advice(mock_server, make_client):
+    mock_server.stream_split_bytes = 2
+    extractor = JSONStreamExtractor()
+    result = None
+    for delta in make_client().stream_conversation_advice([{"role": "user", "content": "周末去爬山了"}]):
+        result = extractor.feed(delta)
+        if result is not None:
+            break
+
+    assert result == ADVICE_REPLY
+    assert mock_server.stats()["requests"] == 1
@@ -0,0 +1,141 @@
+import json
+import threading
+
+import pytest
+
+from utils.metrics import STAGE_METRIC, TOKEN_METRIC, Histogram, Metrics
+
+
+def test_histogram_quantiles_use_nearest_rank():
+    histogram = Histogram(window=100)
+    assert histogram.quantiles() == {0.5: 0.0, 0.95: 0.0, 0.99: 0.0}
+
+    for value in range(1, 101):
+        histogram.observe(value / 1000)
+    assert histogram.quantiles() == {0.5: 0.05, 0.95: 0.095, 0.99: 0.099}
+
+    # 分位数只看最近的窗口，累计分桶保留全部样本
+    for _ in range(100):
+        histogram.observe(10.0)
+    assert histogram.quantiles()[0.5] == 10.0
+    assert histogram.count == 200
+
+
+def test_nested_spans_form_one_trace():
+    metrics = Metrics()
+    with metrics.span("request") as outer:
+        with metrics.span("llm", model="glm-4") as inner:
+            metrics.record_span("ttfb", 0.25)
+        with pytest.raises(ValueError):
+            with metrics.span("parse"):
+                raise ValueError("bad")
+
+    spans = {span["stage"]: span for span in metrics.recent_spans()}
+    assert [span["stage"] for span in metrics.recent_spans()] == ["ttfb", "llm", "parse", "request"]
+    assert {span["trace_id"] for span in spans.values()} == {outer["span_id"]}
+    assert spans["llm"]["parent_id"] == outer["span_id"]
+    assert spans["ttfb"]["parent_id"] == inner["span_id"]
+    assert spans["ttfb"]["duration"] == 0.25
+    assert spans["parse"]["error"] == "ValueError"
+    assert spans["request"]["duration"] >= spans["llm"]["duration"]
+    assert metrics.summary()["stages"]["ttfb"]["count"] == 1
+
+
+def test_threads_have_separate_traces():
+    metrics = Metrics()
+    barrier = threading.Barrier(2)
+
+    def work():
+        with metrics.span("request"):
+            barrier.wait()
+            with metrics.span("llm"):
+                pass
+
+    threads = [threading.Thread(target=work) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    spans = metrics.recent_spans()
+    requests = {span["span_id"] for span in spans if span["stage"] == "request"}
+    assert len(requests) == 2
+    assert {span["parent_id"] for span in spans if span["stage"] == "llm"} == requests
+
+
+def test_record_usage_counts_tokens_and_annotates_span():
+    metrics = Metrics()
+    with metrics.span("llm") as span:
+        metrics.record_usage({"prompt_tokens": 30, "completion_tokens": 12, "total_tokens": 42}, "glm-4")
+    metrics.record_usage(None, "glm-4")
+    metrics.record_usage({"prompt_tokens": 5}, "glm-4")
+
+    assert metrics.counter(TOKEN_METRIC, kind="prompt", model="glm-4") == 35
+    assert metrics.counter(TOKEN_METRIC, kind="completion", model="glm-4") == 12
+    assert span["attributes"] == {"prompt_tokens": 30, "completion_tokens": 12}
+
+
+def test_prometheus_export():
+    metrics = Metrics()
+    metrics.observe(STAGE_METRIC, 0.001, stage="parse")
+    metrics.observe(STAGE_METRIC, 100.0, stage="parse")
+    metrics.inc("soulconnect_test_total", 2, note='a "quoted"\nvalue')
+
+    lines = metrics.to_prometheus().splitlines()
+    assert lines.count(f"# TYPE {STAGE_METRIC} histogram") == 1
+    # 等于上界的样本计入该桶（le 语义），超出所有上界的只计入 +Inf
+    assert f'{STAGE_METRIC}_bucket{{stage="parse",le="0.001"}} 1' in lines
+    assert f'{STAGE_METRIC}_bucket{{stage="parse",le="60.0"}} 1' in lines
+    assert f'{STAGE_METRIC}_bucket{{stage="parse",le="+Inf"}} 2' in lines
+    assert f'{STAGE_METRIC}_count{{stage="parse"}} 2' in lines
+    assert 'soulconnect_test_total{note="a \\"quoted\\"\\nvalue"} 2' in lines
+
+
+def test_jsonl_export_and_trace_file(tmp_path):
+    path = tmp_path / "trace.jsonl"
+    metrics = Metrics(trace_path=str(path))
+    with metrics.span("request", user="小林"):
+        metrics.record_span("ttfb", 0.1)
+
+    exported = [json.loads(line) for line in metrics.to_jsonl().splitlines()]
+    assert [record.get("stage") for record in exported[:-1]] == ["ttfb", "request"]
+    assert exported[-1]["type"] == "summary"
+    assert exported[-1]["stages"]["request"]["count"] == 1
+
+    written = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+    assert written == exported[:-1]
+    assert written[1]["attributes"] == {"user": "小林"}
+
+
+def test_snapshot_merge():
+    first, second = Metrics(), Metrics()
+    for metrics, value in ((first, 0.01), (second, 0.2)):
+        metrics.observe(STAGE_METRIC, value, stage="llm")
+        metrics.inc("soulconnect_test_total", 1)
+    second.observe("custom_seconds", 1.0)
+    first._histograms[("custom_seconds", ())] = Histogram(buckets=(1.0, 2.0))
+
+    merged = Metrics()
+    merged.merge(json.loads(json.dumps(first.snapshot())))
+    merged.merge(json.loads(json.dumps(second.snapshot())))
+
+    assert merged.counter("soulconnect_test_total") == 2
+    histogram = merged._histograms[(STAGE_METRIC, (("stage", "llm"),))]
+    assert histogram.count == 2
+    assert histogram.sum == pytest.approx(0.21)
+    # 分桶不一致的快照不合并
+    assert merged._histograms[("custom_seconds", ())].count == 0
+
+
+def test_client_call_records_stages_and_tokens(make_client):
+    client = make_client()
+    with client.metrics.span("analyze_profile"):
+        client.chat([{"role": "user", "content": "你好"}])
+
+    stages = [span["stage"] for span in client.metrics.recent_spans()]
+    assert stages[-1] == "analyze_profile"
+    assert {"queue", "llm"} <= set(stages)
+    assert {"ttfb", "connect_ttfb"} & set(stages)
+    llm = next(span for span in client.metrics.recent_spans() if span["stage"] == "llm")
+    assert llm["attributes"]["prompt_tokens"] > 0
+    assert client.metrics.counter(TOKEN_METRIC, kind="completion", model="glm-4") > 0
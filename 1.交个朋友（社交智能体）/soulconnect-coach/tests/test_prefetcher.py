@@ -0,0 +1,140 @@
+import threading
+import time
+
+from utils.glm_client import INTERRUPTED_SUFFIX, GLMStreamError
+from utils.prefetcher import IcebreakerPrefetcher, PrefetchPool
+from utils.scheduler import PRIORITY_BATCH
+
+TOPICS = ["旅行"]
+
+
+class FakeClient:
+    """按脚本逐段产出的客户端；脚本项为字符串、threading.Event（等到被置位再继续）或要抛出的异常"""
+
+    def __init__(self, script, live=("实时", "开场白")):
+        self.script = script
+        self.live = live
+        self.calls = []
+        self.closed = threading.Event()
+
+    def generate_icebreaker_stream(self, topics, style, nickname):
+        self.calls.append("live")
+        yield from self.live
+
+    def stream_icebreaker(self, topics, style, nickname, priority=None):
+        self.calls.append(priority)
+        try:
+            for item in self.script:
+                if isinstance(item, threading.Event):
+                    item.wait(5)
+                elif isinstance(item, Exception):
+                    raise item
+                else:
+                    yield item
+        finally:
+            self.closed.set()
+
+
+def prefetch(client, **pool_options):
+    prefetcher = IcebreakerPrefetcher(client, pool=PrefetchPool(**pool_options))
+    prefetcher.prefetch("target", [(TOPICS, "友好型", "小林")])
+    return prefetcher
+
+
+def wait_for(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline
+        time.sleep(0.005)
+
+
+def test_finished_prefetch_is_returned_without_new_call():
+    client = FakeClient(["你好", "呀"])
+    prefetcher = prefetch(client)
+    wait_for(lambda: prefetcher.stats()["ready"] == 1)
+
+    assert "".join(prefetcher.take(TOPICS, "友好型", "小林")) == "你好呀"
+    assert len(client.calls) == 1
+    assert prefetcher.stats()["hits"] == 1
+    # 槽位已清空
+    assert prefetcher.take(TOPICS, "友好型", "小林") is None
+
+
+def test_in_flight_prefetch_is_streamed_without_waiting():
+    release = threading.Event()
+    client = FakeClient(["你好", release, "呀"])
+    prefetcher = prefetch(client)
+    wait_for(lambda: client.calls)
+
+    begin = time.monotonic()
+    stream = prefetcher.take(TOPICS, "友好型", "小林")
+    assert next(stream) == "你好"
+    assert time.monotonic() - begin < 0.5
+
+    release.set()
+    assert "".join(stream) == "呀"
+    assert len(client.calls) == 1
+    assert prefetcher.stats()["joined"] == 1
+
+
+def test_queued_prefetch_is_revoked():
+    blocker = threading.Event()
+    pool = PrefetchPool(max_workers=1)
+    pool.submit(blocker.wait, 5)
+    client = FakeClient(["你好"])
+    prefetcher = IcebreakerPrefetcher(client, pool=pool)
+    prefetcher.prefetch("target", [(TOPICS, "友好型", "小林")])
+
+    assert prefetcher.take(TOPICS, "友好型", "小林") is None
+    blocker.set()
+    time.sleep(0.05)
+    assert client.calls == []
+
+
+def test_failure_before_output_falls_back_to_live():
+    release = threading.Event()
+    client = FakeClient([release, GLMStreamError("HTTP 500")])
+    prefetcher = prefetch(client)
+    wait_for(lambda: client.calls)
+
+    stream = prefetcher.take(TOPICS, "友好型", "小林")
+    release.set()
+    assert "".join(stream) == "实时开场白"
+    assert client.calls == [PRIORITY_BATCH, "live"]
+
+
+def test_text_resembling_an_error_is_kept():
+    client = FakeClient(["生成失败", "也没关系", INTERRUPTED_SUFFIX])
+    prefetcher = prefetch(client)
+    wait_for(lambda: prefetcher.stats()["ready"] == 1)
+
+    # 只有异常才算失败，模型输出恰好像错误提示时照常返回
+    assert "".join(prefetcher.take(TOPICS, "友好型", "小林")) == "生成失败也没关系" + INTERRUPTED_SUFFIX
+    assert len(client.calls) == 1
+
+
+def test_interruption_after_output_is_reported():
+    release = threading.Event()
+    client = FakeClient(["你好", release, GLMStreamError("连接断开")])
+    prefetcher = prefetch(client)
+    wait_for(lambda: client.calls)
+
+    stream = prefetcher.take(TOPICS, "友好型", "小林")
+    release.set()
+    assert "".join(stream) == "你好" + INTERRUPTED_SUFFIX
+    assert len(client.calls) == 1
+
+
+def test_stalled_prefetch_is_cancelled_and_replaced():
+    release = threading.Event()
+    client = FakeClient([release, "很久以后", "的输出"])
+    prefetcher = prefetch(client)
+    wait_for(lambda: client.calls)
+
+    stream = prefetcher.take(TOPICS, "友好型", "小林", stall_timeout=0.05)
+    assert "".join(stream) == "实时开场白"
+
+    # 预取在下一段输出到达时中断，不再继续消耗
+    release.set()
+    assert client.closed.wait(2)
+    assert len(client.calls) == 2
@@ -0,0 +1,130 @@
+import math
+import random
+
+import pytest
+
+from utils.profile_store import SAMPLE_PROFILES, ProfileStore
+
+TAGS = [f"标签{i}" for i in range(40)]
+
+
+def random_profiles(count, seed=2):
+    rng = random.Random(seed)
+    ids = rng.sample(range(1, count * 10), count)
+    return [{
+        "id": profile_id,
+        "nickname": f"用户{profile_id}",
+        "age": rng.randint(18, 40),
+        "tags": rng.sample(TAGS[:rng.choice([10, 40])], rng.randint(1, 6)),
+        "bio": f"简介{profile_id}",
+        "recent_moments": "动态😀" * rng.randint(0, 3)
+    } for profile_id in ids]
+
+
+@pytest.fixture(scope="module")
+def profiles():
+    return random_profiles(2000)
+
+
+@pytest.fixture(scope="module")
+def store(profiles):
+    return ProfileStore(profiles)
+
+
+def test_rows_round_trip(store, profiles):
+    assert len(store) == len(profiles)
+    assert list(store) == profiles
+    assert list(ProfileStore()) == SAMPLE_PROFILES
+
+
+def test_missing_fields_and_duplicate_tags():
+    store = ProfileStore([{"id": 7, "nickname": "无名", "tags": ["爬山", "爬山", "咖啡"]}])
+    assert store.get(7) == {"id": 7, "nickname": "无名", "tags": ["爬山", "咖啡"], "bio": "", "recent_moments": ""}
+
+
+def test_lookup_by_id(store, profiles):
+    for profile in random.Random(4).sample(profiles, 100):
+        assert store.get(profile["id"]) == profile
+        assert store.nickname(profile["id"]) == profile["nickname"]
+    assert store.get(0) is None
+    assert store.nickname(0) == "0"
+
+
+def test_candidates_use_the_tag_index(store, profiles):
+    query = ["标签3", "标签25", "不存在的标签"]
+    expected = sorted(i for i, profile in enumerate(profiles) if set(query) & set(profile["tags"]))
+    assert store.candidates(query).tolist() == expected
+    assert store.candidates(["不存在的标签"]).tolist() == []
+
+
+def brute_force(profiles, query, weight):
+    """逐条计算加权Jaccard：重合权重 / (查询权重 + 资料权重 - 重合权重)"""
+    query = set(query)
+    scored = []
+    for profile in profiles:
+        tags = set(profile["tags"])
+        shared = query & tags
+        if not shared:
+            continue
+        overlap = sum(weight(tag) for tag in shared)
+        union = sum(weight(tag) for tag in query) + sum(weight(tag) for tag in tags) - overlap
+        scored.append((-round(overlap / union, 4), profile["id"]))
+    return [profile_id for _, profile_id in sorted(scored)]
+
+
+def test_jaccard_ranking_matches_brute_force(store, profiles):
+    rng = random.Random(6)
+    for _ in range(30):
+        query = rng.sample(TAGS, rng.randint(1, 5))
+        results = store.most_compatible(query, limit=10)
+        assert [item["id"] for item in results] == brute_force(profiles, query, lambda tag: 1.0)[:10]
+        for item in results:
+            assert item["shared_tags"] == [tag for tag in store.get(item["id"])["tags"] if tag in query]
+
+
+def test_weighted_ranking_matches_brute_force(store, profiles):
+    frequency = {tag: sum(tag in profile["tags"] for profile in profiles) for tag in TAGS}
+    max_weight = max(math.log((1 + len(profiles)) / (1 + count)) + 1.0 for count in frequency.values())
+
+    def weight(tag):
+        if tag not in frequency:
+            return max_weight
+        return math.log((1 + len(profiles)) / (1 + frequency[tag])) + 1.0
+
+    rng = random.Random(8)
+    for _ in range(30):
+        query = rng.sample(TAGS, rng.randint(1, 4)) + ["冷门新标签"] * rng.randint(0, 1)
+        results = store.most_compatible(query, limit=10, method="weighted")
+        assert [item["id"] for item in results] == brute_force(profiles, query, weight)[:10]
+
+
+def test_rare_shared_tags_rank_higher_when_weighted():
+    store = ProfileStore([
+        {"id": 1, "nickname": "热门", "tags": ["电影", "音乐"]},
+        {"id": 2, "nickname": "冷门", "tags": ["电影", "古琴"]},
+    ] + [{"id": i, "nickname": f"路人{i}", "tags": ["音乐", f"爱好{i}", f"特长{i}"]} for i in range(3, 20)])
+
+    assert [item["id"] for item in store.most_compatible(["音乐", "古琴"], limit=2)] == [1, 2]
+    assert [item["id"] for item in store.most_compatible(["音乐", "古琴"], limit=2, method="weighted")] == [2, 1]
+
+
+def test_exclude_and_edge_cases(store, profiles):
+    query = profiles[0]["tags"]
+    assert store.most_compatible(query, limit=1)[0]["id"] == profiles[0]["id"]
+    assert store.most_compatible(query, limit=1, exclude_ids=[profiles[0]["id"]])[0]["id"] != profiles[0]["id"]
+    assert store.most_compatible(["不存在的标签"]) == []
+    with pytest.raises(ValueError):
+        store.most_compatible(query, method="cosine")
+
+
+def test_popular_tags(store, profiles):
+    counts = {tag: sum(tag in profile["tags"] for profile in profiles) for tag in TAGS}
+    popular = store.popular_tags(5)
+    assert [counts[tag] for tag in popular] == sorted(counts.values(), reverse=True)[:5]
+
+
+def test_storage_is_compact(store):
+    usage = store.memory_usage()
+    assert usage["total"] == sum(value for key, value in usage.items() if key != "total")
+    # 每条资料只有几十个字节的数组数据，没有逐条的Python对象
+    assert usage["total"] / len(store) < 200
@@ -0,0 +1,85 @@
+from utils.prompt_builder import PromptBuilder
+from utils.response_cache import ResponseCache
+
+
+def long_history(count=30):
+    return [{"role": "user" if i % 2 == 0 else "assistant", "content": f"第{i}条消息，聊聊周末去哪里爬山和拍照"}
+            for i in range(count)]
+
+
+def test_model_summary_is_used_for_older_messages(make_client, mock_server):
+    client = make_client(prompt_builder=PromptBuilder(history_budget=120, summary_budget=40), model_summary=True)
+
+    result = client.provide_conversation_advice(long_history())
+
+    assert "error" not in result
+    # 一次摘要调用加一次建议调用
+    assert mock_server.stats()["requests"] == 2
+    assert client.metrics.counter("soulconnect_prompt_summaries_total", regenerated=True) == 1
+    assert client.metrics.counter("soulconnect_prompt_builds_total") == 1
+    assert client.metrics.counter("soulconnect_prompt_history_tokens_total") > 0
+
+    # 摘要按区间缓存，历史不变时不再调用模型摘要
+    client.cache = ResponseCache(deterministic_max_temperature=-1)
+    client.provide_conversation_advice(long_history())
+    assert mock_server.stats()["requests"] == 3
+    assert client.metrics.counter("soulconnect_prompt_summaries_total", regenerated=False) == 1
+
+
+def test_local_summary_by_default(make_client, mock_server, monkeypatch):
+    monkeypatch.delenv("SOULCONNECT_MODEL_SUMMARY", raising=False)
+    builder = PromptBuilder(history_budget=120, summary_budget=40)
+    client = make_client(prompt_builder=builder)
+
+    client.provide_conversation_advice(long_history())
+
+    assert mock_server.stats()["requests"] == 1
+    assert client.metrics.counter("soulconnect_prompt_summaries_total", regenerated=True) == 1
+    # 本地摘要截取较早消息的开头，控制在摘要预算内
+    text, stats = builder.build_history(long_history())
+    assert not stats["summary_regenerated"]
+    summary = text.split("\n")[0]
+    assert summary.startswith("（更早的对话摘要：") and "user说“第" in summary
+    assert stats["summary_tokens"] <= 40
+
+
+def joining_summary(previous, messages):
+    """逐字保留全部内容的摘要，便于检查摘要覆盖了哪些消息"""
+    return previous + "".join(message["content"] for message in messages)
+
+
+def conversation(opening):
+    return [{"role": "user", "content": opening}] + long_history()[1:]
+
+
+def test_summary_is_not_shared_between_histories_with_same_tail():
+    builder = PromptBuilder(history_budget=120, summary_budget=40, summarizer=joining_summary)
+
+    text_a, stats_a = builder.build_history(conversation("我住在杭州西湖边"))
+    text_b, stats_b = builder.build_history(conversation("我最近在学吉他"))
+
+    assert stats_a["summary_regenerated"] and stats_b["summary_regenerated"]
+    assert "杭州" in text_a
+    assert "杭州" not in text_b and "吉他" in text_b
+    # 同一区间再次组装时命中缓存
+    assert builder.build_history(conversation("我住在杭州西湖边")) == (text_a, dict(stats_a, summary_regenerated=False))
+
+
+def test_summary_is_scoped_to_conversation():
+    builder = PromptBuilder(history_budget=120, summary_budget=40, summarizer=joining_summary)
+    history = [dict(message, seq=i) for i, message in enumerate(conversation("我住在杭州西湖边"))]
+
+    text, stats = builder.build_history(history, conversation_id="a")
+    assert stats["summary_regenerated"]
+    # 末尾相同但属于另一会话，不复用摘要
+    other = [dict(message, seq=i) for i, message in enumerate(conversation("我最近在学吉他"))]
+    text_b, stats_b = builder.build_history(other, conversation_id="b")
+    assert stats_b["summary_regenerated"] and "杭州" not in text_b
+
+    # 同一会话最早的消息移出最近窗口后仍能在上一版摘要上增量合并
+    history.append({"role": "assistant", "content": "第30条消息，聊聊周末去哪里爬山和拍照", "seq": len(history)})
+    calls = []
+    builder.summarizer = lambda previous, messages: calls.append(messages) or joining_summary(previous, messages)
+    text, stats = builder.build_history(history[1:], conversation_id="a")
+    assert stats["summary_regenerated"] and "杭州" in text
+    assert len(calls) == 1 and len(calls[0]) == 1
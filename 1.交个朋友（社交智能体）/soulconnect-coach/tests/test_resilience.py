@@ -0,0 +1,135 @@
+import threading
+import time
+from email.utils import formatdate
+
+import pytest
+
+from utils.resilience import CircuitBreaker, RetryPolicy, parse_retry_after
+from utils.scheduler import RequestScheduler, SQLiteRateLimiter
+
+MESSAGES = [{"role": "user", "content": "你好"}]
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("2") == 2.0
+    assert parse_retry_after("-1") == 0.0
+    assert 8 < parse_retry_after(formatdate(time.time() + 10, usegmt=True)) <= 10
+    assert parse_retry_after("soon") is None
+    assert parse_retry_after(None) is None
+
+
+def test_retry_after_is_waited_before_retrying(make_client, mock_server):
+    mock_server.error_rate = 1.0
+    mock_server.rate_limit_share = 1.0
+    mock_server.retry_after = 0.3
+    client = make_client(retry_policy=RetryPolicy(max_attempts=2, base_delay=0.01, max_delay=0.05))
+
+    begin = time.monotonic()
+    result = client.chat(MESSAGES)
+    elapsed = time.monotonic() - begin
+
+    assert result["status"] == 429
+    assert mock_server.stats()["rate_limited"] == 2
+    # 退避时间远小于 Retry-After，实际等待以 Retry-After 为准
+    assert elapsed >= 0.3
+
+
+def test_retry_after_beyond_deadline_fails_fast(make_client, mock_server):
+    mock_server.error_rate = 1.0
+    mock_server.rate_limit_share = 1.0
+    mock_server.retry_after = 5
+    client = make_client(request_deadline=1.0)
+
+    begin = time.monotonic()
+    result = client.chat(MESSAGES)
+
+    assert result["status"] == 429
+    assert mock_server.stats()["requests"] == 1
+    assert time.monotonic() - begin < 1.0
+
+
+def test_retries_exhausted(make_client, mock_server):
+    mock_server.error_rate = 1.0
+    mock_server.rate_limit_share = 0.0
+    client = make_client(retry_policy=RetryPolicy(max_attempts=3, base_delay=0.01, max_delay=0.05))
+
+    result = client.chat(MESSAGES)
+
+    assert result["status"] == 500
+    assert mock_server.stats()["requests"] == 3
+    assert client.metrics.counter("soulconnect_glm_retries_total") == 2
+
+
+def test_retry_recovers_after_transient_error(make_client, mock_server):
+    mock_server.error_rate = 1.0
+    mock_server.rate_limit_share = 1.0
+    mock_server.retry_after = 0.2
+    client = make_client()
+
+    def recover():
+        # 第一次失败后、退避等待期间上游恢复
+        while mock_server.stats()["requests"] < 1:
+            time.sleep(0.005)
+        mock_server.error_rate = 0.0
+
+    threading.Thread(target=recover).start()
+    result = client.chat(MESSAGES)
+
+    assert "error" not in result
+    assert client.circuit_breaker.state == CircuitBreaker.CLOSED
+
+
+def test_circuit_breaker_open_half_open_closed(make_client, mock_server):
+    mock_server.error_rate = 1.0
+    mock_server.rate_limit_share = 0.0
+    breaker = CircuitBreaker(failure_threshold=2, recovery_timeout=0.2)
+    client = make_client(retry_policy=RetryPolicy(max_attempts=1), circuit_breaker=breaker)
+
+    client.chat(MESSAGES)
+    assert breaker.state == CircuitBreaker.CLOSED
+    client.chat(MESSAGES)
+    assert breaker.state == CircuitBreaker.OPEN
+
+    # 打开期间不再请求上游
+    result = client.chat(MESSAGES)
+    assert result["circuit_open"]
+    assert mock_server.stats()["requests"] == 2
+
+    # 冷却结束后半开，探测请求失败则重新打开
+    time.sleep(0.25)
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    client.chat(MESSAGES)
+    assert breaker.state == CircuitBreaker.OPEN
+    assert mock_server.stats()["requests"] == 3
+
+    # 上游恢复后探测成功，熔断器关闭
+    mock_server.error_rate = 0.0
+    time.sleep(0.25)
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert "error" not in client.chat(MESSAGES)
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.stats()["rejected"] == 1
+
+
+@pytest.mark.parametrize("shared", [False, True])
+def test_failed_attempts_refund_token_estimate(make_client, mock_server, tmp_path, shared):
+    mock_server.error_rate = 1.0
+    mock_server.rate_limit_share = 0.0
+    # 每秒只补充1个token，不退还时三次尝试的预估会明显压低余额
+    limiter = SQLiteRateLimiter(str(tmp_path / "rate.db"), requests_per_sec=10000, tokens_per_min=60,
+                                token_burst=100000) if shared else None
+    scheduler = RequestScheduler(requests_per_sec=10000, tokens_per_min=60, token_burst=100000,
+                                 shared_limiter=limiter)
+    client = make_client(scheduler=scheduler,
+                         retry_policy=RetryPolicy(max_attempts=3, base_delay=0.01, max_delay=0.05))
+
+    assert client.chat(MESSAGES)["status"] == 500
+    assert mock_server.stats()["requests"] == 3
+
+    if shared:
+        limiter.adjust(0)
+        balance = limiter._conn.execute("SELECT tokens FROM rate_limit WHERE name = 'tokens'").fetchone()[0]
+        limiter.close()
+    else:
+        balance = scheduler._token_bucket.tokens
+    assert balance >= 100000 - 1
@@ -0,0 +1,38 @@
+import time
+
+from utils.response_cache import ResponseCache
+
+MESSAGES = [{"role": "user", "content": "分析一下这份资料"}]
+
+
+def test_stale_disk_hit_is_not_promoted_as_fresh(tmp_path):
+    path = str(tmp_path / "cache.db")
+    ResponseCache(ttl=0.1, sqlite_path=path).put("glm-4", 0.1, MESSAGES, {"v": 1})
+    time.sleep(0.15)
+
+    cache = ResponseCache(ttl=0.1, sqlite_path=path)
+    assert cache.get("glm-4", 0.1, MESSAGES) is None
+    assert cache.get("glm-4", 0.1, MESSAGES, allow_stale=True) == {"v": 1}
+    assert cache.get("glm-4", 0.1, MESSAGES) is None
+
+
+def test_fresh_disk_hit_keeps_its_expiry_in_memory(tmp_path):
+    path = str(tmp_path / "cache.db")
+    ResponseCache(ttl=0.2, sqlite_path=path).put("glm-4", 0.1, MESSAGES, {"v": 1})
+
+    # 内存层的有效期更长也不能延长磁盘上条目的有效期
+    cache = ResponseCache(ttl=3600, sqlite_path=path)
+    assert cache.get("glm-4", 0.1, MESSAGES) == {"v": 1}
+    time.sleep(0.25)
+    assert cache.get("glm-4", 0.1, MESSAGES) is None
+
+
+def test_expired_variants_are_not_revived_by_put():
+    cache = ResponseCache(ttl=0.1, variant_pool_size=2)
+    cache.put("glm-4", 0.8, MESSAGES, {"v": 1})
+    time.sleep(0.15)
+    cache.put("glm-4", 0.8, MESSAGES, {"v": 2})
+    # 过期的 v1 不算在结果池里，池中只有一个结果，未填满时继续请求新结果
+    assert cache.get("glm-4", 0.8, MESSAGES) is None
+    cache.put("glm-4", 0.8, MESSAGES, {"v": 3})
+    assert {cache.get("glm-4", 0.8, MESSAGES)["v"] for _ in range(20)} <= {2, 3}
@@ -0,0 +1,103 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from utils.single_flight import SingleFlight, SingleFlightTimeout
+
+MESSAGES = [{"role": "user", "content": "分析一下这份资料"}]
+CALLERS = 8
+
+
+def wait_for(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline
+        time.sleep(0.005)
+
+
+def start_callers(pool, flight, fn, callers=CALLERS):
+    """同时发起 callers 个相同key的调用，等其余调用都挂到第一个调用上"""
+    futures = [pool.submit(flight.do, "key", fn) for _ in range(callers)]
+    wait_for(lambda: flight.stats()["coalesced"] == callers - 1)
+    return futures
+
+
+def test_concurrent_identical_calls_execute_once():
+    flight = SingleFlight()
+    release = threading.Event()
+    executions = []
+
+    def fetch():
+        executions.append(threading.get_ident())
+        release.wait(5)
+        return {"content": "结果"}
+
+    with ThreadPoolExecutor(CALLERS) as pool:
+        futures = start_callers(pool, flight, fetch)
+        assert flight.stats()["in_flight"] == 1
+        release.set()
+        results = [future.result() for future in futures]
+
+    assert len(executions) == 1
+    values = [value for value, _ in results]
+    assert all(value is values[0] for value in values)
+    assert sorted(shared for _, shared in results) == [False] + [True] * (CALLERS - 1)
+    assert flight.stats() == {"calls": CALLERS, "executions": 1, "coalesced": CALLERS - 1, "in_flight": 0}
+
+
+def test_error_reaches_every_waiter():
+    flight = SingleFlight()
+    release = threading.Event()
+
+    def fetch():
+        release.wait(5)
+        raise RuntimeError("上游失败")
+
+    with ThreadPoolExecutor(CALLERS) as pool:
+        futures = start_callers(pool, flight, fetch)
+        release.set()
+        assert all(isinstance(future.exception(), RuntimeError) for future in futures)
+    # key 已释放，之后的调用重新执行
+    assert flight.do("key", lambda: "重试成功") == ("重试成功", False)
+    assert flight.stats()["executions"] == 2
+
+
+def test_waiter_timeout():
+    flight = SingleFlight()
+    release = threading.Event()
+    with ThreadPoolExecutor(1) as pool:
+        leader = pool.submit(flight.do, "key", lambda: release.wait(5))
+        wait_for(lambda: flight.stats()["in_flight"] == 1)
+        with pytest.raises(SingleFlightTimeout):
+            flight.do("key", lambda: None, timeout=0.05)
+        release.set()
+        assert leader.result() == (True, False)
+
+
+def test_client_coalesces_identical_requests(make_client, mock_server):
+    mock_server.latency = 0.3
+    client = make_client()
+
+    with ThreadPoolExecutor(CALLERS) as pool:
+        results = list(pool.map(lambda _: client.chat(MESSAGES, temperature=0.1), range(CALLERS)))
+
+    assert mock_server.stats()["requests"] == 1
+    assert "error" not in results[0]
+    assert all(result == results[0] for result in results)
+    stats = client.single_flight.stats()
+    assert stats["executions"] == 1
+    assert stats["coalesced"] == CALLERS - 1
+    assert client.metrics.counter("soulconnect_glm_cache_hits_total") == 0
+
+
+def test_client_does_not_coalesce_uncached_calls(make_client, mock_server):
+    mock_server.latency = 0.1
+    client = make_client()
+
+    with ThreadPoolExecutor(3) as pool:
+        list(pool.map(lambda _: client.chat(MESSAGES, temperature=0.1, cache_variants=0), range(3)))
+
+    assert mock_server.stats()["requests"] == 3
+    assert client.single_flight.stats()["calls"] == 0
@@ -0,0 +1,99 @@
+import json
+
+import pytest
+
+from utils.emotion_analyzer import EmotionAnalyzer
+from utils.skill_scoring import PRIOR_SCORE, PRIOR_WEIGHT, SKILLS, SkillScorer
+
+CONVERSATION = [
+    {"role": "coach", "content": "建议开场白：你好呀", "type": "icebreaker"},
+    {"role": "user", "content": "你好，看到你最近去爬山了？"},
+    {"role": "coach", "content": "对方回复了", "type": "reply"},
+    {"role": "user", "content": "哈哈，听起来很辛苦，换作是我一定很累"},
+    {"role": "user", "content": "其实我小时候也很喜欢爬山，印象最深的是泰山日出"},
+    {"role": "coach", "content": "建议开场白：嗨", "type": "icebreaker"},
+    {"role": "user", "content": "今天真开心😂"},
+]
+
+
+@pytest.fixture(scope="module")
+def analyzer():
+    return EmotionAnalyzer(lexicon_paths=[])
+
+
+def scored(analyzer, messages):
+    scorer = SkillScorer(analyzer)
+    scorer.observe_many(messages)
+    return scorer
+
+
+def test_prior_without_messages(analyzer):
+    scorer = SkillScorer(analyzer)
+    assert scorer.scores() == {skill: PRIOR_SCORE for skill in SKILLS}
+    assert scorer.overall() == PRIOR_SCORE
+
+
+def test_aggregates_round_trip(analyzer):
+    scorer = scored(analyzer, CONVERSATION[:4])
+    restored = SkillScorer(analyzer, json.loads(json.dumps(scorer.to_dict())))
+    for message in CONVERSATION[4:]:
+        scorer.observe(message)
+        restored.observe(message)
+
+    assert restored.to_dict() == scorer.to_dict()
+    assert restored.scores() == scored(analyzer, CONVERSATION).scores()
+
+
+@pytest.mark.parametrize("skill, text", [
+    ("话题开启", "你好，最近在忙什么？"),
+    ("情绪感知", "听起来你很辛苦，我能体会"),
+    ("深度连接", "我觉得这段经历对你来说很有意义"),
+    ("幽默感", "哈哈哈笑死我了😂"),
+])
+def test_each_skill_follows_its_signal(analyzer, skill, text):
+    plain = scored(analyzer, [{"role": "user", "content": "嗯"}] * 10).scores()
+    signal = scored(analyzer, [{"role": "user", "content": text}] * 10).scores()
+    assert signal[skill] > plain[skill]
+
+
+def test_few_messages_are_shrunk_to_the_prior(analyzer):
+    scores = scored(analyzer, [{"role": "user", "content": "哈哈"}]).scores()
+    # 一条满分信号只把分数从先验拉高一格：(5×5 + 10×1) / (5 + 1)
+    assert scores["幽默感"] == round((PRIOR_SCORE * PRIOR_WEIGHT + 10) / (PRIOR_WEIGHT + 1), 1)
+
+    many = scored(analyzer, [{"role": "user", "content": "哈哈"}] * 200).scores()
+    assert 9.5 < many["幽默感"] <= 10
+
+
+def test_icebreaker_success_counts_first_reply_only(analyzer):
+    aggregates = scored(analyzer, CONVERSATION).to_dict()
+    assert aggregates["icebreakers"] == 2
+    assert aggregates["successful_icebreakers"] == 2
+    assert aggregates["user_messages"] == 4
+    assert aggregates["awaiting_reply"] is False
+
+
+def test_version_changes_only_with_aggregates(analyzer):
+    scorer = SkillScorer(analyzer)
+    scorer.observe({"role": "coach", "content": "对方回复了", "type": "reply"})
+    assert scorer.version == 0
+
+    scorer.observe(CONVERSATION[0])
+    scorer.observe(CONVERSATION[1])
+    assert scorer.version == 2
+    # 分数只由累计量决定，重复读取不改变版本
+    assert scorer.scores() == scorer.scores()
+    assert scorer.version == 2
+
+
+def test_observe_analyzes_each_message_once():
+    analyzed = []
+
+    class CountingAnalyzer(EmotionAnalyzer):
+        def analyze_text_emotion(self, text):
+            analyzed.append(text)
+            return super().analyze_text_emotion(text)
+
+    scorer = SkillScorer(CountingAnalyzer(lexicon_paths=[]))
+    scorer.observe_many(CONVERSATION)
+    assert analyzed == [message["content"] for message in CONVERSATION if message["role"] == "user"]
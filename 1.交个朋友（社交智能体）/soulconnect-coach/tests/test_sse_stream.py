@@ -0,0 +1,107 @@
+import json
+
+import pytest
+
+from mock_glm_server import ICEBREAKERS
+
+from utils.glm_client import GLMStreamError, iter_sse_deltas
+
+TEXT = "你好😀，今天去爬山了吗？"
+
+
+def sse_bytes(pieces, usage=None, done=b"data: [DONE]\n\n"):
+    events = []
+    for i, piece in enumerate(pieces):
+        event = {"choices": [{"index": 0, "delta": {"content": piece}}]}
+        if usage and i == len(pieces) - 1:
+            event["usage"] = usage
+        events.append(f"data: {json.dumps(event, ensure_ascii=False)}\n\n".encode("utf-8"))
+    return b"".join(events) + done
+
+
+def split_every(payload: bytes, size: int):
+    return [payload[i:i + size] for i in range(0, len(payload), size)]
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 5, 7, 64])
+def test_chunk_boundaries_and_split_utf8_sequences(size):
+    payload = sse_bytes([TEXT[:4], TEXT[4:9], TEXT[9:]])
+    # 1～3字节的切分必然截断中文和表情的多字节序列
+    assert "".join(iter_sse_deltas(split_every(payload, size))) == TEXT
+
+
+def test_crlf_line_endings_and_comments():
+    payload = sse_bytes(["好", "的"]).replace(b"\n", b"\r\n")
+    assert "".join(iter_sse_deltas([b": keep-alive\r\n\r\n", payload])) == "好的"
+
+
+def test_done_without_trailing_blank_line():
+    payload = sse_bytes(["好", "的"], done=b"data: [DONE]\n")
+    assert "".join(iter_sse_deltas(split_every(payload, 3))) == "好的"
+
+
+def test_done_without_trailing_newline():
+    payload = sse_bytes(["好", "的"], done=b"data: [DONE]")
+    assert "".join(iter_sse_deltas([payload])) == "好的"
+
+
+def test_event_not_terminated_before_done_is_still_emitted():
+    payload = b'data: {"choices": [{"delta": {"content": "\xe5\xa5\xbd"}}]}\ndata: [DONE]\n'
+    assert list(iter_sse_deltas([payload])) == ["好"]
+
+
+def test_usage_is_captured_from_last_event():
+    usage = {}
+    list(iter_sse_deltas([sse_bytes(["好", "的"], usage={"prompt_tokens": 3, "completion_tokens": 2})], usage))
+    assert usage == {"prompt_tokens": 3, "completion_tokens": 2}
+
+
+def test_stream_ending_without_done_raises():
+    deltas = iter_sse_deltas([sse_bytes(["好", "的"], done=b"")])
+    assert next(deltas) == "好"
+    assert next(deltas) == "的"
+    with pytest.raises(GLMStreamError):
+        next(deltas)
+
+
+@pytest.mark.parametrize("split_bytes", [0, 1, 5])
+def test_client_stream_over_http(mock_server, make_client, split_bytes):
+    mock_server.stream_split_bytes = split_bytes
+    mock_server.chunk_delay = 0.001 if split_bytes else 0.0
+    client = make_client()
+    text = "".join(client.generate_icebreaker_stream(["旅行"], "幽默型", "小林"))
+
+    assert text in ICEBREAKERS
+    summary = client.metrics.summary()
+    assert summary["stages"]["first_token"]["count"] == 1
+    assert any(name.startswith("soulconnect_glm_tokens_total") for name in summary["counters"])
+    # 流结束后按实际用量校正限流额度
+    assert client.scheduler.stats()["usage_adjustments"] == 1
+
+
+def test_client_stream_disconnect_mid_way(mock_server, make_client):
+    mock_server.stream_disconnect_after = 2
+    client = make_client()
+    stream = client.chat([{"role": "user", "content": "请写一句破冰开场白"}], stream=True)
+    received = []
+    with pytest.raises(GLMStreamError):
+        for delta in stream:
+            received.append(delta)
+    assert len(received) == 2
+    # 未收到 usage 时不校正，保留排队时的预估扣减
+    assert client.scheduler.stats()["usage_adjustments"] == 0
+
+    text = "".join(client.generate_icebreaker_stream(["旅行"], "幽默型", "小林"))
+    assert text.endswith("（生成中断）")
+
+    # 不转成提示文本的接口按异常报告失败
+    with pytest.raises(GLMStreamError):
+        "".join(client.stream_icebreaker(["旅行"], "幽默型", "小林"))
+
+
+def test_client_stream_disconnect_with_split_bytes(mock_server, make_client):
+    mock_server.stream_disconnect_after = 3
+    mock_server.stream_split_bytes = 2
+    text = "".join(make_client().generate_icebreaker_stream(["旅行"], "幽默型", "小林"))
+    assert text.endswith("（生成中断）")
+    assert len(text) > len("（生成中断）")
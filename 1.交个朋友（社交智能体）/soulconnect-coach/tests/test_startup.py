@@ -0,0 +1,56 @@
+import json
+import subprocess
+import sys
+
+import pytest
+
+import startup_budget
+from startup_budget import APP_PROBE, BASELINE_PROBE, by_package, parse_importtime, run_probe
+
+IMPORTTIME = """\
+import time: self [us] | cumulative | imported package
+import time:       120 |        120 |   _io
+import time:       300 |        900 | json
+import time:       400 |        400 |   json.decoder
+import time:      2000 |       5000 |     utils.emotion_analyzer
+"""
+
+# 冷启动时不应由应用自身导入的重依赖，只在真正用到时才导入
+DEFERRED = ("utils.glm_client", "aiohttp", "requests", "plotly", "pandas")
+
+
+def test_parse_importtime_skips_header_and_keeps_depth():
+    assert parse_importtime(IMPORTTIME + "其他输出\n") == [
+        ("_io", 1, 120, 120),
+        ("json", 0, 300, 900),
+        ("json.decoder", 1, 400, 400),
+        ("utils.emotion_analyzer", 2, 2000, 5000),
+    ]
+    assert by_package(parse_importtime(IMPORTTIME)) == pytest.approx({"_io": 0.12, "json": 0.7, "utils": 2.0})
+
+
+@pytest.fixture(scope="module")
+def app_only_modules():
+    app_modules = {name for name, _, _, _ in run_probe(APP_PROBE)[2]}
+    baseline_modules = {name for name, _, _, _ in run_probe(BASELINE_PROBE)[2]}
+    return app_modules - baseline_modules
+
+
+def test_cold_start_defers_heavy_imports(app_only_modules):
+    assert "utils.emotion_analyzer" in app_only_modules
+    # pandas、plotly 由 streamlit 自己导入，这里只检查应用没有额外带进来
+    eager = sorted(name for name in app_only_modules if name.split(".")[0] in DEFERRED or name in DEFERRED)
+    assert eager == []
+
+
+def test_budget_failure_exits_nonzero(tmp_path):
+    output = tmp_path / "startup.json"
+    completed = subprocess.run([sys.executable, startup_budget.__file__, "--runs", "1", "--budget-ms", "0",
+                                "--forbid", "utils.emotion_analyzer", "--output", str(output)],
+                               capture_output=True, text=True)
+
+    assert completed.returncode == 1
+    failures = json.loads(output.read_text(encoding="utf-8"))["failures"]
+    assert len(failures) == 2
+    assert "超出预算" in failures[0]
+    assert "utils.emotion_analyzer" in failures[1]
@@ -0,0 +1,51 @@
+from utils.batch_pipeline import BatchAnalyzer
+from utils.topic_index import TopicIndex, get_shared_topic_index
+
+PROFILE = {"nickname": "小林", "age": 26, "tags": ["摄影", "徒步", "咖啡"],
+           "bio": "周末喜欢背着相机去山里走走", "recent_moments": "刚从四姑娘山回来"}
+
+
+def test_reuse_rebinds_nickname_and_age():
+    index = TopicIndex()
+    index.add(PROFILE, {"analysis": "小林今年26岁，热爱户外", "topics": ["问问小林最近的徒步路线"],
+                        "conversation_styles": ["好奇型"]})
+
+    result, similarity = index.lookup(dict(PROFILE, nickname="阿杰", age=30))
+    assert similarity >= index.reuse_threshold
+    assert result["analysis"] == "阿杰今年30岁，热爱户外"
+    assert result["topics"] == ["问问阿杰最近的徒步路线"]
+
+    result, _ = index.lookup({key: value for key, value in PROFILE.items() if key not in ("nickname", "age")})
+    assert result["analysis"] == "TA今年，热爱户外"
+
+    # 同一个人再次查询时原样返回
+    result, _ = index.lookup(PROFILE)
+    assert result["analysis"] == "小林今年26岁，热爱户外"
+
+
+def test_complete_analysis_is_indexed_and_reused(make_client, mock_server):
+    client = make_client()
+    first = client.analyze_profile(PROFILE)
+    assert "reused" not in first
+    assert len(client.topic_index) == 1
+
+    second = client.analyze_profile(dict(PROFILE, nickname="阿杰"))
+    assert second["reused"]
+    assert mock_server.stats()["requests"] == 1
+
+
+def test_filled_defaults_are_not_indexed(make_client, mock_server):
+    mock_server.reply_for = lambda prompt: '{"analysis": "喜欢户外"}'
+    client = make_client()
+
+    result = client.analyze_profile(PROFILE)
+
+    assert result["analysis"] == "喜欢户外"
+    assert len(client.topic_index) == 0
+    client.analyze_profile(dict(PROFILE, nickname="阿杰"))
+    assert mock_server.stats()["requests"] == 2
+
+
+def test_batch_uses_private_index():
+    analyzer = BatchAnalyzer()
+    assert analyzer.client.topic_index is not get_shared_topic_index()
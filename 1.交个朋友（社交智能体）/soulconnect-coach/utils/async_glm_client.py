@@ -0,0 +1,227 @@
+import asyncio
+import functools
+from typing import Awaitable, Dict, Iterable, List, Optional, Tuple
+
+import aiohttp
+
+from .glm_client import BaseGLMClient
+from .metrics import Metrics
+from .prompt_builder import PromptBuilder
+from .resilience import CircuitBreaker, Deadline, RetryPolicy, get_circuit_breaker, parse_retry_after
+from .response_cache import ResponseCache
+from .scheduler import PRIORITY_INTERACTIVE, RequestScheduler, SchedulerTimeout, get_shared_scheduler
+from .topic_index import TopicIndex
+
+
+async def gather_bounded(tasks: Iterable[Awaitable], limit: int = 8) -> List:
+    """并发执行一批协程，同时进行的数量不超过limit，结果按输入顺序返回"""
+    semaphore = asyncio.Semaphore(limit)
+
+    async def run(task: Awaitable):
+        async with semaphore:
+            return await task
+
+    return await asyncio.gather(*(run(task) for task in tasks))
+
+
+class AsyncGLMClient(BaseGLMClient):
+    """异步GLM客户端，接口与GLMClient一致，便于批量并发请求
+
+    用法：
+        async with AsyncGLMClient() as client:
+            results = await client.analyze_profiles(profiles)
+
+    与同步客户端共用进程内的调度器和同一上游地址的熔断器，并发请求同样受限流额度约束；
+    调度器排队在事件循环里等待（acquire_async），SQLite缓存和向量索引会阻塞，放到线程池中执行。
+    """
+
+    def __init__(self, api_key: Optional[str] = None, base_url: Optional[str] = None,
+                 cache: Optional[ResponseCache] = None, max_connections: int = 20,
+                 connect_timeout: float = 5.0, read_timeout: float = 30.0,
+                 prompt_builder: Optional[PromptBuilder] = None,
+                 topic_index: Optional[TopicIndex] = None,
+                 retry_policy: Optional[RetryPolicy] = None,
+                 circuit_breaker: Optional[CircuitBreaker] = None,
+                 request_deadline: float = 30.0,
+                 scheduler: Optional[RequestScheduler] = None,
+                 priority: int = PRIORITY_INTERACTIVE,
+                 metrics: Optional[Metrics] = None):
+        super().__init__(api_key, base_url, cache, prompt_builder, topic_index, metrics=metrics)
+        self.max_connections = max_connections
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.timeout = aiohttp.ClientTimeout(sock_connect=connect_timeout, sock_read=read_timeout)
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.circuit_breaker = circuit_breaker or get_circuit_breaker(self.base_url)
+        self.request_deadline = request_deadline
+        self.scheduler = scheduler or get_shared_scheduler()
+        self.priority = priority
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        # 会话需在事件循环内创建，首次请求时再初始化
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_connections),
+                timeout=self.timeout
+            )
+        return self._session
+
+    async def close(self):
+        """关闭底层连接"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+    @staticmethod
+    async def _run_blocking(fn, *args, **kwargs):
+        """在默认线程池中执行会阻塞的调用"""
+        return await asyncio.get_running_loop().run_in_executor(None, functools.partial(fn, *args, **kwargs))
+
+    async def chat(self, messages: List[Dict], temperature: float = 0.7, model: str = "glm-4",
+                   cache_variants: Optional[int] = None) -> Dict:
+        """异步调用智谱GLM API，失败时尽量返回过期缓存"""
+        cached = await self._run_blocking(self.cache.get, model, temperature, messages, variants=cache_variants)
+        if cached is not None:
+            self.metrics.inc("soulconnect_glm_cache_hits_total")
+            return cached
+
+        data = {
+            "model": model,
+            "messages": messages,
+            "temperature": temperature
+        }
+
+        result, error = await self._post_with_retry(data, Deadline(self.request_deadline))
+        if error is not None:
+            if error.get("status") not in (None, *self.retry_policy.retry_statuses):
+                return error
+            stale = await self._run_blocking(self.cache.get, model, temperature, messages, allow_stale=True)
+            return stale if stale is not None else error
+
+        usage = result.get("usage") or {}
+        self.metrics.record_usage(usage, model)
+        await self._run_blocking(self.scheduler.record_usage, self._estimate_tokens(data),
+                                 usage.get("total_tokens", 0))
+        await self._run_blocking(self.cache.put, model, temperature, messages, result, variants=cache_variants)
+        return result
+
+    async def _post_with_retry(self, data: Dict, deadline: Deadline) -> Tuple[Optional[Dict], Optional[Dict]]:
+        """排队取得额度后发送请求，对429/5xx和网络错误按退避策略重试，与同步客户端的策略一致
+
+        返回 (响应JSON, None) 或 (None, 错误字典)。
+        """
+        attempt = 0
+        tokens = self._estimate_tokens(data)
+        while True:
+            if not self.circuit_breaker.allow_request():
+                return None, {"error": "服务暂时不可用，请稍后重试", "circuit_open": True}
+
+            try:
+                waited = await self.scheduler.acquire_async(tokens, self.priority, timeout=deadline.remaining())
+                self.metrics.record_span("queue", waited, priority=self.priority)
+            except SchedulerTimeout:
+                return None, {"error": "当前请求较多，排队超时，请稍后重试", "queue_timeout": True}
+
+            remaining = deadline.remaining()
+            if remaining <= 0:
+                await self._run_blocking(self.scheduler.refund, tokens)
+                return None, {"error": "API请求超时", "timeout": True}
+            timeout = aiohttp.ClientTimeout(total=remaining, sock_connect=min(self.connect_timeout, remaining),
+                                            sock_read=min(self.read_timeout, remaining))
+
+            retry_after = None
+            try:
+                async with self._get_session().post(self.base_url, headers=self._headers(), json=data,
+                                                    timeout=timeout) as response:
+                    if response.status < 400:
+                        self.circuit_breaker.record_success()
+                        try:
+                            return await response.json(content_type=None), None
+                        except ValueError as e:
+                            return None, {"error": f"API返回格式错误: {str(e)}"}
+                    error = {"error": f"API请求失败: HTTP {response.status}", "status": response.status}
+                    retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            except asyncio.TimeoutError:
+                error = {"error": "API请求超时", "timeout": True}
+            except aiohttp.ClientError as e:
+                error = {"error": f"API请求失败: {str(e) or type(e).__name__}"}
+            else:
+                if response.status == 429:
+                    await self._run_blocking(self.scheduler.pause, retry_after or self.retry_policy.base_delay)
+                if response.status not in self.retry_policy.retry_statuses:
+                    self.circuit_breaker.record_success()
+                    await self._run_blocking(self.scheduler.refund, tokens)
+                    return None, error
+
+            await self._run_blocking(self.scheduler.refund, tokens)
+            self.circuit_breaker.record_failure()
+            attempt += 1
+            if attempt >= self.retry_policy.max_attempts:
+                return None, error
+            delay = self.retry_policy.backoff(attempt, retry_after)
+            if delay >= deadline.remaining():
+                return None, error
+            self.metrics.inc("soulconnect_glm_retries_total")
+            await asyncio.sleep(delay)
+
+    async def analyze_profile(self, profile_data: Dict) -> Dict:
+        """分析用户资料，与已分析过的资料足够相似时直接复用，不再调用模型"""
+        reused, similar_topics = await self._run_blocking(self._similar_profile_analysis, profile_data)
+        if reused is not None:
+            return reused
+
+        response = await self.chat(self._profile_messages(profile_data, similar_topics), temperature=0.3)
+
+        if response.get("circuit_open"):
+            return self._degraded_profile(similar_topics)
+        if "error" in response:
+            return response
+
+        result, filled = self._parse_profile_content(self._extract_content(response))
+        if not filled:
+            await self._run_blocking(self.topic_index.add, profile_data, result)
+        return result
+
+    async def generate_icebreaker(self, topics: List[str], style: str, target_nickname: str) -> str:
+        """生成破冰开场白"""
+        messages = self._icebreaker_messages(topics, style, target_nickname)
+        response = await self.chat(messages, temperature=0.8)
+
+        if "error" in response:
+            return f"生成失败：{response['error']}"
+
+        return self._extract_content(response)
+
+    async def provide_conversation_advice(self, conversation_history: List[Dict]) -> Dict:
+        """提供对话建议"""
+        messages = self._advice_messages(conversation_history)
+        response = await self.chat(messages, temperature=0.5)
+
+        if response.get("circuit_open"):
+            return dict(self.parse_conversation_advice(""), degraded=True)
+        if "error" in response:
+            return response
+
+        return self.parse_conversation_advice(self._extract_content(response))
+
+    async def analyze_profiles(self, profiles: List[Dict], concurrency: int = 8) -> List[Dict]:
+        """并发分析多个用户资料"""
+        return await gather_bounded(
+            (self.analyze_profile(profile) for profile in profiles),
+            limit=concurrency
+        )
+
+    async def generate_icebreakers_for_styles(self, topics: List[str], styles: List[str],
+                                              target_nickname: str, concurrency: int = 8) -> Dict[str, str]:
+        """为每种聊天风格并发生成开场白，返回 {风格: 开场白}"""
+        results = await gather_bounded(
+            (self.generate_icebreaker(topics, style, target_nickname) for style in styles),
+            limit=concurrency
+        )
+        return dict(zip(styles, results))
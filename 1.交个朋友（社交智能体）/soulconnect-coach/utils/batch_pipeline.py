@@ -0,0 +1,155 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterator, Optional, Tuple
+
+from .glm_client import GLMClient
+from .scheduler import PRIORITY_BATCH
+from .topic_index import TopicIndex
+
+
+class RateLimiter:
+    """匀速限流：相邻两次请求的间隔不小于 1/rate 秒"""
+
+    def __init__(self, rate_per_sec: Optional[float]):
+        self.interval = 1.0 / rate_per_sec if rate_per_sec else 0.0
+        self._next_time = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            scheduled = max(self._next_time, now)
+            self._next_time = scheduled + self.interval
+        if scheduled > now:
+            time.sleep(scheduled - now)
+
+
+def iter_jsonl(f, start_offset: int = 0) -> Iterator[Tuple[int, Optional[Dict]]]:
+    """逐行读取JSONL（二进制模式打开），产出 (该行结束后的字节偏移, 解析结果)
+
+    解析失败的行产出 None，空行跳过。
+    """
+    f.seek(start_offset)
+    offset = start_offset
+    while True:
+        line = f.readline()
+        if not line:
+            return
+        offset += len(line)
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except (UnicodeDecodeError, json.JSONDecodeError):
+            record = None
+        yield offset, record if isinstance(record, dict) else None
+
+
+class BatchAnalyzer:
+    """批量用户资料分析
+
+    输入为 sample_profiles 格式的JSONL，结果按输入顺序增量写入JSONL。
+    同时在途的任务数不超过 window，内存占用与输入规模无关；
+    检查点记录已完成的输入偏移和输出文件大小，崩溃后可从断点继续。
+    """
+
+    def __init__(self, client: Optional[GLMClient] = None, workers: int = 4,
+                 rate_per_sec: Optional[float] = None, window: Optional[int] = None,
+                 checkpoint_every: int = 20):
+        # 批量任务走低优先级通道，排队时让出交互请求，因此时限放宽；
+        # 话题索引只在本批次内复用，不写入界面和接口共用的索引
+        self.client = client or GLMClient(priority=PRIORITY_BATCH, request_deadline=120.0,
+                                          topic_index=TopicIndex())
+        self.workers = workers
+        self.window = window or workers * 4
+        self.checkpoint_every = checkpoint_every
+        self.rate_limiter = RateLimiter(rate_per_sec)
+
+    def _analyze(self, profile: Optional[Dict]) -> Dict:
+        if profile is None:
+            return {"id": None, "error": "无效的JSON记录"}
+
+        self.rate_limiter.wait()
+        result = self.client.analyze_profile(profile)
+        if "error" in result:
+            return {"id": profile.get("id"), "error": result["error"]}
+        return {"id": profile.get("id"), "nickname": profile.get("nickname"), "result": result}
+
+    @staticmethod
+    def load_checkpoint(path: str) -> Dict:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return {"input_offset": 0, "output_size": 0, "processed": 0, "failed": 0}
+
+    @staticmethod
+    def save_checkpoint(path: str, state: Dict):
+        # 先写临时文件再替换，避免崩溃时留下半个检查点
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, path)
+
+    def run(self, input_path: str, output_path: str, checkpoint_path: Optional[str] = None,
+            resume: bool = True, on_progress: Optional[Callable[[Dict], None]] = None) -> Dict:
+        """执行批量分析，返回统计信息"""
+        checkpoint_path = checkpoint_path or f"{output_path}.ckpt"
+        state = None
+        if resume and os.path.exists(checkpoint_path):
+            state = self.load_checkpoint(checkpoint_path)
+            # 输出文件缺失或比检查点记录的短时，之前的结果已经丢失，检查点作废，从头处理
+            if state["output_size"] and (not os.path.exists(output_path)
+                                         or os.path.getsize(output_path) < state["output_size"]):
+                state = None
+        if state is None:
+            state = {"input_offset": 0, "output_size": 0, "processed": 0, "failed": 0}
+
+        # 丢弃上次检查点之后写入的结果，这些记录会重新处理
+        mode = "r+b" if state["output_size"] else "w+b"
+        started = time.monotonic()
+
+        with open(input_path, "rb") as fin, open(output_path, mode) as fout, \
+                ThreadPoolExecutor(max_workers=self.workers) as executor:
+            fout.truncate(state["output_size"])
+            fout.seek(state["output_size"])
+            pending = deque()
+            since_checkpoint = 0
+
+            def drain_one():
+                nonlocal since_checkpoint
+                offset, future = pending.popleft()
+                record = future.result()
+                fout.write((json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8"))
+                state["input_offset"] = offset
+                state["processed"] += 1
+                if "error" in record:
+                    state["failed"] += 1
+                since_checkpoint += 1
+                if since_checkpoint >= self.checkpoint_every:
+                    fout.flush()
+                    state["output_size"] = fout.tell()
+                    self.save_checkpoint(checkpoint_path, state)
+                    since_checkpoint = 0
+                    if on_progress:
+                        on_progress(dict(state))
+
+            for offset, profile in iter_jsonl(fin, state["input_offset"]):
+                pending.append((offset, executor.submit(self._analyze, profile)))
+                if len(pending) >= self.window:
+                    drain_one()
+
+            while pending:
+                drain_one()
+
+            fout.flush()
+            state["output_size"] = fout.tell()
+            self.save_checkpoint(checkpoint_path, state)
+
+        return dict(state, elapsed=round(time.monotonic() - started, 2))
@@ -0,0 +1,147 @@
+import math
+import zlib
+from collections import deque
+from typing import Dict, List, Optional
+
+from .conversation_store import ConversationStore
+from .emotion_analyzer import EmotionAnalyzer
+
+TOPIC_DIMENSIONS = 64
+
+
+def _topic_vector(text: str) -> List[float]:
+    """字符二元组哈希成定长向量并归一化，用于粗略衡量话题变化"""
+    vector = [0.0] * TOPIC_DIMENSIONS
+    chars = [ch for ch in text if not ch.isspace()]
+    for first, second in zip(chars, chars[1:]):
+        vector[zlib.crc32((first + second).encode("utf-8")) % TOPIC_DIMENSIONS] += 1.0
+    norm = math.sqrt(sum(value * value for value in vector))
+    return [value / norm for value in vector] if norm else vector
+
+
+class ConversationState:
+    """增量维护的对话状态
+
+    每追加一条消息只更新计数器和滑动平均，耗时为O(1)；
+    只保留最近 max_recent 条消息用于构造提示词和界面展示，
+    会话内存不随练习时长增长。
+    指定 store 和 user_id 时消息同时写入持久化记录，创建时用最近的记录恢复状态
+    （提问数、平均长度等累计值只覆盖恢复的这部分消息）。
+    """
+
+    def __init__(self, analyzer: Optional[EmotionAnalyzer] = None, max_recent: int = 50,
+                 sentiment_alpha: float = 0.3, topic_alpha: float = 0.3, flow_window: int = 4,
+                 store: Optional[ConversationStore] = None, user_id: Optional[str] = None):
+        self.analyzer = analyzer or EmotionAnalyzer()
+        self.sentiment_alpha = sentiment_alpha
+        self.topic_alpha = topic_alpha
+        self.recent = deque(maxlen=max_recent)
+        self._question_flags = deque(maxlen=flow_window)
+        self._topic = [0.0] * TOPIC_DIMENSIONS
+
+        self.message_count = 0
+        self.question_count = 0
+        self.sentiment_average = 0.0
+        self.topic_drift = 0.0
+        self.length_totals: Dict[str, int] = {}
+        self.role_counts: Dict[str, int] = {}
+
+        self.store = store
+        self.user_id = user_id
+        if store is not None:
+            self._restore()
+
+    def _restore(self):
+        total = self.store.count(self.user_id)
+        recent = self.store.page(self.user_id, limit=self.recent.maxlen)
+        self.message_count = total - len(recent)
+        for message in recent:
+            self._track(message)
+
+    def __len__(self):
+        return self.message_count
+
+    def __iter__(self):
+        return iter(self.recent)
+
+    def append(self, message: Dict) -> Dict:
+        """追加一条消息并更新统计，返回带序号的消息；有持久化记录时序号由记录库分配"""
+        if self.store is not None:
+            message = dict(message, seq=self.store.append(self.user_id, message))
+        else:
+            message = dict(message, seq=self.message_count)
+        return self._track(message)
+
+    def _track(self, message: Dict) -> Dict:
+        content = message.get("content", "")
+        role = message.get("role", "user")
+
+        self.recent.append(message)
+        self.message_count += 1
+
+        is_question = '?' in content or '？' in content
+        self._question_flags.append(is_question)
+        self.question_count += is_question
+
+        self.length_totals[role] = self.length_totals.get(role, 0) + len(content)
+        self.role_counts[role] = self.role_counts.get(role, 0) + 1
+
+        # 情感极性取值 [-1, 1]，用指数滑动平均跟踪整体情绪
+        emotion = self.analyzer.analyze_text_emotion(content)
+        total = emotion["positive_indicators"] + emotion["negative_indicators"]
+        polarity = (emotion["positive_indicators"] - emotion["negative_indicators"]) / total if total else 0.0
+        self.sentiment_average += self.sentiment_alpha * (polarity - self.sentiment_average)
+
+        # 话题偏移 = 1 - 新消息与近期话题向量的余弦相似度
+        vector = _topic_vector(content)
+        topic_norm = math.sqrt(sum(value * value for value in self._topic))
+        if topic_norm and any(vector):
+            similarity = sum(a * b for a, b in zip(vector, self._topic)) / topic_norm
+            self.topic_drift = round(1.0 - similarity, 3)
+        self._topic = [
+            old + self.topic_alpha * (new - old) if topic_norm else new
+            for old, new in zip(self._topic, vector)
+        ]
+
+        return message
+
+    def recent_messages(self, count: Optional[int] = None) -> List[Dict]:
+        """最近的若干条消息，按时间顺序"""
+        messages = list(self.recent)
+        return messages if count is None else messages[-count:]
+
+    def average_length(self, role: str) -> float:
+        count = self.role_counts.get(role, 0)
+        return self.length_totals.get(role, 0) / count if count else 0.0
+
+    def flow_status(self) -> Dict:
+        """与 EmotionAnalyzer.analyze_conversation_flow 相同的判断（同时识别全角问号），只看最近几条消息"""
+        if self.message_count < 2:
+            return {"status": "刚刚开始", "suggestion": "继续当前话题"}
+
+        questions_count = sum(self._question_flags)
+        if questions_count == 0:
+            return {
+                "status": "话题可能停滞",
+                "suggestion": "尝试提问来延续对话"
+            }
+        elif questions_count >= 2:
+            return {
+                "status": "积极交流中",
+                "suggestion": "保持当前节奏"
+            }
+        else:
+            return {
+                "status": "正常交流",
+                "suggestion": "平衡提问和分享"
+            }
+
+    def summary(self) -> Dict:
+        """当前对话统计"""
+        return {
+            "message_count": self.message_count,
+            "question_count": self.question_count,
+            "sentiment_average": round(self.sentiment_average, 3),
+            "topic_drift": self.topic_drift,
+            "average_length": {role: round(self.average_length(role), 1) for role in self.role_counts}
+        }
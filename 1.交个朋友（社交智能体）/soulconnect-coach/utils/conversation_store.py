@@ -0,0 +1,167 @@
+import atexit
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+DEFAULT_DB_PATH = "soulconnect_data.db"
+
+
+class ConversationStore:
+    """持久化的对话记录（SQLite WAL，只追加）
+
+    消息按 (user_id, seq) 聚簇存放，按用户分页读取只需一次索引范围扫描；
+    写入先进缓冲区，攒够 batch_size 条时立即、否则由后台线程每 flush_interval 秒
+    在一个事务里批量提交。尚未写盘的消息对读取同样可见。
+    另有按用户存放的键值表，用于保存分析结果、练习进度等小块状态。
+    """
+
+    def __init__(self, path: str = DEFAULT_DB_PATH, batch_size: int = 20, flush_interval: float = 1.0):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS messages ("
+            "user_id TEXT NOT NULL, seq INTEGER NOT NULL, role TEXT NOT NULL, content TEXT NOT NULL, "
+            "extra TEXT NOT NULL, created_at REAL NOT NULL, PRIMARY KEY (user_id, seq)) WITHOUT ROWID"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS user_state ("
+            "user_id TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, updated_at REAL NOT NULL, "
+            "PRIMARY KEY (user_id, key)) WITHOUT ROWID"
+        )
+        self._conn.commit()
+        self._lock = threading.Lock()
+        self._pending: List[Tuple] = []
+        self._stats = {"appended": 0, "flushes": 0, "rows_written": 0}
+        self._closed = threading.Event()
+        threading.Thread(target=self._flush_periodically, daemon=True).start()
+
+    def _flush_periodically(self):
+        while not self._closed.wait(self.flush_interval):
+            self.flush()
+
+    @staticmethod
+    def _row(message: Dict, user_id: str, seq: int) -> Tuple:
+        extra = {key: value for key, value in message.items() if key not in ("role", "content", "seq")}
+        return (user_id, seq, message.get("role", "user"), message.get("content", ""),
+                json.dumps(extra, ensure_ascii=False), time.time())
+
+    @staticmethod
+    def _message(row: Tuple) -> Dict:
+        _, seq, role, content, extra, _ = row
+        return dict(json.loads(extra), role=role, content=content, seq=seq)
+
+    def append(self, user_id: str, message: Dict) -> int:
+        """追加一条消息，返回其序号
+
+        序号由记录库在锁内统一分配（该用户已有的最大序号+1），消息自带的 seq 被忽略：
+        同一用户在多个标签页同时练习时各会话的计数互不知晓，沿用会互相覆盖。
+        """
+        with self._lock:
+            seq = self._next_seq(user_id)
+            self._pending.append(self._row(message, user_id, seq))
+            self._stats["appended"] += 1
+            if len(self._pending) >= self.batch_size:
+                self._flush()
+        return seq
+
+    def _next_seq(self, user_id: str) -> int:
+        pending = [row[1] for row in self._pending if row[0] == user_id]
+        if pending:
+            return max(pending) + 1
+        row = self._conn.execute("SELECT MAX(seq) FROM messages WHERE user_id = ?", (user_id,)).fetchone()
+        return 0 if row[0] is None else row[0] + 1
+
+    def _flush(self):
+        if self._pending:
+            with self._conn:
+                self._conn.executemany("INSERT INTO messages VALUES (?, ?, ?, ?, ?, ?)", self._pending)
+            self._stats["flushes"] += 1
+            self._stats["rows_written"] += len(self._pending)
+            self._pending = []
+
+    def flush(self):
+        with self._lock:
+            if not self._closed.is_set():
+                self._flush()
+
+    def count(self, user_id: str) -> int:
+        with self._lock:
+            stored = self._conn.execute("SELECT COUNT(*) FROM messages WHERE user_id = ?", (user_id,)).fetchone()[0]
+            return stored + sum(1 for row in self._pending if row[0] == user_id)
+
+    def page(self, user_id: str, before_seq: Optional[int] = None, limit: int = 10) -> List[Dict]:
+        """seq 小于 before_seq 的最近 limit 条消息，按时间顺序；before_seq 为空时取最新的"""
+        upper = before_seq if before_seq is not None else 2 ** 62
+        with self._lock:
+            pending = [row for row in self._pending if row[0] == user_id and row[1] < upper]
+            rows = self._conn.execute(
+                "SELECT * FROM messages WHERE user_id = ? AND seq < ? ORDER BY seq DESC LIMIT ?",
+                (user_id, upper, limit)
+            ).fetchall()
+        merged = {row[1]: row for row in rows}
+        merged.update((row[1], row) for row in pending)
+        return [self._message(merged[seq]) for seq in sorted(merged)[-limit:]]
+
+    def iter_messages(self, user_id: str, batch_size: int = 500) -> Iterator[Dict]:
+        """按时间顺序逐批读取某用户的全部消息，内存中最多只有一批"""
+        self.flush()
+        last_seq = -1
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT * FROM messages WHERE user_id = ? AND seq > ? ORDER BY seq LIMIT ?",
+                    (user_id, last_seq, batch_size)
+                ).fetchall()
+            if not rows:
+                return
+            for row in rows:
+                yield self._message(row)
+            last_seq = rows[-1][1]
+
+    def get_state(self, user_id: str, key: str, default: Any = None) -> Any:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM user_state WHERE user_id = ? AND key = ?", (user_id, key)
+            ).fetchone()
+        return default if row is None else json.loads(row[0])
+
+    def set_state(self, user_id: str, key: str, value: Any):
+        """保存一项用户状态，立即写盘"""
+        with self._lock:
+            with self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO user_state VALUES (?, ?, ?, ?)",
+                    (user_id, key, json.dumps(value, ensure_ascii=False), time.time())
+                )
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return dict(self._stats, pending=len(self._pending))
+
+    def close(self):
+        with self._lock:
+            self._flush()
+            self._closed.set()
+            self._conn.close()
+
+
+_shared_store: Optional[ConversationStore] = None
+_shared_lock = threading.Lock()
+
+
+def get_shared_conversation_store() -> ConversationStore:
+    """进程内共享的对话记录库，路径可通过环境变量 SOULCONNECT_DB_PATH 指定"""
+    global _shared_store
+    with _shared_lock:
+        if _shared_store is None:
+            _shared_store = ConversationStore(os.getenv("SOULCONNECT_DB_PATH", DEFAULT_DB_PATH))
+            # 进程退出前写入缓冲区中剩余的消息
+            atexit.register(_shared_store.flush)
+        return _shared_store
@@ -1,70 +1,332 @@
-import re
-from typing import Dict, List
-
-class EmotionAnalyzer:
-    """简单的情感分析器（在实际项目中可以使用专业的NLP模型）"""
-    
-    def __init__(self):
-        self.positive_words = {
-            '开心', '高兴', '喜欢', '爱', '棒', '好', '优秀', '完美', '精彩',
-            '有趣', '厉害', '惊喜', '幸福', '满意', '赞成', '支持', '感谢'
-        }
-        self.negative_words = {
-            '讨厌', '烦', '生气', '愤怒', '失望', '伤心', '难过', '糟糕',
-            '差', '烂', '讨厌', '恨', '抱怨', '批评', '反对', '拒绝'
-        }
-    
-    def analyze_text_emotion(self, text: str) -> Dict:
-        """分析文本情感"""
-        text_lower = text.lower()
-        
-        positive_count = sum(1 for word in self.positive_words if word in text_lower)
-        negative_count = sum(1 for word in self.negative_words if word in text_lower)
-        
-        # 检测表情符号
-        emoji_positive = len(re.findall(r'[😀-😍👍❤️💕🌟🎉]', text))
-        emoji_negative = len(re.findall(r'[😠-😩👎💔😢]', text))
-        
-        total_positive = positive_count + emoji_positive
-        total_negative = negative_count + emoji_negative
-        
-        if total_positive > total_negative:
-            emotion = "positive"
-            score = min(1.0, total_positive / 10)
-        elif total_negative > total_positive:
-            emotion = "negative" 
-            score = min(1.0, total_negative / 10)
-        else:
-            emotion = "neutral"
-            score = 0.5
-        
-        return {
-            "emotion": emotion,
-            "score": round(score, 2),
-            "positive_indicators": total_positive,
-            "negative_indicators": total_negative
-        }
-    
-    def analyze_conversation_flow(self, conversation: List[Dict]) -> Dict:
-        """分析对话流程"""
-        if len(conversation) < 2:
-            return {"status": "刚刚开始", "suggestion": "继续当前话题"}
-        
-        recent_messages = conversation[-4:]
-        questions_count = sum(1 for msg in recent_messages if '?' in msg.get('content', ''))
-        
-        if questions_count == 0:
-            return {
-                "status": "话题可能停滞",
-                "suggestion": "尝试提问来延续对话"
-            }
-        elif questions_count >= 2:
-            return {
-                "status": "积极交流中", 
-                "suggestion": "保持当前节奏"
-            }
-        else:
-            return {
-                "status": "正常交流",
-                "suggestion": "平衡提问和分享"
+import os
+import re
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .sentiment_lexicon import InMemoryLexicon, MmapLexicon, segment
+from .text_matcher import REGEX_MAX_WORDS, longest_first_pattern
+
+# 表情符号规则只编译一次
+EMOJI_POSITIVE = re.compile(r'[😀-😍👍❤️💕🌟🎉]')
+EMOJI_NEGATIVE = re.compile(r'[😠-😩👎💔😢]')
+
+if TYPE_CHECKING:
+    import numpy as np
+
+DEFAULT_POSITIVE_WORDS = {
+    '开心', '高兴', '喜欢', '爱', '棒', '好', '优秀', '完美', '精彩',
+    '有趣', '厉害', '惊喜', '幸福', '满意', '赞成', '支持', '感谢', '不错'
+}
+DEFAULT_NEGATIVE_WORDS = {
+    '讨厌', '烦', '生气', '愤怒', '失望', '伤心', '难过', '糟糕',
+    '差', '烂', '讨厌', '恨', '抱怨', '批评', '反对', '拒绝'
+}
+
+# 否定词会翻转其后情感词的极性（双重否定相互抵消），程度词按倍数调整强度
+NEGATORS = {'不', '没', '没有', '别', '不是', '并不', '从不', '毫不', '绝不', '未'}
+# 含否定字但本身不表否定的词，分词时整词匹配，其中的否定字不再单独生效
+NON_NEGATING_WORDS = {
+    '不断', '不少', '不久', '不同', '不管', '不仅', '不然', '不禁', '不得不', '差不多',
+    '要不', '别人', '别的', '没事', '没关系', '未来', '未免'
+}
+# 转折词之前的情感按比例减弱，以转折后的内容为主
+ADVERSATIVES = {'但', '但是', '可是', '不过', '然而'}
+# 取2的幂，逐条分析的逐次缩放与批量分析的一次性缩放结果完全一致
+ADVERSATIVE_DISCOUNT = 0.5
+INTENSIFIERS = {
+    '很': 1.5, '非常': 1.8, '特别': 1.8, '十分': 1.8, '超': 1.8, '超级': 2.0,
+    '太': 1.6, '真': 1.3, '最': 2.0, '极其': 2.0, '比较': 1.2,
+    '有点': 0.6, '有些': 0.6, '稍微': 0.5, '略': 0.5,
+    # 弱否定：翻转极性并减弱强度
+    '不太': -0.5, '不怎么': -0.5, '不够': -0.6
+}
+NEGATION_FACTOR = -0.8
+MODIFIER_WINDOW = 3
+CLAUSE_BREAKS = set('，。！？；,.!?;~\n\x00')
+CLAUSE_BREAK_PATTERN = re.compile('[' + re.escape(''.join(sorted(CLAUSE_BREAKS))) + ']')
+CLAUSE_BREAK_CODES = sorted(map(ord, CLAUSE_BREAKS))
+# 批量分析时每次拼接分词的文本条数，限制临时数组和分词结果占用的内存
+BATCH_CHUNK = 2048
+
+
+def _round2(value: float) -> float:
+    """保留两位小数，与批量分析的 np.rint(x * 100) / 100 逐位一致"""
+    return round(value * 100) / 100
+
+
+def _classify(total_positive: float, total_negative: float) -> Tuple[str, float]:
+    """按正负面强度返回 (情感, 分数)"""
+    if total_positive > total_negative:
+        return "positive", _round2(min(1.0, total_positive / 10))
+    if total_negative > total_positive:
+        return "negative", _round2(min(1.0, total_negative / 10))
+    return "neutral", 0.5
+
+
+class EmotionAnalyzer:
+    """简单的情感分析器（在实际项目中可以使用专业的NLP模型）
+
+    情感词带权重，先对文本做最长匹配分词，再在窗口内应用否定词和程度词。
+    通过 lexicon_paths 或环境变量 SOULCONNECT_LEXICON（多个路径用系统路径分隔符隔开）
+    加载二进制大词表，文件在首次分析时才映射进内存。
+
+    没有大词表且词条总数不超过 REGEX_MAX_WORDS 时，所有词表合并成一个最长优先的正则，
+    分词在C层一次完成，逐条分析的开销接近改造前的逐词子串扫描（多出的是否定词和程度词的窗口处理）。
+    加载大词表后每条消息要在多个词表间逐位置做最长匹配，单条分析明显更慢，
+    但耗时与词表大小基本无关；大量文本请用 analyze_batch。
+    """
+
+    def __init__(self, positive_words: Optional[Iterable[str]] = None,
+                 negative_words: Optional[Iterable[str]] = None,
+                 lexicon_paths: Optional[List[str]] = None):
+        self.positive_words = set(positive_words if positive_words is not None else DEFAULT_POSITIVE_WORDS)
+        self.negative_words = set(negative_words if negative_words is not None else DEFAULT_NEGATIVE_WORDS)
+
+        if lexicon_paths is None:
+            lexicon_paths = [p for p in os.getenv('SOULCONNECT_LEXICON', '').split(os.pathsep) if p]
+
+        builtin = {word: 1.0 for word in self.positive_words}
+        builtin.update({word: -1.0 for word in self.negative_words})
+
+        # 词表在前者优先；修饰词、转折词和非否定词放在最后，用序号区分
+        self._lexicons = [MmapLexicon(path) for path in lexicon_paths]
+        self._lexicons.append(InMemoryLexicon(builtin))
+        self._neutral_source = len(self._lexicons)
+        self._lexicons.append(InMemoryLexicon({word: 0.0 for word in NON_NEGATING_WORDS}))
+        self._adversative_source = len(self._lexicons)
+        self._lexicons.append(InMemoryLexicon({word: ADVERSATIVE_DISCOUNT for word in ADVERSATIVES}))
+        self._negator_source = len(self._lexicons)
+        self._lexicons.append(InMemoryLexicon({word: -1.0 for word in NEGATORS}))
+        self._intensifier_source = len(self._lexicons)
+        self._lexicons.append(InMemoryLexicon(INTENSIFIERS))
+
+        # {词: (权重, 词表序号)}，同一个词以排在前面的词表为准，与 segment 的规则一致
+        self._word_table: Dict[str, Tuple[float, int]] = {}
+        self._word_pattern = None
+        if not lexicon_paths:
+            for source, lexicon in enumerate(self._lexicons):
+                for word, weight in lexicon.entries.items():
+                    self._word_table.setdefault(word, (weight, source))
+            if len(self._word_table) <= REGEX_MAX_WORDS:
+                self._word_pattern = longest_first_pattern(self._word_table)
+                # 批量分词用带分组的同一正则，词用编号查权重和词表序号数组
+                self._split_pattern = re.compile(f"({self._word_pattern.pattern})")
+                self._word_ids = {word: i for i, word in enumerate(self._word_table)}
+                self._word_weights = [weight for weight, _ in self._word_table.values()]
+                self._word_sources = [source for _, source in self._word_table.values()]
+
+    def _tokenize(self, text_lower: str) -> List[Tuple[int, int, float, int]]:
+        """最长匹配分词，返回 (起始, 结束, 权重, 词表序号)"""
+        if self._word_pattern is not None:
+            table = self._word_table
+            return [(m.start(), m.end()) + table[m.group()] for m in self._word_pattern.finditer(text_lower)]
+        return segment(text_lower, self._lexicons)
+
+    def _score_words(self, text_lower: str) -> Tuple[float, float]:
+        """返回 (正面强度, 负面强度)"""
+        return self._score_tokens(text_lower, self._tokenize(text_lower))
+
+    def _score_tokens(self, text_lower: str, tokens: Sequence[Tuple[int, int, float, int]]) -> Tuple[float, float]:
+        """按分词结果计算 (正面强度, 负面强度)，tokens 的位置相对于 text_lower"""
+        positive = negative = 0.0
+        negate = False
+        multiplier = 1.0
+        modifier_end = None
+
+        for start, end, weight, source in tokens:
+            # 修饰词只作用于窗口内、同一分句中的情感词
+            if modifier_end is not None and (
+                start - modifier_end > MODIFIER_WINDOW
+                or CLAUSE_BREAK_PATTERN.search(text_lower, modifier_end, start)
+            ):
+                negate, multiplier, modifier_end = False, 1.0, None
+
+            if source == self._neutral_source:
+                continue
+            if source == self._adversative_source:
+                positive *= weight
+                negative *= weight
+                negate, multiplier, modifier_end = False, 1.0, None
+                continue
+            if source == self._negator_source:
+                # 同一修饰窗口内的第二个否定词抵消第一个（如"没有不开心"）
+                negate = not negate
+                modifier_end = end
+                continue
+            if source == self._intensifier_source:
+                multiplier *= weight
+                modifier_end = end
+                continue
+
+            value = weight * multiplier * (NEGATION_FACTOR if negate else 1.0)
+            if value > 0:
+                positive += value
+            else:
+                negative -= value
+            negate, multiplier, modifier_end = False, 1.0, None
+
+        return positive, negative
+
+    def analyze_text_emotion(self, text: str) -> Dict:
+        """分析文本情感"""
+        text_lower = text.lower()
+
+        positive_score, negative_score = self._score_words(text_lower)
+
+        # 检测表情符号
+        emoji_positive = len(EMOJI_POSITIVE.findall(text))
+        emoji_negative = len(EMOJI_NEGATIVE.findall(text))
+
+        total_positive = _round2(positive_score + emoji_positive)
+        total_negative = _round2(negative_score + emoji_negative)
+        emotion, score = _classify(total_positive, total_negative)
+
+        return {
+            "emotion": emotion,
+            "score": score,
+            "positive_indicators": total_positive,
+            "negative_indicators": total_negative
+        }
+
+    def _token_arrays(self, joined_lower: str):
+        """对拼接文本分词，返回 (起始, 结束, 权重, 词表序号) 四个数组"""
+        import numpy as np
+
+        if self._word_pattern is not None:
+            # 带分组的 split 交替返回 [间隔, 词, 间隔, 词, ..., 间隔]，由各段长度得到词的位置
+            parts = self._split_pattern.split(joined_lower)
+            words = parts[1::2]
+            bounds = np.cumsum(np.fromiter(map(len, parts), dtype=np.int64, count=len(parts)))
+            ids = np.fromiter(map(self._word_ids.__getitem__, words), dtype=np.int64, count=len(words))
+            return (bounds[0:-1:2], bounds[1::2],
+                    np.asarray(self._word_weights)[ids], np.asarray(self._word_sources)[ids])
+
+        tokens = np.array(segment(joined_lower, self._lexicons), dtype=np.float64).reshape(-1, 4)
+        return (tokens[:, 0].astype(np.int64), tokens[:, 1].astype(np.int64),
+                tokens[:, 2], tokens[:, 3].astype(np.int64))
+
+    def _score_batch(self, texts: List[str]) -> Tuple["np.ndarray", "np.ndarray"]:
+        """拼接后一次分词，再用数组运算完成否定、程度词和转折的计分，返回 (正面强度, 负面强度)
+
+        拼接用的分隔符不属于任何词且是分句符，匹配和修饰词窗口都不会跨越文本边界。
+        计分规则与 _score_tokens 相同：情感词受紧邻其前、彼此相连的一串修饰词作用，
+        否定词个数为奇数时翻转，程度词按出现顺序相乘；其后同一文本中每个转折词再乘一次折扣。
+        """
+        import numpy as np
+
+        n = len(texts)
+        lowered = [text.lower() for text in texts]
+        joined_lower = "\x00".join(lowered)
+        # 小写化可能改变长度，分词位置按小写文本计算
+        text_starts = np.cumsum([0] + [len(text) + 1 for text in lowered[:-1]], dtype=np.int64)
+
+        starts, ends, weights, sources = self._token_arrays(joined_lower)
+        # 非否定词只用于阻止其中的否定字单独成词，不参与计分
+        keep = sources != self._neutral_source
+        starts, ends, weights, sources = starts[keep], ends[keep], weights[keep], sources[keep]
+        count = len(starts)
+        if not count:
+            return np.zeros(n), np.zeros(n)
+
+        text_ids = np.searchsorted(text_starts, starts, side="right") - 1
+        is_negator = sources == self._negator_source
+        is_intensifier = sources == self._intensifier_source
+        is_adversative = sources == self._adversative_source
+        is_sentiment = sources < self._neutral_source
+
+        # 前缀计数：两个位置之间是否隔着分句符
+        codes = np.frombuffer(joined_lower.encode("utf-32-le"), dtype="<u4")
+        breaks = np.concatenate(([0], np.cumsum(np.isin(codes, CLAUSE_BREAK_CODES))))
+        # 前一个词是修饰词、两者相距不超过窗口且不隔分句符时，修饰作用延续到当前词
+        continues = np.zeros(count, dtype=bool)
+        continues[1:] = ((is_negator | is_intensifier)[:-1]
+                         & (starts[1:] - ends[:-1] <= MODIFIER_WINDOW)
+                         & (breaks[starts[1:]] == breaks[ends[:-1]]))
+        # 每个词之前连续生效的修饰词个数
+        index = np.arange(count)
+        run = index - np.maximum.accumulate(np.where(continues, 0, index))
+
+        negators = np.concatenate(([0], np.cumsum(is_negator)))
+        negated = (negators[index] - negators[index - run]) % 2 == 1
+        factors = np.where(is_intensifier, weights, 1.0)
+        multiplier = np.ones(count)
+        # 从最早的修饰词乘起，与逐条分析的相乘顺序一致
+        for k in range(int(run.max()), 0, -1):
+            selected = np.flatnonzero(run >= k)
+            multiplier[selected] *= factors[selected - k]
+        values = weights * multiplier * np.where(negated, NEGATION_FACTOR, 1.0)
+
+        adversatives = np.concatenate(([0], np.cumsum(is_adversative)))
+        text_ends = np.searchsorted(text_ids, text_ids, side="right")
+        values *= ADVERSATIVE_DISCOUNT ** (adversatives[text_ends] - adversatives[index + 1])
+
+        positive_mask = is_sentiment & (values > 0)
+        negative_mask = is_sentiment & (values <= 0)
+        positive = np.bincount(text_ids[positive_mask], weights=values[positive_mask], minlength=n)
+        negative = np.bincount(text_ids[negative_mask], weights=-values[negative_mask], minlength=n)
+        return positive, negative
+
+    def analyze_batch(self, texts: List[str]) -> Dict[str, "np.ndarray"]:
+        """批量分析文本情感，结果与 analyze_text_emotion 逐条一致
+
+        返回NumPy数组：positive_indicators、negative_indicators、scores，
+        以及 emotions（1正面，-1负面，0中性）。
+        """
+        # 只有批量接口需要NumPy，逐条分析的调用方不必承担导入开销
+        import numpy as np
+
+        n = len(texts)
+        positive_scores = np.zeros(n)
+        negative_scores = np.zeros(n)
+        for begin in range(0, n, BATCH_CHUNK):
+            chunk = slice(begin, begin + BATCH_CHUNK)
+            positive_scores[chunk], negative_scores[chunk] = self._score_batch(texts[chunk])
+
+        # 表情符号在拼接后的原文上一次性统计：规则都是单字符类，由 split 各段长度得到每处匹配的位置
+        joined = "\x00".join(texts)
+        starts = np.cumsum([0] + [len(text) + 1 for text in texts[:-1]], dtype=np.int64)
+
+        def count_by_text(pattern) -> "np.ndarray":
+            parts = pattern.split(joined)
+            positions = np.cumsum(np.fromiter(map(len, parts[:-1]), dtype=np.int64, count=len(parts) - 1) + 1) - 1
+            return np.bincount(np.searchsorted(starts, positions, side="right") - 1, minlength=n)
+
+        positive = np.rint((positive_scores + count_by_text(EMOJI_POSITIVE)) * 100) / 100
+        negative = np.rint((negative_scores + count_by_text(EMOJI_NEGATIVE)) * 100) / 100
+        emotions = np.sign(positive - negative).astype(np.int8)
+        scores = np.where(emotions == 0, 0.5,
+                          np.rint(np.minimum(1.0, np.maximum(positive, negative) / 10) * 100) / 100)
+
+        return {
+            "positive_indicators": positive,
+            "negative_indicators": negative,
+            "scores": scores,
+            "emotions": emotions
+        }
+
+    def analyze_conversation_flow(self, conversation: List[Dict]) -> Dict:
+        """分析对话流程"""
+        # ConversationState 已增量维护提问计数，无需重新扫描
+        if hasattr(conversation, "flow_status"):
+            return conversation.flow_status()
+
+        if len(conversation) < 2:
+            return {"status": "刚刚开始", "suggestion": "继续当前话题"}
+
+        recent_messages = conversation[-4:]
+        questions_count = sum(1 for msg in recent_messages if '?' in msg.get('content', ''))
+
+        if questions_count == 0:
+            return {
+                "status": "话题可能停滞",
+                "suggestion": "尝试提问来延续对话"
+            }
+        elif questions_count >= 2:
+            return {
+                "status": "积极交流中",
+                "suggestion": "保持当前节奏"
+            }
+        else:
+            return {
+                "status": "正常交流",
+                "suggestion": "平衡提问和分享"
             }
\ No newline at end of file
@@ -1,128 +1,545 @@
-import requests
-import json
-import os
-from typing import Dict, List, Optional
-
-class GLMClient:
-    def __init__(self, api_key: Optional[str] = None):
-        self.api_key = api_key or os.getenv('ZHIPU_API_KEY')
-        self.base_url = "https://open.bigmodel.cn/api/paas/v4/chat/completions"
-        
-    def chat(self, messages: List[Dict], temperature: float = 0.7, model: str = "glm-4") -> Dict:
-        """调用智谱GLM API"""
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json"
-        }
-        
-        data = {
-            "model": model,
-            "messages": messages,
-            "temperature": temperature
-        }
-        
-        try:
-            response = requests.post(self.base_url, headers=headers, json=data, timeout=30)
-            response.raise_for_status()
-            return response.json()
-        except requests.exceptions.RequestException as e:
-            return {"error": f"API请求失败: {str(e)}"}
-    
-    def analyze_profile(self, profile_data: Dict) -> Dict:
-        """分析用户资料"""
-        prompt = f"""
-        你是一个专业的社交破冰教练。请分析以下用户资料，提取3-5个高质量的聊天切入点。
-        
-        用户资料：
-        - 昵称：{profile_data.get('nickname', '未知')}
-        - 年龄：{profile_data.get('age', '未知')}
-        - 标签：{', '.join(profile_data.get('tags', []))}
-        - 个人简介：{profile_data.get('bio', '无')}
-        - 最近动态：{profile_data.get('recent_moments', '无')}
-        
-        请返回JSON格式：
-        {{
-            "analysis": "对用户的整体分析",
-            "topics": ["话题1", "话题2", "话题3", "话题4", "话题5"],
-            "conversation_styles": ["适合的聊天风格1", "风格2"]
-        }}
-        """
-        
-        messages = [{"role": "user", "content": prompt}]
-        response = self.chat(messages, temperature=0.3)
-        
-        if "error" in response:
-            return response
-        
-        try:
-            content = response["choices"][0]["message"]["content"]
-            return json.loads(content)
-        except (KeyError, json.JSONDecodeError):
-            # 如果返回的不是标准JSON，尝试解析
-            return {
-                "analysis": "分析完成",
-                "topics": ["兴趣标签", "最近动态", "个人简介"],
-                "conversation_styles": ["友好型", "好奇型"]
-            }
-    
-    def generate_icebreaker(self, topics: List[str], style: str, target_nickname: str) -> str:
-        """生成破冰开场白"""
-        prompt = f"""
-        为用户"{target_nickname}"生成一个自然、友好的破冰开场白。
-        
-        可用话题：{', '.join(topics)}
-        聊天风格：{style}
-        
-        要求：
-        1. 不超过2句话
-        2. 要自然不生硬
-        3. 要引发对方回复欲望
-        4. 体现{style}风格特点
-        
-        直接返回开场白内容，不要额外说明。
-        """
-        
-        messages = [{"role": "user", "content": prompt}]
-        response = self.chat(messages, temperature=0.8)
-        
-        if "error" in response:
-            return f"生成失败：{response['error']}"
-        
-        return response["choices"][0]["message"]["content"]
-    
-    def provide_conversation_advice(self, conversation_history: List[Dict]) -> Dict:
-        """提供对话建议"""
-        history_text = "\n".join([
-            f"{msg['role']}: {msg['content']}" for msg in conversation_history[-6:]  # 最近6条消息
-        ])
-        
-        prompt = f"""
-        分析以下对话，并提供改进建议：
-        
-        {history_text}
-        
-        请返回JSON格式：
-        {{
-            "emotion_analysis": "对当前对话情绪的分析",
-            "suggested_topics": ["建议延伸的话题1", "话题2"],
-            "improvement_suggestions": ["改进建议1", "建议2"],
-            "response_suggestion": "具体的下一句回复建议"
-        }}
-        """
-        
-        messages = [{"role": "user", "content": prompt}]
-        response = self.chat(messages, temperature=0.5)
-        
-        if "error" in response:
-            return response
-        
-        try:
-            content = response["choices"][0]["message"]["content"]
-            return json.loads(content)
-        except (KeyError, json.JSONDecodeError):
-            return {
-                "emotion_analysis": "对话情绪积极",
-                "suggested_topics": ["继续当前话题", "询问更多细节"],
-                "improvement_suggestions": ["保持友好态度"],
-                "response_suggestion": "听起来很有趣，能多告诉我一些吗？"
-            }
\ No newline at end of file
+import requests
+import json
+import os
+import time
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .conversation_state import ConversationState
+from .http_transport import PooledTransport, get_shared_transport
+from .json_extractor import Schema, extract_json, validate_and_fill
+from .metrics import Metrics, get_shared_metrics
+from .prompt_builder import PromptBuilder, estimate_tokens
+from .resilience import CircuitBreaker, Deadline, RetryPolicy, get_circuit_breaker, parse_retry_after
+from .response_cache import ResponseCache, get_shared_cache, make_cache_key
+from .scheduler import PRIORITY_INTERACTIVE, RequestScheduler, SchedulerTimeout, get_shared_scheduler
+from .single_flight import SingleFlight, SingleFlightTimeout, get_shared_single_flight
+from .topic_index import TopicIndex, get_shared_topic_index
+
+DEFAULT_BASE_URL = "https://open.bigmodel.cn/api/paas/v4/chat/completions"
+
+# 排队时预估的回复长度，请求结束后按接口返回的实际用量校正
+EXPECTED_COMPLETION_TOKENS = 400
+
+# 对话建议提示词的组装次数、历史部分的token数，以及用到摘要的次数（按是否重新生成区分）
+PROMPT_BUILDS_METRIC = "soulconnect_prompt_builds_total"
+HISTORY_TOKENS_METRIC = "soulconnect_prompt_history_tokens_total"
+SUMMARY_METRIC = "soulconnect_prompt_summaries_total"
+
+# 结构化结果的字段、类型和兜底值，解析失败的字段才使用兜底值
+PROFILE_ANALYSIS_SCHEMA: Schema = {
+    "analysis": (str, "分析完成"),
+    "topics": (list, ["兴趣标签", "最近动态", "个人简介"]),
+    "conversation_styles": (list, ["友好型", "好奇型"])
+}
+CONVERSATION_ADVICE_SCHEMA: Schema = {
+    "emotion_analysis": (str, "对话情绪积极"),
+    "suggested_topics": (list, ["继续当前话题", "询问更多细节"]),
+    "improvement_suggestions": (list, ["保持友好态度"]),
+    "response_suggestion": (str, "听起来很有趣，能多告诉我一些吗？")
+}
+
+
+class GLMStreamError(Exception):
+    """流式响应失败或中途断开"""
+
+
+# 流式输出中途断开时追加在已显示文本后的提示
+INTERRUPTED_SUFFIX = "（生成中断）"
+
+
+def _parse_sse_event(payload: str, usage: Optional[Dict]) -> Optional[str]:
+    """解析一个事件的 data，返回其中的增量文本；格式不对的事件忽略"""
+    try:
+        event = json.loads(payload)
+        if usage is not None and event.get("usage"):
+            usage.update(event["usage"])
+        return event["choices"][0].get("delta", {}).get("content")
+    except (KeyError, IndexError, AttributeError, json.JSONDecodeError):
+        return None
+
+
+def _finish_sse(data_lines: List[str], usage: Optional[Dict]) -> Iterator[str]:
+    """结束标记前还有未以空行收尾的事件时，先把它产出"""
+    if data_lines:
+        delta = _parse_sse_event("\n".join(data_lines), usage)
+        if delta:
+            yield delta
+
+
+def iter_sse_deltas(chunks: Iterable[bytes], usage: Optional[Dict] = None) -> Iterator[str]:
+    """解析SSE字节流，逐段产出 choices[0].delta.content
+
+    按字节切分行，换行符不会出现在UTF-8多字节序列中间，
+    因此被网络分块截断的中文字符会在拼成完整行后再解码。
+    传入 usage 字典时，用事件中携带的 usage 字段（通常在最后一个事件里）更新它。
+    读到 data: [DONE] 即结束，不要求其后还有空行或换行。
+    """
+    buffer = b""
+    data_lines: List[str] = []
+
+    for chunk in chunks:
+        if not chunk:
+            continue
+        buffer += chunk
+        while b"\n" in buffer:
+            raw_line, buffer = buffer.split(b"\n", 1)
+            line = raw_line.rstrip(b"\r").decode("utf-8")
+
+            if line.startswith("data:"):
+                data = line[5:].lstrip(" ")
+                if data == "[DONE]":
+                    yield from _finish_sse(data_lines, usage)
+                    return
+                data_lines.append(data)
+                continue
+            if line:
+                # 注释以及 event、id 等其他字段
+                continue
+
+            # 空行表示一个事件结束
+            if not data_lines:
+                continue
+            delta = _parse_sse_event("\n".join(data_lines), usage)
+            data_lines = []
+            if delta:
+                yield delta
+
+    # 最后一行没有换行符时仍可能是结束标记
+    line = buffer.rstrip(b"\r").decode("utf-8", errors="replace")
+    if line.startswith("data:") and line[5:].lstrip(" ") == "[DONE]":
+        yield from _finish_sse(data_lines, usage)
+        return
+    raise GLMStreamError("流式响应未正常结束")
+
+
+class BaseGLMClient:
+    """GLM客户端公共部分：配置、提示词构造与结果解析，同步与异步客户端共用"""
+
+    def __init__(self, api_key: Optional[str] = None, base_url: Optional[str] = None,
+                 cache: Optional[ResponseCache] = None,
+                 prompt_builder: Optional[PromptBuilder] = None,
+                 topic_index: Optional[TopicIndex] = None,
+                 metrics: Optional[Metrics] = None):
+        self.api_key = api_key or os.getenv('ZHIPU_API_KEY')
+        self.base_url = base_url or os.getenv('ZHIPU_BASE_URL', DEFAULT_BASE_URL)
+        # 确定性（低温）调用的响应缓存，命中时不再请求网络
+        self.cache = cache if cache is not None else get_shared_cache()
+        # 按token预算组装对话历史，较早的消息并入摘要
+        self.prompt_builder = prompt_builder or PromptBuilder()
+        # 已分析资料的向量索引，相似资料直接复用或参考其话题
+        self.topic_index = topic_index if topic_index is not None else get_shared_topic_index()
+        # 各阶段耗时与token用量
+        self.metrics = metrics or get_shared_metrics()
+
+    @staticmethod
+    def _estimate_tokens(data: Dict) -> int:
+        return sum(estimate_tokens(msg["content"]) for msg in data["messages"]) + EXPECTED_COMPLETION_TOKENS
+
+    def _headers(self) -> Dict:
+        return {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        }
+
+    def _extract_content(self, response: Dict) -> str:
+        try:
+            return response["choices"][0]["message"]["content"]
+        except (KeyError, IndexError):
+            return ""
+
+    def _profile_messages(self, profile_data: Dict, similar_topics: Optional[List[str]] = None) -> List[Dict]:
+        reference = f"\n        相似用户的聊天切入点（可参考，但要贴合本用户）：{', '.join(similar_topics)}\n" if similar_topics else ""
+        prompt = f"""
+        你是一个专业的社交破冰教练。请分析以下用户资料，提取3-5个高质量的聊天切入点。
+
+        用户资料：
+        - 昵称：{profile_data.get('nickname', '未知')}
+        - 年龄：{profile_data.get('age', '未知')}
+        - 标签：{', '.join(profile_data.get('tags', []))}
+        - 个人简介：{profile_data.get('bio', '无')}
+        - 最近动态：{profile_data.get('recent_moments', '无')}
+        {reference}
+        请返回JSON格式：
+        {{
+            "analysis": "对用户的整体分析",
+            "topics": ["话题1", "话题2", "话题3", "话题4", "话题5"],
+            "conversation_styles": ["适合的聊天风格1", "风格2"]
+        }}
+        """
+        return [{"role": "user", "content": prompt}]
+
+    def _similar_profile_analysis(self, profile_data: Dict):
+        """在话题索引中查找相似资料，返回 (可直接复用的结果, 可参考的话题)"""
+        match, similarity = self.topic_index.lookup(profile_data)
+        if match is None:
+            return None, None
+        if similarity >= self.topic_index.reuse_threshold:
+            return dict(match, reused=True, similarity=round(similarity, 3)), None
+        return None, match["topics"]
+
+    def _degraded_profile(self, similar_topics: Optional[List[str]]) -> Dict:
+        """熔断期间的兜底分析结果，有相似资料时用它的话题，界面仍可继续使用"""
+        result, _ = self._parse_profile_content("")
+        if similar_topics:
+            result["topics"] = list(similar_topics)
+        return dict(result, degraded=True)
+
+    def _parse_profile_content(self, content: str) -> Tuple[Dict, List[str]]:
+        """返回 (结果, 用默认值填充的字段)；有填充的结果不加入话题索引，免得兜底内容被别人复用"""
+        # 容忍代码块包裹和多余说明，只为缺失的字段填默认值
+        with self.metrics.span("parse"):
+            return validate_and_fill(extract_json(content), PROFILE_ANALYSIS_SCHEMA)
+
+    def _icebreaker_messages(self, topics: List[str], style: str, target_nickname: str) -> List[Dict]:
+        prompt = f"""
+        为用户"{target_nickname}"生成一个自然、友好的破冰开场白。
+
+        可用话题：{', '.join(topics)}
+        聊天风格：{style}
+
+        要求：
+        1. 不超过2句话
+        2. 要自然不生硬
+        3. 要引发对方回复欲望
+        4. 体现{style}风格特点
+
+        直接返回开场白内容，不要额外说明。
+        """
+        return [{"role": "user", "content": prompt}]
+
+    def _advice_messages(self, conversation_history) -> List[Dict]:
+        conversation_id = None
+        if isinstance(conversation_history, ConversationState):
+            messages = conversation_history.recent_messages()
+            if conversation_history.store is not None:
+                conversation_id = conversation_history.user_id
+        else:
+            messages = list(conversation_history)
+        history_text, stats = self.prompt_builder.build_history(messages, conversation_id)
+
+        prompt = f"""
+        分析以下对话，并提供改进建议：
+
+        {history_text}
+
+        请返回JSON格式：
+        {{
+            "emotion_analysis": "对当前对话情绪的分析",
+            "suggested_topics": ["建议延伸的话题1", "话题2"],
+            "improvement_suggestions": ["改进建议1", "建议2"],
+            "response_suggestion": "具体的下一句回复建议"
+        }}
+        """
+        stats["prompt_tokens"] = estimate_tokens(prompt)
+        self._record_prompt_stats(stats)
+        return [{"role": "user", "content": prompt}]
+
+    def _record_prompt_stats(self, stats: Dict):
+        """把本次组装历史的统计记入指标，并附在当前阶段上"""
+        self.metrics.inc(PROMPT_BUILDS_METRIC)
+        self.metrics.inc(HISTORY_TOKENS_METRIC, stats["history_tokens"])
+        if stats["messages_summarized"]:
+            self.metrics.inc(SUMMARY_METRIC, regenerated=stats["summary_regenerated"])
+        span = self.metrics.current_span()
+        if span is not None:
+            span["attributes"].update(stats)
+
+    def _summary_messages(self, previous_summary: str, messages: List[Dict]) -> List[Dict]:
+        history_text = "\n".join(f"{msg['role']}: {msg['content']}" for msg in messages)
+        prompt = f"""
+        已有的对话摘要：{previous_summary or '无'}
+
+        新增对话：
+        {history_text}
+
+        请把新增对话并入摘要，保留话题、双方态度和关键信息，不超过80字，直接返回摘要。
+        """
+        return [{"role": "user", "content": prompt}]
+
+    def parse_conversation_advice(self, content: str) -> Dict:
+        """将模型返回的文本解析为对话建议"""
+        with self.metrics.span("parse"):
+            result, _ = validate_and_fill(extract_json(content), CONVERSATION_ADVICE_SCHEMA)
+        return result
+
+class GLMClient(BaseGLMClient):
+    def __init__(self, api_key: Optional[str] = None, base_url: Optional[str] = None,
+                 transport: Optional[PooledTransport] = None,
+                 cache: Optional[ResponseCache] = None,
+                 prompt_builder: Optional[PromptBuilder] = None,
+                 topic_index: Optional[TopicIndex] = None,
+                 retry_policy: Optional[RetryPolicy] = None,
+                 circuit_breaker: Optional[CircuitBreaker] = None,
+                 request_deadline: float = 30.0,
+                 scheduler: Optional[RequestScheduler] = None,
+                 priority: int = PRIORITY_INTERACTIVE,
+                 single_flight: Optional[SingleFlight] = None,
+                 metrics: Optional[Metrics] = None,
+                 model_summary: Optional[bool] = None):
+        super().__init__(api_key, base_url, cache, prompt_builder, topic_index, metrics=metrics)
+        # 对话超出预算时较早的消息交给模型摘要，默认取环境变量 SOULCONNECT_MODEL_SUMMARY
+        if model_summary is None:
+            model_summary = os.getenv("SOULCONNECT_MODEL_SUMMARY", "") not in ("", "0")
+        if model_summary:
+            self.prompt_builder.summarizer = self.summarize_history
+        # 默认使用进程内共享的连接池，复用到GLM服务端的长连接
+        self.transport = transport or get_shared_transport()
+        self.retry_policy = retry_policy or RetryPolicy()
+        # 同一上游地址的所有客户端共用熔断器，上游故障时快速失败
+        self.circuit_breaker = circuit_breaker or get_circuit_breaker(self.base_url)
+        self.request_deadline = request_deadline
+        # 所有会话共用调度器限流排队，批量任务可用 PRIORITY_BATCH 让出交互请求
+        self.scheduler = scheduler or get_shared_scheduler()
+        self.priority = priority
+        # 多个会话同时发出相同请求时只调用一次上游
+        self.single_flight = single_flight or get_shared_single_flight()
+
+    def chat(self, messages: List[Dict], temperature: float = 0.7, model: str = "glm-4",
+             stream: bool = False, cache_variants: Optional[int] = None,
+             deadline: Optional[float] = None, priority: Optional[int] = None):
+        """调用智谱GLM API
+
+        stream=True 时返回生成器，逐段产出增量文本；失败时抛出 GLMStreamError
+        cache_variants: 覆盖高温调用的缓存结果池大小，0表示不缓存
+        deadline: 本次调用的总时限（秒），包含排队和重试等待，默认为 request_deadline
+        priority: 排队优先级，默认为客户端的 priority
+        """
+        priority = self.priority if priority is None else priority
+        if stream:
+            return self._chat_stream(messages, temperature, model, priority)
+
+        cached = self.cache.get(model, temperature, messages, variants=cache_variants)
+        if cached is not None:
+            self.metrics.inc("soulconnect_glm_cache_hits_total")
+            return cached
+
+        deadline = deadline or self.request_deadline
+        if cache_variants == 0:
+            # 明确不缓存的调用每次都要新结果，也不合并
+            return self._fetch(messages, temperature, model, cache_variants, deadline, priority)
+
+        # 进行中的相同请求共用一次调用，排队优先级以先发起的调用为准，等待不超过本次调用的时限
+        try:
+            result, _ = self.single_flight.do(
+                make_cache_key(model, temperature, messages),
+                lambda: self._fetch(messages, temperature, model, cache_variants, deadline, priority),
+                timeout=deadline
+            )
+        except SingleFlightTimeout:
+            return {"error": "API请求超时", "timeout": True}
+        return result
+
+    def _fetch(self, messages: List[Dict], temperature: float, model: str,
+               cache_variants: Optional[int], deadline: float, priority: int) -> Dict:
+        """实际请求上游并写入缓存，失败时尽量返回过期缓存"""
+        data = {
+            "model": model,
+            "messages": messages,
+            "temperature": temperature
+        }
+
+        with self.metrics.span("llm", model=model, priority=priority) as span:
+            response, error = self._post_with_retry(data, Deadline(deadline), priority=priority)
+            if response is not None:
+                try:
+                    result = response.json()
+                except ValueError as e:
+                    error = {"error": f"API返回格式错误: {str(e)}"}
+                else:
+                    usage = result.get("usage") or {}
+                    self.metrics.record_usage(usage, model)
+                    self.scheduler.record_usage(self._estimate_tokens(data), usage.get("total_tokens", 0))
+                    self.cache.put(model, temperature, messages, result, variants=cache_variants)
+                    return result
+            span["attributes"]["error"] = error["error"]
+
+        if error.get("status") not in (None, *self.retry_policy.retry_statuses):
+            return error
+
+        # 上游不可用时优先返回过期缓存
+        stale = self.cache.get(model, temperature, messages, allow_stale=True)
+        return stale if stale is not None else error
+
+    def _post_with_retry(self, data: Dict, deadline: Deadline, stream: bool = False,
+                         priority: int = PRIORITY_INTERACTIVE):
+        """排队取得额度后发送请求，对429/5xx和网络错误按退避策略重试
+
+        返回 (response, None) 或 (None, 错误字典)。熔断器打开时直接失败，不等待超时。
+        """
+        attempt = 0
+        tokens = self._estimate_tokens(data)
+        while True:
+            if not self.circuit_breaker.allow_request():
+                return None, {"error": "服务暂时不可用，请稍后重试", "circuit_open": True}
+
+            try:
+                waited = self.scheduler.acquire(tokens, priority, timeout=deadline.remaining())
+                self.metrics.record_span("queue", waited, priority=priority)
+            except SchedulerTimeout:
+                return None, {"error": "当前请求较多，排队超时，请稍后重试", "queue_timeout": True}
+
+            remaining = deadline.remaining()
+            if remaining <= 0:
+                self.scheduler.refund(tokens)
+                return None, {"error": "API请求超时", "timeout": True}
+            timeout = (min(self.transport.connect_timeout, remaining), min(self.transport.read_timeout, remaining))
+
+            retry_after = None
+            try:
+                response = self.transport.post(self.base_url, headers=self._headers(), json=data,
+                                               timeout=timeout, stream=stream)
+            except requests.exceptions.RequestException as e:
+                error = {"error": f"API请求失败: {str(e)}"}
+                if isinstance(e, requests.exceptions.Timeout):
+                    error["timeout"] = True
+            else:
+                if response.status_code < 400:
+                    self.circuit_breaker.record_success()
+                    return response, None
+                error = {"error": f"API请求失败: HTTP {response.status_code}", "status": response.status_code}
+                retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                response.close()
+                if response.status_code == 429:
+                    # 额度已被上游判定用尽，让所有会话一起暂停放行
+                    self.scheduler.pause(retry_after or self.retry_policy.base_delay)
+                if response.status_code not in self.retry_policy.retry_statuses:
+                    # 4xx 是请求本身的问题，上游是健康的，不重试
+                    self.circuit_breaker.record_success()
+                    self.scheduler.refund(tokens)
+                    return None, error
+
+            # 失败的尝试没有产生用量，退还预扣的token额度，重试时重新排队扣除
+            self.scheduler.refund(tokens)
+            self.circuit_breaker.record_failure()
+            attempt += 1
+            if attempt >= self.retry_policy.max_attempts:
+                return None, error
+            delay = self.retry_policy.backoff(attempt, retry_after)
+            if delay >= deadline.remaining():
+                return None, error
+            self.metrics.inc("soulconnect_glm_retries_total")
+            time.sleep(delay)
+
+    def summarize_history(self, previous_summary: str, messages: List[Dict]) -> str:
+        """用模型把较早的对话并入摘要，可设为 prompt_builder.summarizer 代替本地摘要"""
+        response = self.chat(self._summary_messages(previous_summary, messages), temperature=0.2)
+
+        if "error" in response:
+            return self.prompt_builder.extractive_summary(previous_summary, messages)
+
+        return self._extract_content(response).strip()
+
+    def _chat_stream(self, messages: List[Dict], temperature: float, model: str,
+                     priority: int = PRIORITY_INTERACTIVE) -> Iterator[str]:
+        """以 stream=true 调用API，边接收边产出增量文本"""
+        data = {
+            "model": model,
+            "messages": messages,
+            "temperature": temperature,
+            "stream": True
+        }
+
+        # 只在收到首字节前重试，开始输出后中断直接报错
+        response, error = self._post_with_retry(data, Deadline(self.request_deadline), stream=True, priority=priority)
+        if response is None:
+            raise GLMStreamError(error["error"])
+
+        usage: Dict = {}
+        begin = time.perf_counter()
+        first_token = None
+        try:
+            for delta in iter_sse_deltas(response.iter_content(chunk_size=None), usage):
+                if first_token is None:
+                    first_token = time.perf_counter() - begin
+                    self.metrics.record_span("first_token", first_token, model=model)
+                yield delta
+        except requests.exceptions.RequestException as e:
+            raise GLMStreamError(f"流式响应中断: {str(e)}") from e
+        finally:
+            response.close()
+            # 响应头之后到接收结束（或调用方提前停止）的耗时
+            self.metrics.record_span("stream_body", time.perf_counter() - begin, model=model)
+            self.metrics.record_usage(usage, model)
+            # 按实际用量校正排队时预扣的额度；未收到 usage（提前中断）时保留预估值
+            self.scheduler.record_usage(self._estimate_tokens(data), usage.get("total_tokens", 0))
+
+    def analyze_profile(self, profile_data: Dict) -> Dict:
+        """分析用户资料，与已分析过的资料足够相似时直接复用，不再调用模型"""
+        reused, similar_topics = self._similar_profile_analysis(profile_data)
+        if reused is not None:
+            return reused
+
+        response = self.chat(self._profile_messages(profile_data, similar_topics), temperature=0.3)
+
+        if response.get("circuit_open"):
+            return self._degraded_profile(similar_topics)
+        if "error" in response:
+            return response
+
+        result, filled = self._parse_profile_content(self._extract_content(response))
+        if not filled:
+            self.topic_index.add(profile_data, result)
+        return result
+
+    def generate_icebreaker_result(self, topics: List[str], style: str, target_nickname: str) -> Dict:
+        """生成破冰开场白，返回 {"icebreaker": 开场白} 或带超时、熔断等标记的错误字典"""
+        messages = self._icebreaker_messages(topics, style, target_nickname)
+        response = self.chat(messages, temperature=0.8)
+
+        if "error" in response:
+            return response
+
+        return {"icebreaker": response["choices"][0]["message"]["content"]}
+
+    def generate_icebreaker(self, topics: List[str], style: str, target_nickname: str) -> str:
+        """生成破冰开场白"""
+        result = self.generate_icebreaker_result(topics, style, target_nickname)
+
+        if "error" in result:
+            return f"生成失败：{result['error']}"
+
+        return result["icebreaker"]
+
+    def stream_icebreaker(self, topics: List[str], style: str, target_nickname: str,
+                          priority: Optional[int] = None) -> Iterator[str]:
+        """流式生成破冰开场白，逐段产出文本；后台预取可传入 PRIORITY_BATCH
+
+        失败时抛出 GLMStreamError
+        """
+        messages = self._icebreaker_messages(topics, style, target_nickname)
+        yield from self.chat(messages, temperature=0.8, stream=True, priority=priority)
+
+    def generate_icebreaker_stream(self, topics: List[str], style: str, target_nickname: str,
+                                   priority: Optional[int] = None) -> Iterator[str]:
+        """流式生成破冰开场白，失败时把错误提示作为文本产出，便于界面直接显示"""
+        stream = self.stream_icebreaker(topics, style, target_nickname, priority=priority)
+        started = False
+        try:
+            for delta in stream:
+                started = True
+                yield delta
+        except GLMStreamError as e:
+            yield INTERRUPTED_SUFFIX if started else f"生成失败：{e}"
+        finally:
+            stream.close()
+
+    def provide_conversation_advice(self, conversation_history: List[Dict]) -> Dict:
+        """提供对话建议"""
+        messages = self._advice_messages(conversation_history)
+        response = self.chat(messages, temperature=0.5)
+
+        if response.get("circuit_open"):
+            return dict(self.parse_conversation_advice(""), degraded=True)
+        if "error" in response:
+            return response
+
+        return self.parse_conversation_advice(self._extract_content(response))
+
+    def stream_conversation_advice(self, conversation_history: List[Dict]) -> Iterator[str]:
+        """流式获取对话建议的原始文本，可边接收边用 JSONStreamExtractor 提取结果，
+        结束后用 parse_conversation_advice 解析
+
+        失败时抛出 GLMStreamError
+        """
+        messages = self._advice_messages(conversation_history)
+        yield from self.chat(messages, temperature=0.5, stream=True)
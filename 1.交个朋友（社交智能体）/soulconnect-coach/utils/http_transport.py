@@ -0,0 +1,132 @@
+import threading
+import time
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .metrics import Metrics, get_shared_metrics
+
+
+class PooledTransport:
+    """带连接池的HTTP传输层：按主机保持长连接，避免每次请求重新进行TCP/TLS握手
+
+    每次请求把到达响应头的耗时记为 ttfb 阶段；新建连接的请求另记为 connect_ttfb，
+    两者之差即DNS解析和TCP/TLS握手的开销。非流式请求读完响应体的耗时记为 body 阶段。
+    """
+
+    def __init__(self, pool_connections: int = 10, pool_maxsize: int = 20,
+                 connect_timeout: float = 5.0, read_timeout: float = 30.0,
+                 metrics: Optional[Metrics] = None):
+        """
+        pool_connections: 最多缓存多少个主机的连接池
+        pool_maxsize: 每个主机最多保留多少条空闲长连接
+        """
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.metrics = metrics or get_shared_metrics()
+
+        self._adapter = HTTPAdapter(
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            pool_block=False
+        )
+        self._session = requests.Session()
+        self._session.mount("https://", self._adapter)
+        self._session.mount("http://", self._adapter)
+        self._session.headers["Connection"] = "keep-alive"
+
+        self._lock = threading.Lock()
+        self._pools = {}
+        self._requests_by_host: Dict[str, int] = {}
+        # 每个地址的代理和证书设置（来自环境变量），查找连接池时与实际发送请求保持一致
+        self._settings: Dict[str, Dict] = {}
+
+    def post(self, url: str, headers: Optional[Dict] = None, json: Optional[Dict] = None,
+             timeout: Optional[tuple] = None, stream: bool = False) -> requests.Response:
+        """发送POST请求，timeout为 (连接超时, 读取超时)"""
+        pool = self._track(url)
+        connections = pool.num_connections
+        begin = time.perf_counter()
+        response = self._session.post(
+            url,
+            headers=headers,
+            json=json,
+            timeout=timeout or (self.connect_timeout, self.read_timeout),
+            stream=stream
+        )
+        # 并发请求时新建连接可能记到别的请求上，只影响两类首字节耗时的划分
+        ttfb = response.elapsed.total_seconds()
+        self.metrics.record_span("connect_ttfb" if pool.num_connections > connections else "ttfb", ttfb,
+                                 status=response.status_code)
+        if not stream:
+            self.metrics.record_span("body", max(0.0, time.perf_counter() - begin - ttfb),
+                                     bytes=len(response.content))
+        return response
+
+    def _connection_pool(self, url: str):
+        """取出适配器发送该请求时会用的连接池
+
+        requests 2.32 起连接池的键包含TLS设置，须通过适配器自己的查找方法取得，
+        直接按URL向 poolmanager 查找会得到另一个永远不被使用的连接池。
+        """
+        settings = self._settings.get(url)
+        if settings is None:
+            settings = self._settings[url] = self._session.merge_environment_settings(url, {}, None, None, None)
+        if hasattr(self._adapter, "get_connection_with_tls_context"):
+            request = requests.Request("POST", url).prepare()
+            return self._adapter.get_connection_with_tls_context(
+                request, settings["verify"], settings["proxies"], settings["cert"]
+            )
+        return self._adapter.get_connection(url, settings["proxies"])
+
+    def _track(self, url: str):
+        """记录请求所用的连接池，用于统计握手次数"""
+        host = urlsplit(url).netloc
+        pool = self._connection_pool(url)
+        with self._lock:
+            self._pools[id(pool)] = (host, pool)
+            self._requests_by_host[host] = self._requests_by_host.get(host, 0) + 1
+        return pool
+
+    def stats(self) -> Dict:
+        """连接池统计：命中表示复用了空闲连接，未命中即新建连接（一次握手）"""
+        with self._lock:
+            handshakes_by_host: Dict[str, int] = {}
+            for host, pool in self._pools.values():
+                handshakes_by_host[host] = handshakes_by_host.get(host, 0) + pool.num_connections
+            requests_by_host = dict(self._requests_by_host)
+
+        total_requests = sum(requests_by_host.values())
+        handshakes = sum(handshakes_by_host.values())
+        return {
+            "requests": total_requests,
+            "pool_hits": max(0, total_requests - handshakes),
+            "pool_misses": handshakes,
+            "handshakes": handshakes,
+            "hosts": {
+                host: {
+                    "requests": count,
+                    "handshakes": handshakes_by_host.get(host, 0)
+                }
+                for host, count in requests_by_host.items()
+            }
+        }
+
+    def close(self):
+        """关闭所有连接"""
+        self._session.close()
+
+
+_shared_transport: Optional[PooledTransport] = None
+_shared_lock = threading.Lock()
+
+
+def get_shared_transport() -> PooledTransport:
+    """获取进程内共享的传输层，所有GLMClient实例共用同一个连接池"""
+    global _shared_transport
+    with _shared_lock:
+        if _shared_transport is None:
+            _shared_transport = PooledTransport()
+        return _shared_transport
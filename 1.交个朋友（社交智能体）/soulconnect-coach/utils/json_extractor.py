@@ -0,0 +1,140 @@
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+# 字段名 -> (类型, 缺失时的默认值)
+Schema = Dict[str, Tuple[type, Any]]
+
+TRAILING_COMMA = re.compile(r',\s*([}\]])')
+
+
+class JSONStreamExtractor:
+    """从模型输出中增量提取第一个完整的JSON对象
+
+    可以边接收token边调用 feed，对象的括号一闭合就立即解析返回，
+    前面的markdown代码块标记、后面的多余说明都会被忽略。
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.result: Optional[Dict] = None
+        self._reset_scan(0)
+
+    def _reset_scan(self, position: int):
+        self._pos = position
+        self._start = -1
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+
+    def feed(self, chunk: str) -> Optional[Dict]:
+        """追加一段文本，解析出完整对象时返回它，否则返回None"""
+        if self.result is not None:
+            return self.result
+        self.text += chunk
+
+        text = self.text
+        while self._pos < len(text):
+            ch = text[self._pos]
+            self._pos += 1
+
+            if self._start < 0:
+                if ch == "{":
+                    self._start = self._pos - 1
+                    self._depth = 1
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                continue
+
+            if ch == '"':
+                self._in_string = True
+            elif ch in "{[":
+                self._depth += 1
+            elif ch in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    candidate = _loads_lenient(text[self._start:self._pos])
+                    if isinstance(candidate, dict):
+                        self.result = candidate
+                        return candidate
+                    # 不是合法对象，从这个左括号之后继续找
+                    self._reset_scan(self._start + 1)
+        return None
+
+    def finish(self) -> Optional[Dict]:
+        """输入结束时调用：若对象未闭合，尝试补齐括号后解析"""
+        if self.result is not None or self._start < 0:
+            return self.result
+
+        fragment = self.text[self._start:]
+        if self._in_string:
+            fragment += '"'
+        closers = []
+        in_string = escape = False
+        for ch in fragment:
+            if in_string:
+                if escape:
+                    escape = False
+                elif ch == "\\":
+                    escape = True
+                elif ch == '"':
+                    in_string = False
+            elif ch == '"':
+                in_string = True
+            elif ch == "{":
+                closers.append("}")
+            elif ch == "[":
+                closers.append("]")
+            elif ch in "}]" and closers:
+                closers.pop()
+        candidate = _loads_lenient(fragment.rstrip().rstrip(",") + "".join(reversed(closers)))
+        if isinstance(candidate, dict):
+            self.result = candidate
+        return self.result
+
+
+def _loads_lenient(text: str) -> Any:
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        pass
+    # 常见问题：对象或数组末尾多一个逗号
+    try:
+        return json.loads(TRAILING_COMMA.sub(r'\1', text))
+    except json.JSONDecodeError:
+        return None
+
+
+def extract_json(text: str) -> Optional[Dict]:
+    """从完整文本中提取第一个JSON对象"""
+    extractor = JSONStreamExtractor()
+    return extractor.feed(text) or extractor.finish()
+
+
+def validate_and_fill(data: Optional[Dict], schema: Schema) -> Tuple[Dict, List[str]]:
+    """按schema校验，只为缺失或类型不符的字段填默认值
+
+    返回 (结果, 被填充的字段列表)。字符串写成列表形式时会自动拆分。
+    """
+    result = dict(data or {})
+    filled = []
+    for field, (expected_type, default) in schema.items():
+        value = result.get(field)
+        if expected_type is list and isinstance(value, str) and value.strip():
+            value = [part.strip() for part in re.split(r'[、，,；;\n]', value) if part.strip()]
+        elif expected_type is str and isinstance(value, list) and value:
+            value = "，".join(str(item) for item in value)
+
+        if isinstance(value, expected_type) and value:
+            result[field] = value
+        else:
+            result[field] = list(default) if isinstance(default, list) else default
+            filled.append(field)
+    return result, filled
@@ -0,0 +1,258 @@
+import itertools
+import json
+import math
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+STAGE_METRIC = "soulconnect_stage_seconds"
+TOKEN_METRIC = "soulconnect_glm_tokens_total"
+
+# 覆盖本地解析（毫秒级）到模型生成（数十秒）的耗时分桶，单位秒
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+QUANTILES = (0.5, 0.95, 0.99)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict) -> LabelKey:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _format_labels(labels: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + "}"
+
+
+class Histogram:
+    """耗时直方图
+
+    累计分桶用于导出Prometheus格式（可在服务端用 histogram_quantile 聚合），
+    另保留最近 window 个样本，本地直接算出 p50/p95/p99。
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS, window: int = 2048):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self._recent = deque(maxlen=window)
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self._recent.append(value)
+
+    def quantiles(self, quantiles: Tuple[float, ...] = QUANTILES) -> Dict[float, float]:
+        """最近样本的分位数（取最近秩），没有样本时为0"""
+        values = sorted(self._recent)
+        if not values:
+            return {q: 0.0 for q in quantiles}
+        return {q: values[max(0, math.ceil(q * len(values)) - 1)] for q in quantiles}
+
+
+class Metrics:
+    """进程内的耗时、计数与追踪记录，无需外部服务
+
+    span() 记录一个阶段的耗时并计入 soulconnect_stage_seconds{stage=...}；
+    同一线程内嵌套的 span 组成一条追踪（trace_id 相同，parent_id 指向外层）。
+    耗时由别处测得的阶段（如HTTP首字节时间）用 record_span() 补记为当前 span 的子阶段。
+    最近的 span 留在内存中供调试面板和 JSONL 导出；设置 trace_path 时每个 span 结束即追加写入文件。
+    """
+
+    def __init__(self, trace_path: Optional[str] = None, max_spans: int = 1000):
+        self.trace_path = trace_path
+        self._lock = threading.Lock()
+        self._histograms: Dict[Tuple[str, LabelKey], Histogram] = {}
+        self._counters: Dict[Tuple[str, LabelKey], float] = {}
+        self._spans = deque(maxlen=max_spans)
+        self._ids = itertools.count(1)
+        self._local = threading.local()
+
+    def observe(self, name: str, value: float, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def counter(self, name: str, **labels) -> float:
+        with self._lock:
+            return self._counters.get((name, _label_key(labels)), 0)
+
+    def record_usage(self, usage: Optional[Dict], model: str):
+        """按接口返回的 usage 字段累计 token 用量"""
+        if not usage:
+            return
+        for kind in ("prompt", "completion"):
+            tokens = usage.get(f"{kind}_tokens")
+            if tokens:
+                self.inc(TOKEN_METRIC, tokens, kind=kind, model=model)
+        span = self.current_span()
+        if span is not None:
+            span["attributes"].update(
+                prompt_tokens=usage.get("prompt_tokens", 0), completion_tokens=usage.get("completion_tokens", 0)
+            )
+
+    def current_span(self) -> Optional[Dict]:
+        stack = getattr(self._local, "stack", None)
+        return stack[-1] if stack else None
+
+    def _new_span(self, stage: str, attributes: Dict) -> Dict:
+        parent = self.current_span()
+        span_id = next(self._ids)
+        return {
+            "trace_id": parent["trace_id"] if parent else span_id,
+            "span_id": span_id,
+            "parent_id": parent["span_id"] if parent else None,
+            "stage": stage,
+            "start": time.time(),
+            "attributes": attributes
+        }
+
+    @contextmanager
+    def span(self, stage: str, **attributes) -> Iterator[Dict]:
+        """计时一个阶段；产出的 span 的 attributes 可在阶段内补充（如 token 数）"""
+        span = self._new_span(stage, attributes)
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        stack.append(span)
+        begin = time.perf_counter()
+        try:
+            yield span
+        except BaseException as e:
+            span["error"] = type(e).__name__
+            raise
+        finally:
+            span["duration"] = time.perf_counter() - begin
+            stack.pop()
+            self._finish(span)
+
+    def record_span(self, stage: str, duration: float, **attributes):
+        """补记一个已结束的阶段，作为当前 span 的子阶段"""
+        span = self._new_span(stage, attributes)
+        span["start"] -= duration
+        span["duration"] = duration
+        self._finish(span)
+
+    def _finish(self, span: Dict):
+        self.observe(STAGE_METRIC, span["duration"], stage=span["stage"])
+        with self._lock:
+            self._spans.append(span)
+            if self.trace_path:
+                with open(self.trace_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(span, ensure_ascii=False, default=str) + "\n")
+
+    def recent_spans(self, limit: Optional[int] = None) -> List[Dict]:
+        with self._lock:
+            spans = list(self._spans)
+        return spans[-limit:] if limit else spans
+
+    def summary(self) -> Dict:
+        """各阶段的次数、平均与 p50/p95/p99 耗时（秒），以及各计数器的值"""
+        with self._lock:
+            stages = {}
+            for (name, labels), histogram in self._histograms.items():
+                label_text = ",".join(value for _, value in labels) or name
+                quantiles = histogram.quantiles()
+                stages[label_text] = {
+                    "count": histogram.count,
+                    "mean": histogram.sum / histogram.count,
+                    "p50": quantiles[0.5],
+                    "p95": quantiles[0.95],
+                    "p99": quantiles[0.99]
+                }
+            counters = {name + _format_labels(labels): value for (name, labels), value in self._counters.items()}
+        return {"stages": stages, "counters": counters}
+
+    def to_prometheus(self) -> str:
+        """Prometheus 文本格式，可直接作为 /metrics 的响应体"""
+        lines = []
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+            counters = sorted(self._counters.items())
+            typed = set()
+            for (name, labels), histogram in histograms:
+                if name not in typed:
+                    lines.append(f"# TYPE {name} histogram")
+                    typed.add(name)
+                cumulative = 0
+                bounds = [repr(bound) for bound in histogram.buckets] + ["+Inf"]
+                for bound, count in zip(bounds, histogram.counts):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_format_labels(labels, ('le', bound))} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {histogram.sum}")
+                lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+            for (name, labels), value in counters:
+                if name not in typed:
+                    lines.append(f"# TYPE {name} counter")
+                    typed.add(name)
+                lines.append(f"{name}{_format_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def to_jsonl(self) -> str:
+        """最近的 span，每行一个JSON对象，最后一行为各阶段汇总"""
+        lines = [json.dumps(span, ensure_ascii=False, default=str) for span in self.recent_spans()]
+        lines.append(json.dumps(dict(self.summary(), type="summary"), ensure_ascii=False))
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> Dict:
+        """直方图分桶与计数器的可序列化快照，用于跨进程汇总"""
+        with self._lock:
+            return {
+                "histograms": [[name, labels, histogram.buckets, histogram.counts, histogram.sum, histogram.count]
+                               for (name, labels), histogram in self._histograms.items()],
+                "counters": [[name, labels, value] for (name, labels), value in self._counters.items()]
+            }
+
+    def merge(self, snapshot: Dict):
+        """累加另一个进程的快照；只合并分桶和计数，不影响本地的分位数窗口"""
+        with self._lock:
+            for name, labels, buckets, counts, total, count in snapshot.get("histograms", []):
+                key = (name, tuple(tuple(pair) for pair in labels))
+                histogram = self._histograms.get(key)
+                if histogram is None:
+                    histogram = self._histograms[key] = Histogram(tuple(buckets))
+                if list(histogram.buckets) != list(buckets):
+                    continue
+                histogram.counts = [a + b for a, b in zip(histogram.counts, counts)]
+                histogram.sum += total
+                histogram.count += count
+            for name, labels, value in snapshot.get("counters", []):
+                key = (name, tuple(tuple(pair) for pair in labels))
+                self._counters[key] = self._counters.get(key, 0) + value
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+            self._spans.clear()
+
+
+_shared_metrics: Optional[Metrics] = None
+_shared_lock = threading.Lock()
+
+
+def get_shared_metrics() -> Metrics:
+    """进程内共享的指标，设置环境变量 SOULCONNECT_TRACE_FILE 时把每个 span 追加写入该 JSONL 文件"""
+    global _shared_metrics
+    with _shared_lock:
+        if _shared_metrics is None:
+            _shared_metrics = Metrics(trace_path=os.getenv("SOULCONNECT_TRACE_FILE"))
+        return _shared_metrics
@@ -0,0 +1,228 @@
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from .scheduler import PRIORITY_BATCH
+
+SlotKey = Tuple[Tuple[str, ...], str, str]
+
+
+class PrefetchPool:
+    """进程内共享的预取线程池
+
+    预取是投机性的，排队中的任务超过 max_pending 时不再接收，
+    避免大量会话同时分析资料时预取任务堆积。
+    """
+
+    def __init__(self, max_workers: int = 2, max_pending: int = 16):
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="prefetch")
+        self._lock = threading.Lock()
+        self._pending = 0
+
+    def submit(self, fn, *args) -> Optional[Future]:
+        """提交任务，队列已满时返回 None"""
+        with self._lock:
+            if self._pending >= self.max_pending:
+                return None
+            self._pending += 1
+        future = self._executor.submit(fn, *args)
+        future.add_done_callback(self._done)
+        return future
+
+    def _done(self, _future: Future):
+        with self._lock:
+            self._pending -= 1
+
+    @property
+    def pending(self) -> int:
+        with self._lock:
+            return self._pending
+
+
+class PrefetchSlot:
+    """一次预取的输出缓冲：生成线程逐段写入，界面可在生成过程中接着读取"""
+
+    def __init__(self):
+        self.chunks: List[str] = []
+        self.finished = False
+        self.failed = False
+        # 取走结果的一方放弃等待时置位，生成线程在下一段输出到达时中断连接
+        self.cancelled = False
+        self._condition = threading.Condition()
+
+    def append(self, delta: str):
+        with self._condition:
+            self.chunks.append(delta)
+            self._condition.notify_all()
+
+    def finish(self, failed: bool):
+        with self._condition:
+            self.finished = True
+            self.failed = failed
+            self._condition.notify_all()
+
+    def follow(self, stall_timeout: float) -> Iterator[str]:
+        """依次产出已收到和之后到达的文本，生成结束或超过 stall_timeout 秒没有新输出时停止"""
+        index = 0
+        while True:
+            with self._condition:
+                if index >= len(self.chunks) and not self.finished:
+                    self._condition.wait(stall_timeout)
+                pending = self.chunks[index:]
+                finished = self.finished
+            if not pending and not finished:
+                return
+            index += len(pending)
+            yield from pending
+            if finished and index >= len(self.chunks):
+                return
+
+
+class IcebreakerPrefetcher:
+    """会话内的开场白预取
+
+    资料分析完成后，在后台为默认话题组合和每种聊天风格各生成一条开场白，存进按
+    (话题, 风格, 昵称) 划分的槽位；点击生成时命中槽位即可直接显示，
+    预取还在进行时接着它的输出边生成边显示，不再另发请求。
+    每个目标最多发起 max_calls 次预取，以批量优先级排队，不挤占交互请求。
+    目标变化时取消上一目标的预取：未开始的直接撤销，进行中的在下一段输出到达时中断连接。
+    """
+
+    def __init__(self, client, pool: Optional[PrefetchPool] = None, max_calls: int = 3):
+        self.client = client
+        self.pool = pool or get_shared_prefetch_pool()
+        self.max_calls = max_calls
+        self.target = None
+        self._generation = 0
+        self._target_calls = 0
+        self._slots: Dict[SlotKey, Tuple[Future, PrefetchSlot]] = {}
+        self._lock = threading.Lock()
+        self._stats = {"scheduled": 0, "skipped": 0, "hits": 0, "joined": 0, "misses": 0, "cancelled": 0}
+
+    @staticmethod
+    def slot_key(topics: List[str], style: str, nickname: str) -> SlotKey:
+        return tuple(topics), style, nickname
+
+    def prefetch(self, target, requests: List[Tuple[List[str], str, str]]) -> int:
+        """为目标预取一批 (话题, 风格, 昵称)，返回实际提交的数量；目标变化时先取消旧的预取"""
+        with self._lock:
+            if target != self.target:
+                self._cancel_locked()
+                self.target = target
+            generation = self._generation
+            scheduled = 0
+            for topics, style, nickname in requests:
+                key = self.slot_key(topics, style, nickname)
+                if key in self._slots:
+                    continue
+                if self._target_calls >= self.max_calls:
+                    self._stats["skipped"] += 1
+                    continue
+                slot = PrefetchSlot()
+                future = self.pool.submit(self._generate, generation, slot, topics, style, nickname)
+                if future is None:
+                    self._stats["skipped"] += 1
+                    continue
+                self._slots[key] = (future, slot)
+                self._target_calls += 1
+                self._stats["scheduled"] += 1
+                scheduled += 1
+            return scheduled
+
+    def _generate(self, generation: int, slot: PrefetchSlot, topics: List[str], style: str, nickname: str):
+        # app.py 启动时就导入本模块，GLM客户端较重，用到时再导入
+        from .glm_client import GLMStreamError
+
+        completed = False
+        try:
+            if generation != self._generation:
+                return
+            stream = self.client.stream_icebreaker(topics, style, nickname, priority=PRIORITY_BATCH)
+            try:
+                for delta in stream:
+                    if generation != self._generation or slot.cancelled:
+                        # 关闭生成器会关闭底层连接，不再接收剩余输出
+                        return
+                    slot.append(delta)
+                completed = True
+            except GLMStreamError:
+                # 只按异常判断失败，不看输出内容；由取结果的一方决定改为实时生成还是提示中断
+                return
+            finally:
+                stream.close()
+        finally:
+            slot.finish(failed=not completed)
+
+    def take(self, topics: List[str], style: str, nickname: str,
+             stall_timeout: float = 10.0) -> Optional[Iterator[str]]:
+        """取出预取结果的文本流，槽位随即清空（再次点击会重新生成）
+
+        预取已完成时产出整段文本，进行中时接着它的输出产出，不等待也不重复请求；
+        预取在输出前失败或超过 stall_timeout 秒没有新输出时，中断预取并改为实时生成。
+        没有预取、尚未开始或已失败时返回 None，由调用方实时生成。
+        """
+        with self._lock:
+            entry = self._slots.pop(self.slot_key(topics, style, nickname), None)
+        # 还在排队的预取直接撤销，实时生成不比等它更慢
+        if entry is None or entry[0].cancel() or (entry[1].finished and entry[1].failed):
+            with self._lock:
+                self._stats["misses"] += 1
+            return None
+        slot = entry[1]
+        with self._lock:
+            self._stats["hits" if slot.finished else "joined"] += 1
+        return self._follow(slot, topics, style, nickname, stall_timeout)
+
+    def _follow(self, slot: PrefetchSlot, topics: List[str], style: str, nickname: str,
+                stall_timeout: float) -> Iterator[str]:
+        from .glm_client import INTERRUPTED_SUFFIX
+
+        started = False
+        try:
+            for delta in slot.follow(stall_timeout):
+                started = True
+                yield delta
+        finally:
+            if not slot.finished:
+                # 输出停滞或界面提前停止读取，中断预取，避免与实时生成重复消耗
+                slot.cancelled = True
+        if slot.finished and not slot.failed:
+            return
+        if started:
+            yield INTERRUPTED_SUFFIX
+        else:
+            yield from self.client.generate_icebreaker_stream(topics, style, nickname)
+
+    def cancel(self):
+        with self._lock:
+            self._cancel_locked()
+            self.target = None
+
+    def _cancel_locked(self):
+        # 递增代号后，进行中的任务在下一段输出到达时自行退出
+        self._generation += 1
+        self._target_calls = 0
+        for future, _ in self._slots.values():
+            if not future.done():
+                future.cancel()
+                self._stats["cancelled"] += 1
+        self._slots.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return dict(self._stats, slots=len(self._slots),
+                        ready=sum(1 for _, slot in self._slots.values() if slot.finished and not slot.failed))
+
+
+_shared_pool: Optional[PrefetchPool] = None
+_shared_lock = threading.Lock()
+
+
+def get_shared_prefetch_pool() -> PrefetchPool:
+    """进程内所有会话共用的预取线程池"""
+    global _shared_pool
+    with _shared_lock:
+        if _shared_pool is None:
+            _shared_pool = PrefetchPool()
+        return _shared_pool
@@ -0,0 +1,247 @@
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence
+
+import numpy as np
+
+# 示例用户资料库
+SAMPLE_PROFILES: List[Dict] = [
+    {
+        "id": 1,
+        "nickname": "音乐爱好者小张",
+        "age": 24,
+        "tags": ["吉他", "民谣", "旅行", "摄影", "咖啡"],
+        "bio": "用音乐记录生活，用脚步丈量世界",
+        "recent_moments": "刚刚在丽江古城听到一首超棒的民谣！准备学起来🎵"
+    },
+    {
+        "id": 2,
+        "nickname": "读书人小王",
+        "age": 26,
+        "tags": ["阅读", "写作", "哲学", "历史", "茶道"],
+        "bio": "在书海中寻找智慧，在文字间表达思考",
+        "recent_moments": "最近在读《人类简史》，对认知革命有了新的理解📚"
+    },
+    {
+        "id": 3,
+        "nickname": "运动达人小李",
+        "age": 23,
+        "tags": ["篮球", "健身", "跑步", "营养", "健康"],
+        "bio": "生命在于运动，健康源于坚持",
+        "recent_moments": "今天完成了半马训练，刷新了个人记录！🏃‍♂️"
+    },
+    {
+        "id": 4,
+        "nickname": "美食家小赵",
+        "age": 25,
+        "tags": ["烹饪", "烘焙", "探店", "咖啡", "美食摄影"],
+        "bio": "吃货的人生不需要解释，唯美食与爱不可辜负",
+        "recent_moments": "发现了一家超赞的意大利餐厅，提拉米苏绝了！🍰"
+    }
+]
+
+UNKNOWN_AGE = -1
+STRING_FIELDS = ("nickname", "bio", "recent_moments")
+
+
+class StringColumn:
+    """变长字符串列：UTF-8字节拼接成一个数组，另存偏移量"""
+
+    def __init__(self, data: np.ndarray, offsets: np.ndarray):
+        self.data = data
+        self.offsets = offsets
+
+    @classmethod
+    def from_strings(cls, values: Iterable[str]) -> "StringColumn":
+        encoded = [value.encode("utf-8") for value in values]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(value) for value in encoded])
+        return cls(np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets)
+
+    def __getitem__(self, row: int) -> str:
+        return self.data[self.offsets[row]:self.offsets[row + 1]].tobytes().decode("utf-8")
+
+    @property
+    def nbytes(self) -> int:
+        return self.data.nbytes + self.offsets.nbytes
+
+
+class ProfileStore:
+    """列式存储的用户资料库
+
+    每个字段一列：年龄为int16数组，标签以CSR形式存为 (偏移, 标签编号) 两个数组，
+    文本字段为偏移编码的UTF-8字节串，10^6 条资料也只占几十MB且没有逐条的Python对象。
+    另建标签倒排索引，按标签重合度检索最合适的练习对象只需访问相关标签的倒排表。
+    """
+
+    def __init__(self, profiles: Optional[Iterable[Dict]] = None):
+        ids, ages, tag_lengths, tag_ids = [], [], [], []
+        strings = {field: [] for field in STRING_FIELDS}
+        self.tag_vocabulary: Dict[str, int] = {}
+        self.tags: List[str] = []
+
+        for profile in (SAMPLE_PROFILES if profiles is None else profiles):
+            ids.append(profile["id"])
+            ages.append(profile.get("age", UNKNOWN_AGE))
+            row_tags = []
+            for tag in dict.fromkeys(profile.get("tags", [])):
+                tag_id = self.tag_vocabulary.get(tag)
+                if tag_id is None:
+                    tag_id = self.tag_vocabulary[tag] = len(self.tags)
+                    self.tags.append(tag)
+                row_tags.append(tag_id)
+            tag_lengths.append(len(row_tags))
+            tag_ids.extend(row_tags)
+            for field in STRING_FIELDS:
+                strings[field].append(profile.get(field, ""))
+
+        self.profile_ids = np.array(ids, dtype=np.int64)
+        self.ages = np.array(ages, dtype=np.int16)
+        self.tag_offsets = np.zeros(len(ids) + 1, dtype=np.int64)
+        self.tag_offsets[1:] = np.cumsum(tag_lengths)
+        self.tag_ids = np.array(tag_ids, dtype=np.int32)
+        self.columns = {field: StringColumn.from_strings(values) for field, values in strings.items()}
+        self._build_indexes()
+
+    def _build_indexes(self):
+        rows_per_posting = np.repeat(np.arange(len(self.profile_ids), dtype=np.int32), np.diff(self.tag_offsets))
+        # 标签倒排索引：按标签编号排序后的行号，也是CSR形式
+        order = np.argsort(self.tag_ids, kind="stable")
+        self.posting_rows = rows_per_posting[order]
+        self.document_frequency = np.bincount(self.tag_ids, minlength=len(self.tags))
+        self.posting_offsets = np.zeros(len(self.tags) + 1, dtype=np.int64)
+        self.posting_offsets[1:] = np.cumsum(self.document_frequency)
+        self.tag_counts = np.diff(self.tag_offsets).astype(np.int32)
+
+        # 越少见的标签越能说明共同兴趣：权重取 idf
+        self.tag_weights = np.log((1 + len(self.profile_ids)) / (1 + self.document_frequency)) + 1.0
+        self.row_weights = np.bincount(rows_per_posting, weights=self.tag_weights[self.tag_ids],
+                                       minlength=len(self.profile_ids))
+
+        # id -> 行号：排序后二分查找，不为每条资料建Python字典项
+        self._id_order = np.argsort(self.profile_ids, kind="stable")
+        self._sorted_ids = self.profile_ids[self._id_order]
+
+    def __len__(self):
+        return len(self.profile_ids)
+
+    def __iter__(self) -> Iterator[Dict]:
+        return (self.row(index) for index in range(len(self.profile_ids)))
+
+    def ids(self, limit: Optional[int] = None) -> List[int]:
+        return self.profile_ids[:limit].tolist()
+
+    def row_of(self, profile_id: int) -> Optional[int]:
+        position = int(np.searchsorted(self._sorted_ids, profile_id))
+        if position < len(self._sorted_ids) and self._sorted_ids[position] == profile_id:
+            return int(self._id_order[position])
+        return None
+
+    def row(self, index: int) -> Dict:
+        """把一行还原成资料字典"""
+        tag_ids = self.tag_ids[self.tag_offsets[index]:self.tag_offsets[index + 1]]
+        profile = {
+            "id": int(self.profile_ids[index]),
+            "nickname": self.columns["nickname"][index],
+            "tags": [self.tags[tag_id] for tag_id in tag_ids],
+            "bio": self.columns["bio"][index],
+            "recent_moments": self.columns["recent_moments"][index]
+        }
+        age = int(self.ages[index])
+        if age != UNKNOWN_AGE:
+            profile["age"] = age
+        return profile
+
+    def get(self, profile_id: int) -> Optional[Dict]:
+        index = self.row_of(profile_id)
+        return None if index is None else self.row(index)
+
+    def nickname(self, profile_id: int) -> str:
+        index = self.row_of(profile_id)
+        return self.columns["nickname"][index] if index is not None else str(profile_id)
+
+    def popular_tags(self, limit: int = 30) -> List[str]:
+        """出现次数最多的标签"""
+        top = np.argsort(-self.document_frequency, kind="stable")[:limit]
+        return [self.tags[tag_id] for tag_id in top]
+
+    def candidates(self, tags: Sequence[str]) -> np.ndarray:
+        """至少有一个相同标签的资料行号"""
+        query = self._query_tag_ids(tags)
+        if not len(query):
+            return np.empty(0, dtype=np.int32)
+        return np.unique(np.concatenate([self._postings(tag_id) for tag_id in query]))
+
+    def _query_tag_ids(self, tags: Sequence[str]) -> np.ndarray:
+        return np.array(sorted({self.tag_vocabulary[tag] for tag in tags if tag in self.tag_vocabulary}),
+                        dtype=np.int32)
+
+    def _postings(self, tag_id: int) -> np.ndarray:
+        return self.posting_rows[self.posting_offsets[tag_id]:self.posting_offsets[tag_id + 1]]
+
+    def most_compatible(self, tags: Sequence[str], limit: int = 5, method: str = "jaccard",
+                        exclude_ids: Sequence[int] = ()) -> List[Dict]:
+        """按标签重合度排序的最合适练习对象
+
+        method="jaccard" 为普通Jaccard相似度；"weighted" 按标签idf加权，
+        冷门标签重合比热门标签重合得分更高。
+        返回 [{"id", "nickname", "score", "shared_tags"}]。
+        """
+        if method not in ("jaccard", "weighted"):
+            raise ValueError(f"未知的相似度：{method}")
+        query = self._query_tag_ids(tags)
+        if not len(query):
+            return []
+
+        postings = [self._postings(tag_id) for tag_id in query]
+        rows = np.concatenate(postings)
+        if method == "jaccard":
+            weights = None
+            query_total = float(len(set(tags)))
+            row_totals = self.tag_counts
+        else:
+            weights = np.concatenate([np.full(len(p), self.tag_weights[tag_id]) for tag_id, p in zip(query, postings)])
+            # 词表外的标签按最高权重计入，避免查询标签越冷门得分反而越高
+            unknown = len(set(tags)) - len(query)
+            query_total = float(self.tag_weights[query].sum() + unknown * self.tag_weights.max(initial=1.0))
+            row_totals = self.row_weights
+
+        # 按行号直接累加重合度，比先排序去重快得多
+        overlap = np.bincount(rows, weights=weights, minlength=len(self.profile_ids))
+        candidates = np.flatnonzero(overlap)
+        overlap = overlap[candidates]
+        scores = overlap / (query_total + row_totals[candidates] - overlap)
+
+        if len(exclude_ids):
+            keep = ~np.isin(self.profile_ids[candidates], np.asarray(exclude_ids, dtype=np.int64))
+            candidates, scores = candidates[keep], scores[keep]
+        if len(candidates) > limit:
+            # 保留与第 limit 名同分的所有候选，排序后再截断，同分时按id取，结果才确定
+            kth = np.partition(-scores, limit - 1)[limit - 1]
+            top = -scores <= kth
+            candidates, scores = candidates[top], scores[top]
+        order = np.lexsort((self.profile_ids[candidates], -scores))[:limit]
+
+        query_set = set(query.tolist())
+        results = []
+        for position in order:
+            index = int(candidates[position])
+            row_tags = self.tag_ids[self.tag_offsets[index]:self.tag_offsets[index + 1]]
+            results.append({
+                "id": int(self.profile_ids[index]),
+                "nickname": self.columns["nickname"][index],
+                "score": round(float(scores[position]), 4),
+                "shared_tags": [self.tags[tag_id] for tag_id in row_tags if tag_id in query_set]
+            })
+        return results
+
+    def memory_usage(self) -> Dict[str, int]:
+        """各列占用的字节数"""
+        usage = {
+            "ids": self.profile_ids.nbytes + self._id_order.nbytes + self._sorted_ids.nbytes,
+            "ages": self.ages.nbytes,
+            "tags": self.tag_offsets.nbytes + self.tag_ids.nbytes + self.tag_counts.nbytes,
+            "tag_index": self.posting_rows.nbytes + self.posting_offsets.nbytes + self.row_weights.nbytes
+        }
+        for field, column in self.columns.items():
+            usage[field] = column.nbytes
+        usage["total"] = sum(usage.values())
+        return usage
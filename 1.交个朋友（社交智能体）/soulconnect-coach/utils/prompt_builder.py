@@ -0,0 +1,158 @@
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+CJK_PATTERN = re.compile(r'[　-〿㐀-䶿一-鿿＀-￯]')
+
+REGION_KEY_MESSAGES = 3
+
+# summarizer(上一版摘要, 新并入摘要的消息) -> 新摘要
+Summarizer = Callable[[str, List[Dict]], str]
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算token数：中文字符及全角标点按1个计，其余字符约4个计1个"""
+    cjk = len(CJK_PATTERN.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def format_message(message: Dict) -> str:
+    return f"{message['role']}: {message['content']}"
+
+
+class PromptBuilder:
+    """按token预算组装对话历史
+
+    从最新的消息往前尽量多地放入原文，放不下的较早消息并入一段滚动摘要。
+    摘要按被摘要区间缓存，只有区间变化时才重新生成，
+    且只需把新移出窗口的消息并入上一版摘要。
+    未指定会话时以整个区间的内容哈希为键；指定会话（只追加的持久化记录）时
+    键限定在该会话内，只看区间末尾几条，最早的消息移出最近窗口后摘要仍能命中。
+    summarizer 默认为本地截取摘要，可换成 GLMClient.summarize_history。
+    """
+
+    def __init__(self, history_budget: int = 600, summary_budget: int = 150,
+                 summarizer: Optional[Summarizer] = None, cache_size: int = 256):
+        self.history_budget = history_budget
+        self.summary_budget = summary_budget
+        self.summarizer = summarizer or self.extractive_summary
+        self.cache_size = cache_size
+        self._summaries: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._totals = {"calls": 0, "history_tokens": 0, "summary_regenerations": 0, "summary_cache_hits": 0}
+
+    def extractive_summary(self, previous: str, messages: List[Dict]) -> str:
+        """本地摘要：每条消息截取开头，超出预算时丢弃最早的内容，不额外调用模型"""
+        parts = [previous] if previous else []
+        parts.extend(f"{msg['role']}说“{msg['content'][:30]}”" for msg in messages)
+        summary = "；".join(parts)
+        while estimate_tokens(summary) > self.summary_budget and "；" in summary:
+            summary = summary.split("；", 1)[1]
+        return summary
+
+    @staticmethod
+    def _message_bytes(msg: Dict) -> bytes:
+        return f"{msg.get('seq', '')}\x1f{msg['role']}\x1f{msg['content']}\x1e".encode("utf-8")
+
+    def _region_keys(self, older: List[Dict], conversation_id: Optional[str]) -> List[str]:
+        """keys[k - 1] 标识区间 older[:k]
+
+        会话内的记录只追加不修改，用会话id加区间末尾几条（含序号）即可标识；
+        不同会话即使末尾相同也不会共用摘要。未指定会话时逐条链式哈希整个区间，
+        区间内任何一条消息不同都会得到不同的键。
+        """
+        if conversation_id is not None:
+            keys = []
+            for end in range(1, len(older) + 1):
+                digest = hashlib.sha1(f"conversation\x1f{conversation_id}\x1e".encode("utf-8"))
+                for msg in older[max(0, end - REGION_KEY_MESSAGES):end]:
+                    digest.update(self._message_bytes(msg))
+                keys.append(digest.hexdigest())
+            return keys
+
+        keys, chained = [], b""
+        for msg in older:
+            chained = hashlib.sha1(chained + self._message_bytes(msg)).digest()
+            keys.append("region:" + chained.hex())
+        return keys
+
+    def _summary_for(self, older: List[Dict], conversation_id: Optional[str] = None) -> Tuple[str, bool]:
+        """返回 (摘要, 是否重新生成)"""
+        if not older:
+            return "", False
+
+        keys = self._region_keys(older, conversation_id)
+        with self._lock:
+            for covered in range(len(older), 0, -1):
+                cached = self._summaries.get(keys[covered - 1])
+                if cached is not None:
+                    self._summaries.move_to_end(keys[covered - 1])
+                    break
+            else:
+                covered, cached = 0, ""
+
+        if covered == len(older):
+            return cached, False
+
+        # 只把新移出窗口的消息并入上一版摘要
+        summary = self.summarizer(cached, older[covered:])
+        with self._lock:
+            self._summaries[keys[-1]] = summary
+            while len(self._summaries) > self.cache_size:
+                self._summaries.popitem(last=False)
+        return summary, True
+
+    def _pack(self, costs: List[int], budget: int) -> int:
+        """从最新一条往前，返回预算内能放下的消息数（至少1条）"""
+        used = included = 0
+        for cost in reversed(costs):
+            if included and used + cost > budget:
+                break
+            used += cost
+            included += 1
+        return included
+
+    def build_history(self, messages: List[Dict], conversation_id: Optional[str] = None) -> Tuple[str, Dict]:
+        """返回 (对话历史文本, 统计信息)；conversation_id 为消息所属的持久化会话"""
+        lines = [format_message(msg) for msg in messages]
+        costs = [estimate_tokens(line) + 1 for line in lines]
+
+        included = self._pack(costs, self.history_budget)
+        if included < len(lines):
+            # 需要摘要时为其预留预算
+            included = self._pack(costs, max(self.history_budget - self.summary_budget, 1))
+
+        recent_lines = lines[len(lines) - included:]
+        if recent_lines and estimate_tokens(recent_lines[-1]) > self.history_budget:
+            # 单条消息本身超出预算时截断
+            recent_lines[-1] = recent_lines[-1][:self.history_budget] + "…"
+
+        summary, regenerated = self._summary_for(messages[:len(messages) - included], conversation_id)
+        parts = [f"（更早的对话摘要：{summary}）"] if summary else []
+        parts.extend(recent_lines)
+        text = "\n".join(parts)
+
+        stats = {
+            "history_tokens": estimate_tokens(text),
+            "summary_tokens": estimate_tokens(summary),
+            "messages_included": included,
+            "messages_summarized": len(messages) - included,
+            "summary_regenerated": regenerated
+        }
+        with self._lock:
+            self._totals["calls"] += 1
+            self._totals["history_tokens"] += stats["history_tokens"]
+            if regenerated:
+                self._totals["summary_regenerations"] += 1
+            elif summary:
+                self._totals["summary_cache_hits"] += 1
+        return text, stats
+
+    def stats(self) -> Dict:
+        """累计统计"""
+        with self._lock:
+            totals = dict(self._totals)
+        totals["average_history_tokens"] = round(totals["history_tokens"] / totals["calls"], 1) if totals["calls"] else 0.0
+        return totals
@@ -0,0 +1,222 @@
+import hashlib
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+
+def make_cache_key(model: str, temperature: float, messages: List[Dict]) -> str:
+    """按 (模型, 温度, 消息) 计算内容哈希，作为缓存键"""
+    payload = json.dumps(
+        {"model": model, "temperature": round(float(temperature), 3), "messages": messages},
+        ensure_ascii=False,
+        sort_keys=True,
+        separators=(",", ":")
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class MemoryLRUCache:
+    """进程内LRU缓存，条目带过期时间，超过容量时淘汰最久未使用的条目"""
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key: str, allow_stale: bool = False):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at < time.time() and not allow_stale:
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value, ttl: float):
+        with self._lock:
+            self._data[key] = (time.time() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SQLiteCache:
+    """磁盘缓存层（SQLite），进程重启后仍可命中"""
+
+    def __init__(self, path: str, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS response_cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+            "expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_response_cache_accessed ON response_cache (accessed_at)"
+        )
+        self._conn.commit()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key: str, allow_stale: bool = False):
+        entry = self.get_entry(key, allow_stale)
+        return None if entry is None else entry[0]
+
+    def get_entry(self, key: str, allow_stale: bool = False) -> Optional[Tuple[object, float]]:
+        """返回 (值, 过期时间)，未命中返回None"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM response_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] < now and not allow_stale:
+                return None
+            self._conn.execute("UPDATE response_cache SET accessed_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+        return json.loads(row[0]), row[1]
+
+    def set(self, key: str, value, ttl: float):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO response_cache (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), now + ttl, now)
+            )
+            # 先清理过期条目，再按最近访问时间淘汰超出容量的部分
+            cursor = self._conn.execute("DELETE FROM response_cache WHERE expires_at < ?", (now,))
+            self.evictions += cursor.rowcount
+            overflow = self._conn.execute("SELECT COUNT(*) FROM response_cache").fetchone()[0] - self.max_entries
+            if overflow > 0:
+                cursor = self._conn.execute(
+                    "DELETE FROM response_cache WHERE key IN "
+                    "(SELECT key FROM response_cache ORDER BY accessed_at LIMIT ?)",
+                    (overflow,)
+                )
+                self.evictions += cursor.rowcount
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class ResponseCache:
+    """GLM响应缓存：内存LRU + 可选SQLite磁盘层
+
+    温度不高于 deterministic_max_temperature 的调用视为确定性调用，
+    命中后直接返回，不再请求网络。高温调用（如开场白）默认不缓存；
+    设置 variant_pool_size 后会为同一请求保留若干个不同结果，
+    池满后从中随机返回一个。
+    """
+
+    def __init__(self, memory_entries: int = 256, ttl: float = 3600,
+                 sqlite_path: Optional[str] = None, disk_entries: int = 10000,
+                 deterministic_max_temperature: float = 0.3, variant_pool_size: int = 0):
+        self.ttl = ttl
+        self.deterministic_max_temperature = deterministic_max_temperature
+        self.variant_pool_size = variant_pool_size
+        self.memory = MemoryLRUCache(memory_entries)
+        self.disk = SQLiteCache(sqlite_path, disk_entries) if sqlite_path else None
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._bypassed = 0
+
+    def _pool_size(self, temperature: float, variants: Optional[int]) -> int:
+        if temperature <= self.deterministic_max_temperature:
+            return 1
+        return self.variant_pool_size if variants is None else variants
+
+    def _load(self, key: str, allow_stale: bool = False) -> Optional[List[Dict]]:
+        pool = self.memory.get(key, allow_stale)
+        if pool is None and self.disk is not None:
+            entry = self.disk.get_entry(key, allow_stale)
+            if entry is not None:
+                pool, expires_at = entry
+                # 沿用磁盘上的过期时间，过期条目提升到内存后仍是过期的，只能作为兜底返回
+                self.memory.set(key, pool, expires_at - time.time())
+        return pool
+
+    def get(self, model: str, temperature: float, messages: List[Dict],
+            variants: Optional[int] = None, allow_stale: bool = False) -> Optional[Dict]:
+        """查询缓存，未命中返回None
+
+        variants: 覆盖高温调用的结果池大小，0表示不使用缓存
+        allow_stale: 允许返回已过期的条目（上游不可用时的兜底）
+        """
+        pool_size = self._pool_size(temperature, variants)
+        if pool_size <= 0 and not allow_stale:
+            with self._lock:
+                self._bypassed += 1
+            return None
+
+        pool = self._load(make_cache_key(model, temperature, messages), allow_stale)
+        # 结果池未填满时继续请求新结果，以保持多样性
+        if pool and (allow_stale or len(pool) >= pool_size):
+            with self._lock:
+                self._hits += 1
+            return random.choice(pool)
+
+        with self._lock:
+            self._misses += 1
+        return None
+
+    def put(self, model: str, temperature: float, messages: List[Dict], response: Dict,
+            variants: Optional[int] = None):
+        """写入缓存，错误响应不缓存"""
+        pool_size = self._pool_size(temperature, variants)
+        if pool_size <= 0 or "error" in response:
+            return
+
+        key = make_cache_key(model, temperature, messages)
+        # 过期的结果不并入新的结果池，否则会随新结果一起再获得完整的有效期
+        pool = list(self._load(key) or [])
+        pool.append(response)
+        pool = pool[-pool_size:]
+
+        self.memory.set(key, pool, self.ttl)
+        if self.disk is not None:
+            self.disk.set(key, pool, self.ttl)
+
+    def stats(self) -> Dict:
+        """命中/未命中/淘汰统计"""
+        with self._lock:
+            hits, misses, bypassed = self._hits, self._misses, self._bypassed
+        lookups = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "bypassed": bypassed,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "memory_entries": len(self.memory),
+            "memory_evictions": self.memory.evictions,
+            "disk_evictions": self.disk.evictions if self.disk is not None else 0
+        }
+
+
+_shared_cache: Optional[ResponseCache] = None
+_shared_lock = threading.Lock()
+
+
+def get_shared_cache() -> ResponseCache:
+    """获取进程内共享的响应缓存，设置 SOULCONNECT_CACHE_PATH 时启用SQLite磁盘层"""
+    global _shared_cache
+    with _shared_lock:
+        if _shared_cache is None:
+            _shared_cache = ResponseCache(sqlite_path=os.getenv("SOULCONNECT_CACHE_PATH") or None)
+        return _shared_cache
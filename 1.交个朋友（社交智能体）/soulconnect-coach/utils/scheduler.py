@@ -0,0 +1,348 @@
+import asyncio
+import heapq
+import itertools
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+# 优先级通道：数值越小越先放行
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 1
+PRIORITY_NAMES = {PRIORITY_INTERACTIVE: "interactive", PRIORITY_BATCH: "batch"}
+
+
+class TokenBucket:
+    """令牌桶：按固定速率补充，最多积攒 capacity 个令牌
+
+    允许余额为负（实际用量超过预估时补扣），之后的请求会相应多等一会儿。
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def time_until(self, amount: float, now: float) -> float:
+        """距离可以取出 amount 个令牌还需等待的秒数"""
+        self._refill(now)
+        # 单次需求超过桶容量时按满桶放行，否则永远等不到
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def consume(self, amount: float):
+        self.tokens -= amount
+
+    def pause(self, seconds: float, now: float):
+        """清空令牌，使接下来 seconds 秒内不再放行（上游返回429时使用）"""
+        self._refill(now)
+        self.tokens = min(self.tokens, -seconds * self.rate)
+
+
+class SQLiteRateLimiter:
+    """跨进程共享的限流额度（SQLite）
+
+    多个 worker 进程各自排队，但从同一个数据库文件取令牌，合计不超过 请求数/秒 和 token数/分钟。
+    令牌桶的余额按墙钟时间记录，每次检查和扣除都在同一个写事务里完成。
+    """
+
+    def __init__(self, path: str, requests_per_sec: float = 5.0, tokens_per_min: float = 60000,
+                 request_burst: Optional[float] = None, token_burst: Optional[float] = None):
+        self._config = {
+            "requests": (requests_per_sec, request_burst or max(1.0, requests_per_sec)),
+            "tokens": (tokens_per_min / 60.0, token_burst or tokens_per_min / 6.0)
+        }
+        # 手动管理事务，用 BEGIN IMMEDIATE 在读取余额前就拿到写锁
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS rate_limit ("
+            "name TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._lock = threading.Lock()
+
+    def _update(self, action: Callable[[TokenBucket, TokenBucket, float], Optional[float]]) -> Optional[float]:
+        """在写事务中读出两个令牌桶，执行 action 后写回"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                now = time.time()
+                rows = {name: (tokens, min(updated_at, now)) for name, tokens, updated_at
+                        in self._conn.execute("SELECT name, tokens, updated_at FROM rate_limit")}
+                buckets = {}
+                for name, (rate, capacity) in self._config.items():
+                    bucket = buckets[name] = TokenBucket(rate, capacity)
+                    bucket.tokens, bucket.updated_at = rows.get(name, (capacity, now))
+                result = action(buckets["requests"], buckets["tokens"], now)
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO rate_limit (name, tokens, updated_at) VALUES (?, ?, ?)",
+                    [(name, bucket.tokens, bucket.updated_at) for name, bucket in buckets.items()]
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return result
+
+    def try_acquire(self, tokens: float) -> float:
+        """额度足够时扣除并返回0，否则不扣除，返回还需等待的秒数"""
+        def take(request_bucket: TokenBucket, token_bucket: TokenBucket, now: float) -> float:
+            wait = max(request_bucket.time_until(1, now), token_bucket.time_until(tokens, now))
+            if wait <= 0:
+                request_bucket.consume(1)
+                token_bucket.consume(min(tokens, token_bucket.capacity))
+            return wait
+
+        return self._update(take)
+
+    @property
+    def token_capacity(self) -> float:
+        return self._config["tokens"][1]
+
+    def adjust(self, tokens: float):
+        """补扣（正数）或返还（负数）token额度"""
+        self._update(lambda request_bucket, token_bucket, now: token_bucket.consume(tokens))
+
+    def pause(self, seconds: float):
+        self._update(lambda request_bucket, token_bucket, now: request_bucket.pause(seconds, now))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class SchedulerTimeout(Exception):
+    """排队超过时限仍未轮到"""
+
+
+class RequestScheduler:
+    """进程内共享的请求调度器
+
+    同时按 请求数/秒 和 token数/分钟 两个令牌桶限流，等待中的请求按优先级排队：
+    同一时刻只有队首的请求能取令牌，交互请求总是排在批量请求前面，同级按先来后到。
+    传入 shared_limiter 时令牌从跨进程共享的额度中取，进程内只负责排队。
+    线程用 acquire 排队，协程用 acquire_async，两者在同一个队列里。
+    """
+
+    def __init__(self, requests_per_sec: float = 5.0, tokens_per_min: float = 60000,
+                 request_burst: Optional[float] = None, token_burst: Optional[float] = None,
+                 shared_limiter: Optional[SQLiteRateLimiter] = None):
+        self.shared_limiter = shared_limiter
+        self._request_bucket = TokenBucket(requests_per_sec, request_burst or max(1.0, requests_per_sec))
+        # 默认允许积攒约10秒的token额度
+        self._token_bucket = TokenBucket(tokens_per_min / 60.0, token_burst or tokens_per_min / 6.0)
+        self._queue = []
+        self._cancelled = set()
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._stats = {
+            name: {"acquired": 0, "timeouts": 0, "total_wait": 0.0, "max_wait": 0.0}
+            for name in PRIORITY_NAMES.values()
+        }
+        self._max_depth = 0
+        # 排队中的协程：ticket -> (事件循环, 唤醒事件)
+        self._async_waiters: Dict[int, tuple] = {}
+        self._usage_adjustments = 0
+
+    def _lane(self, priority: int) -> str:
+        return PRIORITY_NAMES.get(priority, "batch")
+
+    def _pop_cancelled(self):
+        while self._queue and self._queue[0][1] in self._cancelled:
+            self._cancelled.discard(heapq.heappop(self._queue)[1])
+
+    def _take(self, tokens: float, now: float) -> float:
+        """队首请求取令牌：额度足够时扣除并返回0，否则返回还需等待的秒数"""
+        if self.shared_limiter is not None:
+            return self.shared_limiter.try_acquire(tokens)
+        wait = max(self._request_bucket.time_until(1, now), self._token_bucket.time_until(tokens, now))
+        if wait <= 0:
+            self._request_bucket.consume(1)
+            self._token_bucket.consume(min(tokens, self._token_bucket.capacity))
+        return wait
+
+    def _notify(self):
+        """唤醒所有排队者：线程等在条件变量上，协程等在各自事件循环的 Event 上"""
+        self._condition.notify_all()
+        for loop, event in self._async_waiters.values():
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                # 事件循环已关闭，对应的协程不会再等待
+                pass
+
+    def _push(self, priority: int) -> int:
+        """持有锁时加入队列，返回排队号"""
+        ticket = next(self._sequence)
+        heapq.heappush(self._queue, (priority, ticket))
+        self._max_depth = max(self._max_depth, len(self._queue) - len(self._cancelled))
+        return ticket
+
+    def _poll(self, ticket: int, lane: str, tokens: float, start: float,
+              expires_at: Optional[float], timeout: Optional[float]):
+        """持有锁时检查一次：轮到且取到令牌时返回 (等待秒数, None)，否则返回 (None, 最多再等多久)
+
+        超时后移出队列并抛出 SchedulerTimeout。
+        """
+        now = time.monotonic()
+        self._pop_cancelled()
+        wait = None
+        if self._queue[0][1] == ticket:
+            wait = self._take(tokens, now)
+            if wait <= 0:
+                heapq.heappop(self._queue)
+                waited = now - start
+                stats = self._stats[lane]
+                stats["acquired"] += 1
+                stats["total_wait"] += waited
+                stats["max_wait"] = max(stats["max_wait"], waited)
+                # 唤醒下一个队首
+                self._notify()
+                return waited, None
+
+        if expires_at is not None:
+            remaining = expires_at - now
+            if remaining <= 0:
+                self._stats[lane]["timeouts"] += 1
+                self._cancel(ticket)
+                raise SchedulerTimeout(f"排队超过 {timeout:.1f} 秒")
+            wait = remaining if wait is None else min(wait, remaining)
+        return None, wait
+
+    def _cancel(self, ticket: int):
+        self._cancelled.add(ticket)
+        self._pop_cancelled()
+        self._notify()
+
+    def acquire(self, tokens: float = 0, priority: int = PRIORITY_INTERACTIVE,
+                timeout: Optional[float] = None) -> float:
+        """排队直到两个令牌桶都有余量，返回实际等待的秒数
+
+        timeout 秒内仍未轮到时抛出 SchedulerTimeout。
+        """
+        lane = self._lane(priority)
+        start = time.monotonic()
+        expires_at = None if timeout is None else start + timeout
+
+        with self._condition:
+            ticket = self._push(priority)
+            while True:
+                waited, wait = self._poll(ticket, lane, tokens, start, expires_at, timeout)
+                if waited is not None:
+                    return waited
+                self._condition.wait(wait)
+
+    async def acquire_async(self, tokens: float = 0, priority: int = PRIORITY_INTERACTIVE,
+                            timeout: Optional[float] = None) -> float:
+        """acquire 的协程版本：在事件循环里等待被唤醒，不占用线程池"""
+        lane = self._lane(priority)
+        start = time.monotonic()
+        expires_at = None if timeout is None else start + timeout
+        loop = asyncio.get_running_loop()
+        event = asyncio.Event()
+
+        with self._condition:
+            ticket = self._push(priority)
+            self._async_waiters[ticket] = (loop, event)
+        try:
+            while True:
+                with self._condition:
+                    waited, wait = self._poll(ticket, lane, tokens, start, expires_at, timeout)
+                    if waited is not None:
+                        return waited
+                    # 在锁内清除，之后的唤醒一定会在本次等待中生效
+                    event.clear()
+                try:
+                    await asyncio.wait_for(event.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+        except asyncio.CancelledError:
+            with self._condition:
+                if any(queued == ticket for _, queued in self._queue):
+                    self._cancel(ticket)
+            raise
+        finally:
+            with self._condition:
+                self._async_waiters.pop(ticket, None)
+
+    def record_usage(self, estimated_tokens: float, actual_tokens: float):
+        """请求结束后按实际用量补扣或返还token额度"""
+        if actual_tokens <= 0:
+            return
+        with self._condition:
+            if self.shared_limiter is not None:
+                self.shared_limiter.adjust(actual_tokens - estimated_tokens)
+            else:
+                self._token_bucket.consume(actual_tokens - estimated_tokens)
+            self._usage_adjustments += 1
+            self._notify()
+
+    def refund(self, tokens: float):
+        """请求没有被上游处理（失败后重试或放弃）时退还预扣的token额度，请求次数额度不退"""
+        if tokens <= 0:
+            return
+        with self._condition:
+            if self.shared_limiter is not None:
+                self.shared_limiter.adjust(-min(tokens, self.shared_limiter.token_capacity))
+            else:
+                # 退还量与 _take 实际扣除的一致；超出容量的部分在下次补充时截断
+                self._token_bucket.consume(-min(tokens, self._token_bucket.capacity))
+            self._notify()
+
+    def pause(self, seconds: float):
+        """上游限流时暂停放行，避免所有会话一起撞上429"""
+        with self._condition:
+            if self.shared_limiter is not None:
+                self.shared_limiter.pause(seconds)
+            else:
+                self._request_bucket.pause(seconds, time.monotonic())
+            self._notify()
+
+    def stats(self) -> Dict:
+        """队列深度和各通道的等待时间"""
+        with self._condition:
+            depth = {name: 0 for name in PRIORITY_NAMES.values()}
+            for priority, ticket in self._queue:
+                if ticket not in self._cancelled:
+                    depth[self._lane(priority)] += 1
+            lanes = {}
+            for name, stats in self._stats.items():
+                lanes[name] = dict(stats, queued=depth[name],
+                                   average_wait=round(stats["total_wait"] / stats["acquired"], 4) if stats["acquired"] else 0.0)
+            return {
+                "queue_depth": sum(depth.values()),
+                "max_queue_depth": self._max_depth,
+                "usage_adjustments": self._usage_adjustments,
+                "lanes": lanes
+            }
+
+
+_shared_scheduler: Optional[RequestScheduler] = None
+_shared_lock = threading.Lock()
+
+
+def get_shared_scheduler() -> RequestScheduler:
+    """进程内所有会话共用的调度器，额度可通过环境变量 SOULCONNECT_RPS / SOULCONNECT_TPM 调整
+
+    设置 SOULCONNECT_RATE_LIMIT_PATH 时额度记在该SQLite文件中，由同一台机器上的多个进程共用。
+    """
+    global _shared_scheduler
+    with _shared_lock:
+        if _shared_scheduler is None:
+            requests_per_sec = float(os.getenv("SOULCONNECT_RPS", "5"))
+            tokens_per_min = float(os.getenv("SOULCONNECT_TPM", "60000"))
+            limiter_path = os.getenv("SOULCONNECT_RATE_LIMIT_PATH")
+            _shared_scheduler = RequestScheduler(
+                requests_per_sec=requests_per_sec,
+                tokens_per_min=tokens_per_min,
+                shared_limiter=SQLiteRateLimiter(limiter_path, requests_per_sec, tokens_per_min) if limiter_path else None
+            )
+        return _shared_scheduler
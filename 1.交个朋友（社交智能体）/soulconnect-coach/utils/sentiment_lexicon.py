@@ -0,0 +1,305 @@
+"""带权重的情感词表
+
+支持两种词表：
+- InMemoryLexicon：小词表，构建Aho–Corasick自动机，单次扫描找出全部候选词
+- MmapLexicon：大词表（10^5+词条），以紧凑二进制格式存盘，按需内存映射，
+  首次查询时才打开文件，不影响应用启动速度；查询时用按词长分组的哈希表
+  一次算完文本所有位置（首次查询时构建，10^5词条约20ms、约2MB）
+
+二进制格式（小端）：
+    头部  magic(4s)="SCLX" version(H) count(I) max_word_length(H)
+    offsets  uint32 × (count+1)，词条在字符串区中的字节偏移
+    weights  float32 × count
+    strings  按UTF-8字节序排序后拼接的词条
+"""
+import mmap
+import os
+import struct
+import sys
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .text_matcher import AhoCorasickMatcher
+
+MAGIC = b"SCLX"
+VERSION = 1
+HEADER = struct.Struct("<4sHIH")
+
+# (起始位置, 结束位置, 权重)
+Span = Tuple[int, int, float]
+
+# 短于此长度的文本 MmapLexicon 逐位置二分查找，NumPy逐次运算的固定开销反而更大
+VECTOR_MIN_LENGTH = 8
+# 按码位计算多项式哈希的乘数（在 uint64 上自然溢出）
+HASH_MULTIPLIER = 0x100000001B3
+
+
+def load_tsv(path: str) -> Dict[str, float]:
+    """读取文本格式词表：每行 `词<TAB>权重`，#开头为注释"""
+    entries: Dict[str, float] = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            word, _, weight = line.partition("\t")
+            if word:
+                entries[word] = float(weight or 1.0)
+    return entries
+
+
+def build_lexicon_file(entries: Dict[str, float], path: str):
+    """将 {词: 权重} 写成二进制词表文件"""
+    import numpy as np
+
+    items = sorted((word.encode("utf-8"), weight) for word, weight in entries.items() if word)
+    offsets = np.zeros(len(items) + 1, dtype="<u4")
+    offsets[1:] = np.cumsum([len(word) for word, _ in items])
+    weights = np.array([weight for _, weight in items], dtype="<f4")
+    max_length = max((len(word.decode("utf-8")) for word, _ in items), default=0)
+
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(items), max_length))
+        f.write(offsets.tobytes())
+        f.write(weights.tobytes())
+        for word, _ in items:
+            f.write(word)
+
+
+class InMemoryLexicon:
+    """内存词表，适合内置小词表和修饰词"""
+
+    def __init__(self, entries: Dict[str, float]):
+        self.entries = dict(entries)
+        self._matcher = AhoCorasickMatcher(self.entries)
+        self._weights = [self.entries[word] for word in self._matcher.patterns]
+        self._lengths = [len(word) for word in self._matcher.patterns]
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, word: str) -> Optional[float]:
+        return self.entries.get(word)
+
+    def longest_at(self, text: str) -> Dict[int, Span]:
+        """返回 {起始位置: 从该位置开始的最长匹配}"""
+        best: Dict[int, Span] = {}
+        ends, pattern_ids = self._matcher.find_all(text)
+        for end, pattern_id in zip(ends, pattern_ids):
+            start = end - self._lengths[pattern_id]
+            current = best.get(start)
+            if current is None or end > current[1]:
+                best[start] = (start, end, self._weights[pattern_id])
+        return best
+
+
+class MmapLexicon:
+    """内存映射的大词表
+
+    较长文本按词长逐层计算所有位置的子串哈希，在有序哈希表中二分查找，命中后再核对原词；
+    很短的文本逐位置做前缀二分查找。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._loaded = False
+        # 首字符对应的词条区间，命中率高，缓存后省去最外层的二分查找
+        self._first_char_ranges: Dict[str, Tuple[int, int]] = {}
+        # {词长: (有序的词条哈希, 对应词条序号)}，首次做哈希查找时才构建
+        self._hash_index = None
+
+    def _load(self):
+        # 延迟到首次查询时才打开文件（NumPy 也在此时才导入）
+        import numpy as np
+
+        with self._lock:
+            if self._loaded:
+                return
+            with open(self.path, "rb") as f:
+                self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, version, count, max_length = HEADER.unpack_from(self._mmap, 0)
+            if magic != MAGIC or version != VERSION:
+                raise ValueError(f"不支持的词表文件格式：{self.path}")
+
+            offsets_start = HEADER.size
+            weights_start = offsets_start + (count + 1) * 4
+            self._strings_start = weights_start + count * 4
+            self._offsets = np.frombuffer(self._mmap, dtype="<u4", count=count + 1, offset=offsets_start)
+            self._weights = np.frombuffer(self._mmap, dtype="<f4", count=count, offset=weights_start)
+            self._count = count
+            self.max_word_length = max_length
+            self._loaded = True
+
+    def __len__(self):
+        if not self._loaded:
+            self._load()
+        return self._count
+
+    def _word(self, index: int) -> bytes:
+        base = self._strings_start
+        return self._mmap[base + int(self._offsets[index]):base + int(self._offsets[index + 1])]
+
+    def _prefix_range(self, prefix: bytes, lo: int, hi: int) -> Tuple[int, int]:
+        """在 [lo, hi) 内查找以prefix开头的词条区间"""
+        size = len(prefix)
+        left, right = lo, hi
+        while left < right:
+            mid = (left + right) // 2
+            if self._word(mid)[:size] < prefix:
+                left = mid + 1
+            else:
+                right = mid
+        first = left
+        right = hi
+        while left < right:
+            mid = (left + right) // 2
+            if self._word(mid)[:size] <= prefix:
+                left = mid + 1
+            else:
+                right = mid
+        return first, left
+
+    def get(self, word: str) -> Optional[float]:
+        if not self._loaded:
+            self._load()
+        encoded = word.encode("utf-8")
+        lo, hi = self._prefix_range(encoded, 0, self._count)
+        if lo < hi and self._word(lo) == encoded:
+            return float(self._weights[lo])
+        return None
+
+    def _longest_from(self, text: str, start: int) -> Optional[Span]:
+        """从 start 开始做前缀收缩查找，前缀不存在时立即停止"""
+        first_char = text[start]
+        char_range = self._first_char_ranges.get(first_char)
+        if char_range is None:
+            char_range = self._prefix_range(first_char.encode("utf-8"), 0, self._count)
+            if len(self._first_char_ranges) < 65536:
+                self._first_char_ranges[first_char] = char_range
+        lo, hi = char_range
+        prefix = b""
+        found = None
+        for end in range(start + 1, min(len(text), start + self.max_word_length) + 1):
+            prefix += text[end - 1].encode("utf-8")
+            if end > start + 1:
+                lo, hi = self._prefix_range(prefix, lo, hi)
+            if lo >= hi:
+                break
+            # 区间内最小的词即为prefix本身时，说明prefix是完整词条
+            if self._word(lo) == prefix:
+                found = (start, end, float(self._weights[lo]))
+        return found
+
+    def _build_hash_index(self):
+        import numpy as np
+
+        with self._lock:
+            if self._hash_index is not None:
+                return
+            # 字节偏移换算为字符偏移：偏移之前的UTF-8首字节个数
+            raw = self._mmap[self._strings_start:self._strings_start + int(self._offsets[-1])]
+            lead = (np.frombuffer(raw, dtype=np.uint8) & 0xC0) != 0x80
+            char_offsets = np.concatenate(([0], np.cumsum(lead)))[self._offsets.astype(np.int64)]
+            codes = np.frombuffer(raw.decode("utf-8").encode("utf-32-le"), dtype="<u4").astype(np.uint64)
+            starts, lengths = char_offsets[:-1], np.diff(char_offsets)
+
+            hashes = np.zeros(self._count, dtype=np.uint64)
+            for k in range(self.max_word_length):
+                ids = np.flatnonzero(lengths > k)
+                hashes[ids] = hashes[ids] * np.uint64(HASH_MULTIPLIER) + codes[starts[ids] + k]
+
+            index = {}
+            for length in range(1, self.max_word_length + 1):
+                ids = np.flatnonzero(lengths == length)
+                order = np.argsort(hashes[ids])
+                index[length] = (hashes[ids][order], ids[order])
+            self._hash_index = index
+
+    def _longest_at_vectorized(self, text: str) -> Dict[int, Span]:
+        """对每种词长一次算出所有位置的子串哈希并查表，只逐个核对命中的位置"""
+        import numpy as np
+
+        if self._hash_index is None:
+            self._build_hash_index()
+        codes = np.frombuffer(text.encode("utf-32-le"), dtype="<u4").astype(np.uint64)
+        size = len(codes)
+        best_lengths = np.zeros(size, dtype=np.int64)
+        best_ids = np.zeros(size, dtype=np.int64)
+        hashes = np.zeros(size, dtype=np.uint64)
+        for length in range(1, min(self.max_word_length, size) + 1):
+            hashes = hashes[:size - length + 1] * np.uint64(HASH_MULTIPLIER) + codes[length - 1:]
+            table, ids = self._hash_index[length]
+            if not len(table):
+                continue
+            slots = np.minimum(np.searchsorted(table, hashes), len(table) - 1)
+            hits = np.flatnonzero(table[slots] == hashes)
+            best_lengths[hits] = length
+            best_ids[hits] = ids[slots[hits]]
+
+        best: Dict[int, Span] = {}
+        weights = self._weights
+        starts = np.flatnonzero(best_lengths)
+        for start, length, index in zip(starts.tolist(), best_lengths[starts].tolist(), best_ids[starts].tolist()):
+            end = start + length
+            if self._word(index) == text[start:end].encode("utf-8"):
+                best[start] = (start, end, float(weights[index]))
+            else:
+                # 哈希碰撞时退回逐位置查找
+                span = self._longest_from(text, start)
+                if span is not None:
+                    best[start] = span
+        return best
+
+    def longest_at(self, text: str) -> Dict[int, Span]:
+        """返回 {起始位置: 从该位置开始的最长匹配}"""
+        if not self._loaded:
+            self._load()
+        if len(text) >= VECTOR_MIN_LENGTH:
+            return self._longest_at_vectorized(text)
+        best: Dict[int, Span] = {}
+        for start in range(len(text)):
+            span = self._longest_from(text, start)
+            if span is not None:
+                best[start] = span
+        return best
+
+
+def segment(text: str, lexicons: Iterable) -> List[Tuple[int, int, float, int]]:
+    """对多个词表做正向最长匹配分词
+
+    返回命中的词 (起始, 结束, 权重, 词表序号)，未命中的字符跳过。
+    长度相同时排在前面的词表优先。
+    """
+    candidates: Dict[int, Tuple[int, int, float, int]] = {}
+    for source, lexicon in enumerate(lexicons):
+        for start, (_, end, weight) in lexicon.longest_at(text).items():
+            current = candidates.get(start)
+            if current is None or end > current[1]:
+                candidates[start] = (start, end, weight, source)
+
+    # 从左到右取候选词，跳过与已选词重叠的候选，等价于逐字符前进的正向最长匹配
+    tokens = []
+    position = 0
+    for start in sorted(candidates):
+        if start >= position:
+            token = candidates[start]
+            tokens.append(token)
+            position = token[1]
+    return tokens
+
+
+def main(argv=None) -> int:
+    """命令行：python -m utils.sentiment_lexicon build 词表.tsv 词表.sclx"""
+    args = sys.argv[1:] if argv is None else argv
+    if len(args) != 3 or args[0] != "build":
+        print(main.__doc__, file=sys.stderr)
+        return 2
+    entries = load_tsv(args[1])
+    build_lexicon_file(entries, args[2])
+    print(f"已写入 {len(entries)} 个词条到 {args[2]}（{os.path.getsize(args[2])} 字节）")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
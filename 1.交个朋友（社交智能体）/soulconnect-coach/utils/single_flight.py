@@ -0,0 +1,80 @@
+import threading
+from typing import Any, Callable, Dict, Optional, Tuple
+
+
+class SingleFlightTimeout(Exception):
+    """等待进行中的相同请求超过时限"""
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """合并同时进行的相同请求
+
+    同一个key在执行期间再次调用 do 时不会重复执行，而是等待第一次调用的结果，
+    适合多个会话同时发出完全相同的模型请求的情况。执行结束后key即被释放，
+    之后的调用会重新执行（结果复用交给缓存层）。
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, _Call] = {}
+        self._lock = threading.Lock()
+        self._stats = {"calls": 0, "executions": 0, "coalesced": 0}
+
+    def do(self, key: str, fn: Callable[[], Any], timeout: Optional[float] = None) -> Tuple[Any, bool]:
+        """返回 (结果, 是否复用了其他调用的结果)；fn 抛出的异常会传给所有等待者
+
+        timeout 限制等待他人调用的时间，超时抛出 SingleFlightTimeout；自己执行 fn 时不受其限制。
+        """
+        with self._lock:
+            self._stats["calls"] += 1
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self._stats["coalesced"] += 1
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                self._stats["executions"] += 1
+                leader = True
+
+        if not leader:
+            if not call.done.wait(timeout):
+                raise SingleFlightTimeout(f"等待进行中的相同请求超过 {timeout} 秒")
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return dict(self._stats, in_flight=len(self._calls))
+
+
+_shared_single_flight: Optional[SingleFlight] = None
+_shared_lock = threading.Lock()
+
+
+def get_shared_single_flight() -> SingleFlight:
+    """进程内共享的请求合并器，所有会话的客户端共用"""
+    global _shared_single_flight
+    with _shared_lock:
+        if _shared_single_flight is None:
+            _shared_single_flight = SingleFlight()
+        return _shared_single_flight
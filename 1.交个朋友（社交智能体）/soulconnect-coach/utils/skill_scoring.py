@@ -0,0 +1,132 @@
+from typing import Dict, Iterable, Optional
+
+from .emotion_analyzer import EmotionAnalyzer
+from .text_matcher import AhoCorasickMatcher
+
+SKILLS = ["话题开启", "情绪感知", "对话延续", "深度连接", "幽默感"]
+TARGET_LEVELS = [9, 8, 8, 7, 8]
+
+# 各项技能对应的语言信号
+EMPATHY_MARKERS = ["理解", "听起来", "辛苦", "感受", "换作是我", "一定很", "能体会", "心疼", "别担心", "加油"]
+DEPTH_MARKERS = ["我觉得", "我认为", "为什么", "经历", "意义", "小时候", "印象最深", "梦想", "其实我", "对你来说"]
+HUMOR_MARKERS = ["哈哈", "嘿嘿", "笑死", "段子", "开玩笑", "调侃", "😂", "🤣", "😄", "😆"]
+OPENER_MARKERS = ["你好", "嗨", "hi", "hello", "请问", "想问", "好奇", "最近", "注意到", "看到你"]
+
+# 经验先验：没有数据时的初始分数和它相当于几条消息的分量
+PRIOR_SCORE = 5.0
+PRIOR_WEIGHT = 5.0
+IDEAL_LENGTH = 30
+
+
+class SkillScorer:
+    """按对话增量更新的社交技能评分
+
+    每条消息只更新少量累计量（计数和加权和），分数由累计量直接算出，
+    不需要回看完整历史。累计量可序列化后持久化，version 在每次更新后递增，
+    界面据此判断是否需要重绘图表。
+    """
+
+    def __init__(self, analyzer: Optional[EmotionAnalyzer] = None, aggregates: Optional[Dict] = None):
+        self.analyzer = analyzer or EmotionAnalyzer()
+        self.aggregates = {
+            "user_messages": 0,
+            "icebreakers": 0,
+            "successful_icebreakers": 0,
+            "awaiting_reply": False,
+            "openers": 0,
+            "questions": 0,
+            "empathy": 0,
+            "emotional": 0,
+            "positive_polarity": 0.0,
+            "depth": 0,
+            "humor": 0,
+            "length_fit": 0.0,
+            "version": 0
+        }
+        self.aggregates.update(aggregates or {})
+        self._matchers = {
+            name: AhoCorasickMatcher(markers) for name, markers in (
+                ("empathy", EMPATHY_MARKERS), ("depth", DEPTH_MARKERS),
+                ("humor", HUMOR_MARKERS), ("openers", OPENER_MARKERS)
+            )
+        }
+
+    @property
+    def version(self) -> int:
+        return self.aggregates["version"]
+
+    def observe(self, message: Dict):
+        """并入一条新消息"""
+        aggregates = self.aggregates
+        if message.get("role") == "coach":
+            if message.get("type") == "icebreaker":
+                aggregates["icebreakers"] += 1
+                aggregates["awaiting_reply"] = True
+                aggregates["version"] += 1
+            return
+
+        content = message.get("content", "")
+        text_lower = content.lower()
+        aggregates["user_messages"] += 1
+        if aggregates["awaiting_reply"]:
+            # 生成开场白后用户接着发出了消息，视为一次成功破冰
+            aggregates["successful_icebreakers"] += 1
+            aggregates["awaiting_reply"] = False
+
+        for name, matcher in self._matchers.items():
+            if matcher.find_ids(text_lower):
+                aggregates[name] += 1
+        if '?' in content or '？' in content:
+            aggregates["questions"] += 1
+
+        emotion = self.analyzer.analyze_text_emotion(content)
+        total = emotion["positive_indicators"] + emotion["negative_indicators"]
+        if total:
+            aggregates["emotional"] += 1
+            aggregates["positive_polarity"] += emotion["positive_indicators"] / total
+
+        # 长度越接近理想长度越好，过短敷衍、过长压迫
+        ratio = len(content) / IDEAL_LENGTH
+        aggregates["length_fit"] += ratio if ratio <= 1 else max(0.0, 2 - ratio)
+        aggregates["version"] += 1
+
+    def observe_many(self, messages: Iterable[Dict]):
+        for message in messages:
+            self.observe(message)
+
+    @staticmethod
+    def _smoothed(rate: float, count: int) -> float:
+        """把0~1的比例换算成0~10分，并向先验收缩，消息少时分数不会大起大落"""
+        return (PRIOR_SCORE * PRIOR_WEIGHT + rate * 10 * count) / (PRIOR_WEIGHT + count)
+
+    def scores(self) -> Dict[str, float]:
+        aggregates = self.aggregates
+        count = aggregates["user_messages"]
+        if not count:
+            return {skill: PRIOR_SCORE for skill in SKILLS}
+
+        def rate(key: str, scale: float = 1.0) -> float:
+            return min(1.0, aggregates[key] / count * scale)
+
+        question_rate = aggregates["questions"] / count
+        # 提问比例在一半左右最利于对话延续
+        question_balance = max(0.0, 1 - abs(question_rate - 0.5) * 2)
+        emotional = aggregates["emotional"]
+        polarity = aggregates["positive_polarity"] / emotional if emotional else 0.5
+
+        values = {
+            "话题开启": 0.5 * rate("openers", 3) + 0.5 * min(1.0, question_rate * 2),
+            "情绪感知": 0.6 * rate("empathy", 3) + 0.4 * polarity,
+            "对话延续": 0.5 * question_balance + 0.5 * aggregates["length_fit"] / count,
+            "深度连接": rate("depth", 3),
+            "幽默感": rate("humor", 4)
+        }
+        return {skill: round(self._smoothed(values[skill], count), 1) for skill in SKILLS}
+
+    def overall(self) -> float:
+        scores = self.scores()
+        return round(sum(scores.values()) / len(scores), 1)
+
+    def to_dict(self) -> Dict:
+        return dict(self.aggregates)
+
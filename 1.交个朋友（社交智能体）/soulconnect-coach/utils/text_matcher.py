@@ -0,0 +1,109 @@
+import re
+from collections import deque
+from typing import Dict, Iterable, List, Set, Tuple
+
+# 词条不多时正则的分支逐个尝试也很快，且扫描在C层完成；词表更大时改用自动机
+REGEX_MAX_WORDS = 512
+
+
+def longest_first_pattern(words: Iterable[str]) -> "re.Pattern":
+    """把词条编译成按前缀树嵌套、长词优先的正则
+
+    每一层的分支首字符互不相同，可匹配更长的词时可选分组优先向下匹配，
+    finditer 因此在每个位置取最长的词，未命中时前进一个字符，即正向最长匹配分词。
+    """
+    trie: Dict = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        if word:
+            node[None] = True
+
+    def build(node: Dict) -> str:
+        branches = [re.escape(ch) + build(child) for ch, child in sorted(node.items(), key=lambda item: item[0] or "")
+                    if ch is not None]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        return f"(?:{body})?" if None in node else body
+
+    # 空词表时不匹配任何文本
+    return re.compile(build(trie) or r"(?!)")
+
+
+class AhoCorasickMatcher:
+    """Aho–Corasick 多模式匹配自动机
+
+    词表加载时构建一次，之后对任意文本只需单次扫描即可找出全部词，
+    耗时与文本长度成正比，与词表大小无关。
+    """
+
+    def __init__(self, patterns: Iterable[str]):
+        self.patterns: List[str] = list(dict.fromkeys(p for p in patterns if p))
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[Tuple[int, ...]] = [()]
+        self._build()
+
+    def _build(self):
+        outputs: List[List[int]] = [[]]
+        for pattern_id, pattern in enumerate(self.patterns):
+            state = 0
+            for ch in pattern:
+                next_state = self._goto[state].get(ch)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][ch] = next_state
+                    self._goto.append({})
+                    self._fail.append(0)
+                    outputs.append([])
+                state = next_state
+            outputs[state].append(pattern_id)
+
+        # 按BFS顺序计算失败指针，并合并后缀状态的输出
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(ch, 0)
+                self._fail[next_state] = target if target != next_state else 0
+                outputs[next_state].extend(outputs[self._fail[next_state]])
+
+        self._output = [tuple(ids) for ids in outputs]
+
+    def __len__(self):
+        return len(self.patterns)
+
+    def find_all(self, text: str) -> Tuple[List[int], List[int]]:
+        """返回所有匹配的 (结束位置列表(不含), 词编号列表)，允许重叠"""
+        goto, fail, output = self._goto, self._fail, self._output
+        ends: List[int] = []
+        ids: List[int] = []
+        state = 0
+        for index, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if output[state]:
+                for pattern_id in output[state]:
+                    ends.append(index + 1)
+                    ids.append(pattern_id)
+        return ends, ids
+
+    def find_ids(self, text: str) -> Set[int]:
+        """返回文本中出现过的词编号集合"""
+        goto, fail, output = self._goto, self._fail, self._output
+        found: Set[int] = set()
+        state = 0
+        for ch in text:
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if output[state]:
+                found.update(output[state])
+        return found
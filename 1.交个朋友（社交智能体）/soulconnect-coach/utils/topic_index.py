@@ -0,0 +1,250 @@
+import itertools
+import threading
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+# 资料中的个人标识，复用他人的分析结果时要换成本人的
+IDENTITY_FIELDS = ("nickname", "age")
+
+
+def profile_text(profile: Dict) -> str:
+    """用于匹配相似资料的文本：标签、简介和最近动态，不含昵称等个人标识"""
+    return " ".join([
+        " ".join(f"#{tag}" for tag in profile.get("tags", [])),
+        profile.get("bio", ""),
+        profile.get("recent_moments", "")
+    ])
+
+
+def profile_identity(profile: Dict) -> Dict[str, str]:
+    """资料中非空的个人标识字段"""
+    return {field: str(profile[field]) for field in IDENTITY_FIELDS if profile.get(field) not in (None, "")}
+
+
+def _identity_replacements(source: Dict[str, str], target: Dict[str, str]) -> List[Tuple[str, str]]:
+    """把来源资料的标识替换成目标资料的；目标缺少该字段时用中性说法"""
+    replacements = []
+    nickname = source.get("nickname")
+    if nickname and nickname != target.get("nickname"):
+        replacements.append((nickname, target.get("nickname", "TA")))
+    age = source.get("age")
+    if age and age != target.get("age"):
+        replacements.append((f"{age}岁", f"{target['age']}岁" if "age" in target else ""))
+    return replacements
+
+
+def _rebind(value, replacements: List[Tuple[str, str]]):
+    if isinstance(value, str):
+        for old, new in replacements:
+            value = value.replace(old, new)
+        return value
+    if isinstance(value, list):
+        return [_rebind(item, replacements) for item in value]
+    return value
+
+
+class HashedNgramEmbedder:
+    """字符n-gram哈希向量，纯CPU、无需下载模型
+
+    每个n-gram用crc32哈希到固定维度并带正负号（降低冲突带来的偏差），
+    #开头的标签额外整体计入一次，结果做L2归一化，点积即余弦相似度。
+    """
+
+    def __init__(self, dimensions: int = 256, ngram_range: Tuple[int, int] = (1, 3)):
+        self.dimensions = dimensions
+        self.ngram_range = ngram_range
+
+    def _features(self, text: str) -> List[str]:
+        features = [token for token in text.split() if token.startswith("#")]
+        chars = "".join(text.split())
+        low, high = self.ngram_range
+        for n in range(low, high + 1):
+            features.extend(chars[i:i + n] for i in range(len(chars) - n + 1))
+        return features
+
+    def embed(self, text: str) -> np.ndarray:
+        codes = np.array([zlib.crc32(feature.encode("utf-8")) for feature in self._features(text)], dtype=np.uint32)
+        signs = np.where(codes & 0x80000000, 1.0, -1.0)
+        vector = np.bincount(codes % self.dimensions, weights=signs, minlength=self.dimensions).astype(np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def embed_batch(self, texts: List[str]) -> np.ndarray:
+        return np.stack([self.embed(text) for text in texts]) if texts else np.zeros((0, self.dimensions), np.float32)
+
+
+class LSHIndex:
+    """随机超平面LSH的近似最近邻索引
+
+    每张哈希表取 bits 个随机超平面的符号作为桶号，查询时合并各表同桶的条目，
+    再用精确的余弦相似度重排。表越多召回越高，位数越多候选越少。
+    多探针：每张表额外探查翻转 probes 个最不确定（投影最接近0）的位得到的相邻桶，
+    用较少的表达到较高召回。
+
+    条目数不超过 exact_below 时直接暴力检索，小规模下更快且结果精确；
+    超过后才建哈希表，并以当时已有向量的均值为中心：n-gram向量都带有共同成分
+    （常用字、句式），不减去中心时大部分条目会挤进同几个桶。
+    """
+
+    def __init__(self, dimensions: int, tables: int = 24, bits: int = 12, probes: int = 6,
+                 seed: int = 0, exact_below: int = 2048):
+        self.dimensions = dimensions
+        self.tables = tables
+        self.bits = bits
+        self.probes = probes
+        self.exact_below = exact_below
+        rng = np.random.default_rng(seed)
+        self._planes = rng.standard_normal((tables * bits, dimensions)).astype(np.float32)
+        self._powers = (1 << np.arange(bits)).astype(np.int64)
+        self._buckets: Optional[List[Dict[int, List[int]]]] = None
+        self._center = np.zeros(dimensions, dtype=np.float32)
+        self._vectors = np.zeros((0, dimensions), dtype=np.float32)
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def _codes(self, vectors: np.ndarray) -> np.ndarray:
+        """(n, dimensions) -> (n, tables) 的桶号"""
+        signs = ((vectors - self._center) @ self._planes.T > 0).reshape(len(vectors), self.tables, self.bits)
+        return signs @ self._powers
+
+    def _probe_codes(self, vector: np.ndarray) -> List[List[int]]:
+        """每张表要探查的桶号：本桶，以及依次翻转最不确定的位得到的相邻桶"""
+        projections = (self._planes @ (vector - self._center)).reshape(self.tables, self.bits)
+        codes = (projections > 0) @ self._powers
+        if not self.probes:
+            return [[int(code)] for code in codes]
+        uncertain = np.argsort(np.abs(projections), axis=1)[:, :self.probes]
+        flips = self._powers[uncertain]
+        return [[int(code)] + [int(code) ^ int(flip) for flip in row] for code, row in zip(codes, flips)]
+
+    def _hash(self, start: int, stop: int):
+        for item_id, codes in enumerate(self._codes(self._vectors[start:stop]).tolist(), start):
+            for table, code in zip(self._buckets, codes):
+                table.setdefault(code, []).append(item_id)
+
+    def add_batch(self, vectors: np.ndarray) -> List[int]:
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dimensions)
+        start, needed = self._size, self._size + len(vectors)
+        if needed > len(self._vectors):
+            # 容量翻倍，摊还后每次插入为O(1)
+            grown = np.zeros((max(needed, 2 * len(self._vectors), 64), self.dimensions), dtype=np.float32)
+            grown[:self._size] = self._vectors[:self._size]
+            self._vectors = grown
+        self._vectors[start:needed] = vectors
+        self._size = needed
+
+        if self._buckets is not None:
+            self._hash(start, needed)
+        elif needed > self.exact_below:
+            self._center = self._vectors[:needed].mean(axis=0)
+            self._buckets = [{} for _ in range(self.tables)]
+            self._hash(0, needed)
+        return list(range(start, needed))
+
+    def add(self, vector: np.ndarray) -> int:
+        return self.add_batch(vector[None, :])[0]
+
+    def search(self, vector: np.ndarray, k: int = 1) -> List[Tuple[int, float]]:
+        """近似检索，返回 [(条目编号, 余弦相似度)]，按相似度降序"""
+        if self._buckets is None:
+            return self.exact_search(vector, k)
+        vector = np.asarray(vector, dtype=np.float32)
+        buckets = []
+        for table, codes in zip(self._buckets, self._probe_codes(vector)):
+            for code in codes:
+                bucket = table.get(code)
+                if bucket:
+                    buckets.append(bucket)
+        if not buckets:
+            return []
+        candidates = np.unique(np.fromiter(itertools.chain.from_iterable(buckets), dtype=np.int64))
+        return self._rank(candidates, vector, k)
+
+    def exact_search(self, vector: np.ndarray, k: int = 1) -> List[Tuple[int, float]]:
+        """暴力精确检索，用于评估召回率"""
+        return self._rank(None, vector, k)
+
+    def _rank(self, candidates: Optional[np.ndarray], vector: np.ndarray, k: int) -> List[Tuple[int, float]]:
+        if candidates is None:
+            # 全量检索直接对连续内存做矩阵乘，避免花式索引复制整个向量表
+            scores = self._vectors[:self._size] @ vector
+            candidates = np.arange(self._size)
+        else:
+            scores = self._vectors[candidates] @ vector
+        if len(candidates) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+            candidates, scores = candidates[top], scores[top]
+        order = np.argsort(-scores, kind="stable")
+        return [(int(candidates[i]), float(scores[i])) for i in order]
+
+
+class TopicIndex:
+    """已分析过的资料及其话题的向量索引
+
+    新资料与某条已分析资料足够接近（>= reuse_threshold）时可直接复用其分析结果，
+    较接近（>= seed_threshold）时把相似资料的话题作为提示，免得模型从零发挥。
+    相似度不看昵称、年龄，返回的结果中来源资料的昵称和年龄会换成查询资料的。
+    """
+
+    def __init__(self, embedder: Optional[HashedNgramEmbedder] = None, index: Optional[LSHIndex] = None,
+                 reuse_threshold: float = 0.92, seed_threshold: float = 0.5, max_entries: int = 100000):
+        self.embedder = embedder or HashedNgramEmbedder()
+        self.index = index or LSHIndex(self.embedder.dimensions)
+        self.reuse_threshold = reuse_threshold
+        self.seed_threshold = seed_threshold
+        self.max_entries = max_entries
+        self._results: List[Dict] = []
+        self._identities: List[Dict[str, str]] = []
+        self._lock = threading.Lock()
+        self._stats = {"lookups": 0, "reused": 0, "seeded": 0, "added": 0}
+
+    def __len__(self):
+        return len(self.index)
+
+    def lookup(self, profile: Dict) -> Tuple[Optional[Dict], float]:
+        """返回最相似的已分析结果及相似度，没有足够接近的资料时返回 (None, 0.0)"""
+        vector = self.embedder.embed(profile_text(profile))
+        with self._lock:
+            self._stats["lookups"] += 1
+            matches = self.index.search(vector, k=1)
+            if not matches or matches[0][1] < self.seed_threshold:
+                return None, 0.0
+            item_id, similarity = matches[0]
+            self._stats["reused" if similarity >= self.reuse_threshold else "seeded"] += 1
+            result, source = self._results[item_id], self._identities[item_id]
+        replacements = _identity_replacements(source, profile_identity(profile))
+        if replacements:
+            result = {key: _rebind(value, replacements) for key, value in result.items()}
+        return result, similarity
+
+    def add(self, profile: Dict, result: Dict):
+        """记录一条分析结果；索引已满时不再加入"""
+        vector = self.embedder.embed(profile_text(profile))
+        with self._lock:
+            if len(self.index) >= self.max_entries:
+                return
+            self.index.add(vector)
+            self._results.append(result)
+            self._identities.append(profile_identity(profile))
+            self._stats["added"] += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return dict(self._stats, size=len(self.index))
+
+
+_shared_topic_index: Optional[TopicIndex] = None
+_shared_lock = threading.Lock()
+
+
+def get_shared_topic_index() -> TopicIndex:
+    """进程内共享的话题索引，所有会话分析过的资料都可被复用"""
+    global _shared_topic_index
+    with _shared_lock:
+        if _shared_topic_index is None:
+            _shared_topic_index = TopicIndex()
+        return _shared_topic_index